@@ -0,0 +1,709 @@
+# bench.py
+import argparse
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+# main opens and migrates its database at import time; every benchmark brings its own fixture, so point that
+# at a scratch file instead of ./qms.db (or whatever the shell's QMS_* variables name)
+SCRATCH_DIR = tempfile.mkdtemp(prefix="qms-bench-")
+os.environ["QMS_DATABASE_PATH"] = os.path.join(SCRATCH_DIR, "qms.db")
+os.environ.pop("QMS_PLANTS", None)
+os.environ.pop("QMS_PLANT", None)
+atexit.register(shutil.rmtree, SCRATCH_DIR, True)
+
+import main
+
+# ==================== RENDER BENCHMARK ====================
+def make_items(count: int):
+    return [
+        {
+            "id": f"{i:08x}",
+            "name": f"Part <{i}> & \"variant\"",
+            "created_at": "2025-01-01 08:00:00",
+            "updated_at": "2025-01-02 09:30:00" if i % 3 == 0 else "2025-01-01 08:00:00",
+            "is_active": 1,
+        }
+        for i in range(count)
+    ]
+
+def bench_render(sizes, min_time: float):
+    results = []
+    for size in sizes:
+        items = make_items(size)
+        main.render_items_list(items, size * 10, "partnumbers", 3, "bolt")
+        
+        iterations = 0
+        started = time.perf_counter()
+        while True:
+            main.render_items_list(items, size * 10, "partnumbers", 3, "bolt")
+            iterations += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time:
+                break
+        
+        results.append({
+            "rows": size,
+            "iterations": iterations,
+            "ms_per_render": round(elapsed * 1000 / iterations, 4),
+            "rows_per_second": round(size * iterations / elapsed),
+        })
+    return results
+
+# ==================== SEEDED FIXTURES ====================
+SEED_SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+SEED_SPAN_DAYS = 3 * 365
+NAME_WORDS = (
+    "bolt", "bracket", "gauge", "valve", "sensor", "housing", "flange", "gasket", "spring", "washer",
+    "torque", "caliper", "shaft", "bearing", "coupling", "fixture", "nozzle", "clamp", "rivet", "spindle",
+)
+AUDIT_ACTION_WEIGHTS = (("CREATE", 5), ("UPDATE", 4), ("DELETE", 1))
+
+def parse_size(value: str):
+    return SEED_SIZES.get(value.lower()) or int(value)
+
+def fixture_path(directory: str, rows: int, seed: int):
+    return os.path.join(directory, f"qms-{rows}-s{seed}.db")
+
+def timestamp(seconds: float):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+def entity_id(index: int, salt: int):
+    # An odd multiplier is a bijection mod 2**32, so ids are unique and deterministic without a lookup
+    return f"{(index * 2654435761 + salt) & 0xFFFFFFFF:08x}"
+
+def entity_rows(rows: int, rng: random.Random, salt: int, anchor: float):
+    span = SEED_SPAN_DAYS * 86400
+    for index in range(rows):
+        created = anchor - rng.randrange(span)
+        updated = created + rng.randrange(30 * 86400) if rng.random() < 0.2 else created
+        yield (entity_id(index, salt), f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {index}",
+               timestamp(created), timestamp(min(updated, anchor)), 0 if rng.random() < 0.05 else 1)
+
+def audit_rows(table: str, rows: int, count: int, rng: random.Random, salt: int, anchor: float):
+    actions = [action for action, weight in AUDIT_ACTION_WEIGHTS for _ in range(weight)]
+    span = SEED_SPAN_DAYS * 86400
+    for _ in range(count):
+        action = rng.choice(actions)
+        changes = (json.dumps({"name": f"{rng.choice(NAME_WORDS)} {rng.randrange(rows)}"}) if action == "CREATE" else
+                   json.dumps({"old": rng.choice(NAME_WORDS), "new": rng.choice(NAME_WORDS)}) if action == "UPDATE" else None)
+        yield table, entity_id(rng.randrange(rows), salt), action, changes, timestamp(anchor - rng.randrange(span))
+
+def insert_batches(conn, sql: str, rows, batch_size: int):
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        conn.executemany(sql, batch)
+        conn.commit()
+
+def seed_database(path: str, rows: int, seed: int = 42, audit_ratio: float = 1.0, anchor: float = None,
+                  batch_size: int = 50_000):
+    if os.path.exists(path):
+        return path
+    
+    anchor = anchor if anchor is not None else time.time() // 86400 * 86400
+    building = f"{path}.building"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(building + suffix):
+            os.remove(building + suffix)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    
+    tables = [entity.value for entity in main.EntityType]
+    main.Database(building).close()
+    
+    # Load into bare tables, then let the app's own schema setup rebuild indexes, triggers and counters
+    conn = sqlite3.connect(building)
+    conn.execute("PRAGMA synchronous = OFF")
+    placeholders = ", ".join("?" * len(tables + ["audit_log"]))
+    for kind, name in conn.execute(f"SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                                   f"AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+                                   tables + ["audit_log"]).fetchall():
+        conn.execute(f"DROP {kind.upper()} {name}")
+    conn.execute("DELETE FROM entity_stats")
+    conn.execute("DELETE FROM search_index_state")
+    
+    for table in tables:
+        rng = random.Random(f"{seed}-{table}")
+        salt = rng.getrandbits(32)
+        started = time.perf_counter()
+        insert_batches(conn, f"INSERT INTO {table} (id, name, created_at, updated_at, is_active) VALUES (?, ?, ?, ?, ?)",
+                       entity_rows(rows, rng, salt, anchor), batch_size)
+        insert_batches(conn, "INSERT INTO audit_log (entity_type, entity_id, action, changes, timestamp) VALUES (?, ?, ?, ?, ?)",
+                       audit_rows(table, rows, int(rows * audit_ratio), rng, salt, anchor), batch_size)
+        print(f"🌱 Seeded {rows} {table} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    
+    conn.execute("CREATE TABLE bench_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.executemany("INSERT INTO bench_meta (key, value) VALUES (?, ?)",
+                     [("rows", rows), ("seed", seed), ("audit_ratio", audit_ratio), ("anchor", timestamp(anchor))])
+    # Rewinding the schema version makes the reopen below replay the migrations over the loaded rows
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+    
+    database = main.Database(building)
+    for table in tables:
+        database.search.rebuild(table)
+    with database.connection() as conn:
+        conn.execute("ANALYZE")
+    database.close()
+    os.replace(building, path)
+    return path
+
+def fixture_meta(path: str):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute("SELECT key, value FROM bench_meta").fetchall())
+    finally:
+        conn.close()
+
+# ==================== HTTP BENCHMARK ====================
+class Workload:
+    def __init__(self, database, seed: int, samples: int = 1000):
+        self.rng = random.Random(seed)
+        self.run_tag = f"bench{seed}x{int(time.time())}"
+        self.entities = [entity.value for entity in main.EntityType]
+        self.ids = {}
+        self.deep_pages = {}
+        self.deep_cursors = {}
+        self.created = []
+        self._created_seen = 0
+        
+        with database.connection() as conn:
+            for table in self.entities:
+                active = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE is_active = 1").fetchone()[0]
+                self.ids[table] = [row[0] for row in conn.execute(
+                    f"SELECT id FROM {table} WHERE is_active = 1 ORDER BY id LIMIT ?", (samples,))]
+                self.deep_pages[table] = max(1, int(active * 0.9) // main.Config.PAGE_SIZE)
+                row = conn.execute(f"SELECT created_at, id FROM {table} WHERE is_active = 1 "
+                                   f"ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?", (active // 2,)).fetchone()
+                self.deep_cursors[table] = main.encode_cursor("n", row[0], row[1]) if row else None
+    
+    def entity(self):
+        return self.rng.choice(self.entities)
+    
+    def sample(self):
+        entity = self.entity()
+        return entity, self.rng.choice(self.ids[entity]) if self.ids[entity] else "missing"
+    
+    def created_item(self, pop: bool = False):
+        if not self.created:
+            return self.entity(), "missing"
+        if pop:
+            return self.created.pop()
+        return self.rng.choice(self.created)
+    
+    def refresh_created(self, database):
+        with database.connection() as conn:
+            for table in self.entities:
+                self.created.extend((table, row[0]) for row in conn.execute(
+                    f"SELECT id FROM {table} WHERE is_active = 1 AND name LIKE ?", (f"{self.run_tag}%",)))
+    
+    def name(self):
+        return f"{self.run_tag} {self.rng.choice(NAME_WORDS)} {self.rng.randrange(10**6)}"
+
+def import_body(workload: Workload, rows: int = 100):
+    return "name\n" + "".join(f"{workload.name()}\n" for _ in range(rows))
+
+SCENARIOS = {
+    "items": lambda w: ("GET", f"/entity/{w.entity()}/items", {}),
+    "items_search": lambda w: ("GET", f"/entity/{w.entity()}/items", {"params": {"search": w.rng.choice(NAME_WORDS)}}),
+    "items_search_rare": lambda w: ("GET", f"/entity/{w.entity()}/items", {"params": {"search": str(w.rng.randrange(10**5))}}),
+    "items_deep_offset": lambda w: (lambda e: ("GET", f"/entity/{e}/items",
+                                               {"params": {"page": w.deep_pages[e] - w.rng.randrange(5)}}))(w.entity()),
+    "items_deep_cursor": lambda w: (lambda e: ("GET", f"/entity/{e}/items",
+                                               {"params": {"cursor": w.deep_cursors[e]} if w.deep_cursors[e] else {}}))(w.entity()),
+    "entity_page": lambda w: ("GET", f"/entity/{w.entity()}", {}),
+    "edit_form": lambda w: ("GET", "/entity/{}/edit/{}".format(*w.sample()), {}),
+    "create": lambda w: ("POST", f"/entity/{w.entity()}/create", {"data": {"name": w.name()}}),
+    "import": lambda w: ("POST", f"/entity/{w.entity()}/import",
+                         {"files": {"file": ("bench.csv", import_body(w), "text/csv")}}),
+    "update": lambda w: ("PUT", "/entity/{}/update/{}".format(*w.created_item()), {"data": {"name": w.name()}}),
+    "batch": lambda w: (lambda e: ("POST", f"/entity/{e}/batch",
+                                   {"json": {"update": [{"id": item_id, "name": w.name()} for table, item_id in w.created[:50]
+                                                        if table == e]}}))(w.entity()),
+    "delete": lambda w: ("DELETE", "/entity/{}/delete/{}".format(*w.created_item(pop=True)), {}),
+    "dmt": lambda w: ("GET", "/dmt", {}),
+    "audit": lambda w: ("GET", "/audit", {}),
+    "audit_entity": lambda w: (lambda e, i: ("GET", "/audit/logs", {"params": {"entity_type": e, "entity_id": i}}))(*w.sample()),
+    "export_csv": lambda w: ("GET", f"/entity/{w.entity()}/export/csv", {"params": {"days": 30}}),
+    "export_ndjson_gzip": lambda w: ("GET", f"/entity/{w.entity()}/export/ndjson",
+                                     {"params": {"days": 30, "compress": "gzip"}}),
+    "stats": lambda w: ("GET", "/stats", {}),
+}
+# Writes run after the reads; update, batch and delete only touch rows this run created, leaving the seeded data intact
+WRITE_SCENARIOS = ("create", "import", "update", "batch", "delete")
+
+def percentile(values, fraction: float):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+def summarize(latencies, errors: int, elapsed: float, transferred: int):
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else None,
+        "bytes_per_request": round(transferred / len(latencies)) if latencies else 0,
+    }
+
+async def run_scenario(client, workload: Workload, scenario, requests: int, concurrency: int):
+    latencies, failures, transferred = [], [], []
+    remaining = iter(range(requests))
+    
+    async def worker():
+        for _ in remaining:
+            method, url, options = scenario(workload)
+            started = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies.append(time.perf_counter() - started)
+            transferred.append(len(response.content))
+            if response.status_code >= 400:
+                failures.append(response.status_code)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, len(failures), time.perf_counter() - started, sum(transferred))
+
+async def bench_http(path: str, names, requests: int, concurrency: int, seed: int, warmup: int, response_cache: bool):
+    main.db.close()
+    main.db = main.ShardRouter({None: main.Database(path)})
+    if not response_cache:
+        main.db.responses.max_entries = 0
+    
+    workload = Workload(main.db, seed)
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in sorted(names, key=lambda name: (name in WRITE_SCENARIOS, WRITE_SCENARIOS.index(name)
+                                                    if name in WRITE_SCENARIOS else 0)):
+            if name in ("update", "batch", "delete"):
+                workload.refresh_created(main.db)
+            count = min(requests, len(workload.created)) if name == "delete" else requests
+            if warmup and name not in WRITE_SCENARIOS:
+                await run_scenario(client, workload, SCENARIOS[name], warmup, concurrency)
+            results[name] = await run_scenario(client, workload, SCENARIOS[name], count, concurrency)
+            print(f"⏱️ {name}: {results[name]['throughput_rps']} req/s, p95 {results[name]['p95_ms']} ms",
+                  file=sys.stderr)
+    
+    main.db.close()
+    return results
+
+def compare_results(current, baseline, threshold: float):
+    comparison, regressions = {}, []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or not base.get("throughput_rps") or not result.get("p95_ms"):
+            continue
+        
+        delta = {
+            "throughput": round(result["throughput_rps"] / base["throughput_rps"] - 1, 4),
+            "p50": round(result["p50_ms"] / base["p50_ms"] - 1, 4) if base.get("p50_ms") else None,
+            "p95": round(result["p95_ms"] / base["p95_ms"] - 1, 4) if base.get("p95_ms") else None,
+            "p99": round(result["p99_ms"] / base["p99_ms"] - 1, 4) if base.get("p99_ms") else None,
+        }
+        delta["regressed"] = delta["throughput"] < -threshold or any(
+            delta[key] is not None and delta[key] > threshold for key in ("p95", "p99"))
+        if delta["regressed"]:
+            regressions.append(name)
+        comparison[name] = delta
+    return {"threshold": threshold, "scenarios": comparison, "regressions": regressions}
+
+def git_revision():
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".git", "HEAD")) as head:
+            ref = head.read().strip()
+        if ref.startswith("ref: "):
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".git", ref[5:])) as branch:
+                return branch.read().strip()
+        return ref
+    except OSError:
+        return None
+
+# ==================== WORKER SCALING BENCHMARK ====================
+SCALING_SCENARIOS = ("items", "items_search", "items_search_rare", "items_deep_cursor", "edit_form", "dmt", "audit_entity")
+
+def wait_until_ready(base_url: str, process, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/stats", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+async def drive_remote(base_url: str, workload: Workload, names, duration: float, concurrency: int):
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + duration
+    
+    async def worker(offset: int):
+        nonlocal failures
+        for index in itertools.count(offset):
+            if time.perf_counter() >= deadline:
+                return
+            method, url, options = SCENARIOS[names[index % len(names)]](workload)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **options)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            failures += failed
+    
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    return latencies, failures
+
+def client_process(path: str, base_url: str, names, duration: float, concurrency: int, seed: int):
+    # Each load-generating process samples its own ids so the client side is not the bottleneck
+    database = main.Database(path)
+    workload = Workload(database, seed)
+    database.close()
+    return asyncio.run(drive_remote(base_url, workload, names, duration, concurrency))
+
+def bench_workers(path: str, worker_counts, names, duration: float, concurrency: int, clients: int, port: int, seed: int):
+    results = []
+    for workers in worker_counts:
+        base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=os.path.dirname(os.path.abspath(main.__file__)),
+            env={**os.environ, "QMS_DATABASE_PATH": os.path.abspath(path), "QMS_WORKERS": str(workers)},
+        )
+        try:
+            wait_until_ready(base_url, server)
+            with ProcessPoolExecutor(max_workers=clients) as pool:
+                futures = [pool.submit(client_process, path, base_url, names, duration, concurrency, seed + index)
+                           for index in range(clients)]
+                outcomes = [future.result() for future in futures]
+        finally:
+            server.terminate()
+            server.wait()
+        
+        latencies = [latency for outcome in outcomes for latency in outcome[0]]
+        result = {"workers": workers, **summarize(latencies, sum(outcome[1] for outcome in outcomes), duration, 0)}
+        result.pop("bytes_per_request")
+        result["speedup"] = round(result["throughput_rps"] / results[0]["throughput_rps"], 2) if results else 1.0
+        results.append(result)
+        print(f"⚙️ {workers} worker(s): {result['throughput_rps']} req/s, p95 {result['p95_ms']} ms", file=sys.stderr)
+    return results
+
+# ==================== CHANGE FEED BENCHMARK ====================
+def process_rss(pid: int):
+    # Linux only; elsewhere the memory figures are reported as null
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+async def drive_subscribers(base_url: str, pid: int, entity: str, subscribers: int, writes: int, burst: int,
+                            settle: float):
+    connected = asyncio.Semaphore(0)
+    arrivals = [{} for _ in range(subscribers)]
+    received = [0] * subscribers
+    tag_pattern = re.compile(r"sse-(\d+)-")
+    
+    async def subscriber(index: int):
+        async with client.stream("GET", f"/entity/{entity}/events?view=live") as response:
+            connected.release()
+            async for chunk in response.aiter_text():
+                received[index] += chunk.count("event: ")
+                for tag in tag_pattern.findall(chunk):
+                    arrivals[index].setdefault(int(tag), time.perf_counter())
+    
+    limits = httpx.Limits(max_connections=subscribers + 4, max_keepalive_connections=4)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=httpx.Timeout(30.0, read=None)) as client:
+        await client.get("/stats")
+        rss_before = process_rss(pid)
+        tasks = [asyncio.create_task(subscriber(index)) for index in range(subscribers)]
+        started = time.perf_counter()
+        for _ in range(subscribers):
+            await connected.acquire()
+        connect_s = time.perf_counter() - started
+        await asyncio.sleep(settle)
+        rss_idle = process_rss(pid)
+        
+        # Fan-out: one write at a time, each subscriber timestamps the first event carrying its tag
+        sent = {}
+        for tag in range(writes):
+            sent[tag] = time.perf_counter()
+            await client.post(f"/entity/{entity}/create", data={"name": f"sse-{tag}-{time.time_ns()}"})
+            await asyncio.sleep(main.Config.CHANGE_FEED_COALESCE * 4)
+        await asyncio.sleep(1.0)
+        latencies = [seen[tag] - sent[tag] for seen in arrivals for tag in seen if tag in sent]
+        missed = subscribers * writes - len(latencies)
+        
+        # Burst: rapid renames of one row should collapse into far fewer events per subscriber
+        before_burst = list(received)
+        row = (await client.post(f"/entity/{entity}/batch", json={"create": ["sse-burst"]})).json()["created"][0]
+        for step in range(burst):
+            await client.post(f"/entity/{entity}/batch", json={"update": [{"id": row["id"], "name": f"sse-burst-{step}"}]})
+        await asyncio.sleep(1.0)
+        burst_events = [after - before for after, before in zip(received, before_burst)]
+        stats = (await client.get("/stats")).json()["changes"]
+        
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    per_connection = (rss_idle - rss_before) / subscribers if rss_before and rss_idle else None
+    return {
+        "subscribers": subscribers,
+        "connect_s": round(connect_s, 3),
+        "rss_before_mb": round(rss_before / 2 ** 20, 1) if rss_before else None,
+        "rss_idle_mb": round(rss_idle / 2 ** 20, 1) if rss_idle else None,
+        "bytes_per_subscriber": round(per_connection) if per_connection is not None else None,
+        "fanout": {**summarize(latencies, missed, 0, 0), "writes": writes},
+        "burst": {"updates": burst, "mean_events_per_subscriber": round(statistics.fmean(burst_events), 2)},
+        "feed": stats,
+    }
+
+def bench_sse(path: str, entity: str, subscribers: int, writes: int, burst: int, settle: float, port: int):
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--no-access-log", "--limit-concurrency", str(subscribers + 64)],
+        cwd=os.path.dirname(os.path.abspath(main.__file__)),
+        env={**os.environ, "QMS_DATABASE_PATH": os.path.abspath(path)},
+    )
+    try:
+        wait_until_ready(base_url, server)
+        result = asyncio.run(drive_subscribers(base_url, server.pid, entity, subscribers, writes, burst, settle))
+    finally:
+        server.terminate()
+        server.wait()
+    result["fanout"].pop("throughput_rps")
+    result["fanout"].pop("bytes_per_request")
+    result["fanout"].pop("elapsed_s")
+    print(f"📡 {subscribers} subscribers: {result['bytes_per_subscriber']} B each, "
+          f"fan-out p95 {result['fanout']['p95_ms']} ms", file=sys.stderr)
+    return result
+
+# ==================== SHARD SCALING ====================
+async def drive_plant_writes(base_url: str, plants, duration: float, concurrency: int, batch: int):
+    latencies, failures = [], 0
+    deadline = time.perf_counter() + duration
+    
+    async def worker(index: int):
+        nonlocal failures
+        # Connections are spread round-robin over the plants, so every shard sees the same write pressure
+        headers = {"X-Plant": plants[index % len(plants)]}
+        for sequence in itertools.count():
+            if time.perf_counter() >= deadline:
+                break
+            names = [f"shard-{index}-{sequence}-{offset}" for offset in range(batch)]
+            started = time.perf_counter()
+            response = await client.post("/entity/employees/batch", json={"create": names}, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                failures += 1
+    
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return latencies, failures
+
+def bench_shards(data_dir: str, plant_counts, duration: float, concurrency: int, batch: int, workers: int, port: int):
+    results = []
+    for count in plant_counts:
+        plants = [f"plant{index}" for index in range(count)]
+        # Empty shards on every run, so each configuration writes into files of the same size
+        directory = os.path.abspath(os.path.join(data_dir, f"shards-{count}"))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=os.path.dirname(os.path.abspath(main.__file__)),
+            env={**os.environ, "QMS_PLANTS": ",".join(plants), "QMS_WORKERS": str(workers),
+                 "QMS_PLANT_DATABASE_PATH": os.path.join(directory, "qms-{plant}.db")},
+        )
+        try:
+            wait_until_ready(base_url, server)
+            latencies, failures = asyncio.run(drive_plant_writes(base_url, plants, duration, concurrency, batch))
+        finally:
+            server.terminate()
+            server.wait()
+        
+        result = {"plants": count, **summarize(latencies, failures, duration, 0)}
+        result.pop("bytes_per_request")
+        result["rows_per_s"] = round(len(latencies) * batch / duration, 1)
+        result["speedup"] = round(result["rows_per_s"] / results[0]["rows_per_s"], 2) if results else 1.0
+        results.append(result)
+        print(f"🏭 {count} plant(s): {result['rows_per_s']} rows/s, p95 {result['p95_ms']} ms", file=sys.stderr)
+    return results
+
+# ==================== CLI ====================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quality Management System benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    render_parser = commands.add_parser("render", help="Micro-benchmark render_items_list throughput")
+    render_parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000])
+    render_parser.add_argument("--min-time", type=float, default=1.0, help="Seconds to run each size")
+    
+    seed_parser = commands.add_parser("seed", help="Generate seeded fixture databases")
+    seed_parser.add_argument("--sizes", nargs="+", default=["10k"], help="Rows per entity: 10k, 1m, 10m or a number")
+    seed_parser.add_argument("--seed", type=int, default=42)
+    seed_parser.add_argument("--audit-ratio", type=float, default=1.0, help="audit_log rows per entity row")
+    seed_parser.add_argument("--data-dir", default="bench-data")
+    
+    http_parser = commands.add_parser("http", help="Drive every route through the ASGI app in-process")
+    http_parser.add_argument("--size", default="10k", help="Fixture rows per entity: 10k, 1m, 10m or a number")
+    http_parser.add_argument("--seed", type=int, default=42)
+    http_parser.add_argument("--audit-ratio", type=float, default=1.0)
+    http_parser.add_argument("--data-dir", default="bench-data")
+    http_parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    http_parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    http_parser.add_argument("--concurrency", type=int, default=8)
+    http_parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each read scenario")
+    http_parser.add_argument("--no-response-cache", action="store_true", help="Disable the server-side HTML cache")
+    http_parser.add_argument("--output", help="Write results JSON here as well as to stdout")
+    http_parser.add_argument("--baseline", help="Compare against a previously saved results JSON")
+    http_parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    http_parser.add_argument("--fail-on-regression", action="store_true")
+    
+    workers_parser = commands.add_parser("workers", help="Measure throughput scaling across uvicorn worker counts")
+    workers_parser.add_argument("--size", default="10k", help="Fixture rows per entity: 10k, 1m, 10m or a number")
+    workers_parser.add_argument("--seed", type=int, default=42)
+    workers_parser.add_argument("--audit-ratio", type=float, default=1.0)
+    workers_parser.add_argument("--data-dir", default="bench-data")
+    workers_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    workers_parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCALING_SCENARIOS))
+    workers_parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per worker count")
+    workers_parser.add_argument("--concurrency", type=int, default=16, help="Connections per client process")
+    workers_parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                                help="Load-generating processes")
+    workers_parser.add_argument("--port", type=int, default=8765)
+    
+    shards_parser = commands.add_parser("shards", help="Measure write throughput as plants are split into shards")
+    shards_parser.add_argument("--data-dir", default="bench-data")
+    shards_parser.add_argument("--plants", type=int, nargs="+", default=[1, 2, 4])
+    shards_parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per plant count")
+    shards_parser.add_argument("--concurrency", type=int, default=16)
+    shards_parser.add_argument("--batch", type=int, default=10, help="Rows created per request")
+    shards_parser.add_argument("--workers", type=int, default=1)
+    shards_parser.add_argument("--port", type=int, default=8767)
+    
+    sse_parser = commands.add_parser("sse", help="Hold idle change-feed subscribers and measure memory and fan-out")
+    sse_parser.add_argument("--size", default="10k", help="Fixture rows per entity: 10k, 1m, 10m or a number")
+    sse_parser.add_argument("--seed", type=int, default=42)
+    sse_parser.add_argument("--audit-ratio", type=float, default=1.0)
+    sse_parser.add_argument("--data-dir", default="bench-data")
+    sse_parser.add_argument("--entity", choices=[entity.value for entity in main.EntityType], default="employees")
+    sse_parser.add_argument("--subscribers", type=int, default=500)
+    sse_parser.add_argument("--writes", type=int, default=20, help="Spaced creates timed end to end")
+    sse_parser.add_argument("--burst", type=int, default=50, help="Back-to-back renames of one row")
+    sse_parser.add_argument("--settle", type=float, default=2.0, help="Idle seconds before sampling memory")
+    sse_parser.add_argument("--port", type=int, default=8766)
+    
+    args = parser.parse_args()
+    
+    if args.command == "render":
+        print(json.dumps({"render": bench_render(args.sizes, args.min_time)}, indent=2))
+    elif args.command == "seed":
+        for size in args.sizes:
+            rows = parse_size(size)
+            path = seed_database(fixture_path(args.data_dir, rows, args.seed), rows, args.seed, args.audit_ratio)
+            print(json.dumps({"path": path, **fixture_meta(path)}))
+    elif args.command == "http":
+        rows = parse_size(args.size)
+        path = seed_database(fixture_path(args.data_dir, rows, args.seed), rows, args.seed, args.audit_ratio)
+        scenarios = asyncio.run(bench_http(path, args.scenarios, args.requests, args.concurrency, args.seed,
+                                           args.warmup, not args.no_response_cache))
+        results = {
+            "meta": {
+                "fixture": fixture_meta(path),
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "response_cache": not args.no_response_cache,
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+            },
+            "scenarios": scenarios,
+        }
+        if args.baseline:
+            with open(args.baseline) as baseline:
+                results["comparison"] = compare_results(results, json.load(baseline), args.threshold)
+        if args.output:
+            with open(args.output, "w") as output:
+                json.dump(results, output, indent=2)
+        print(json.dumps(results, indent=2))
+        if args.fail_on_regression and results.get("comparison", {}).get("regressions"):
+            sys.exit(1)
+    elif args.command == "workers":
+        rows = parse_size(args.size)
+        path = seed_database(fixture_path(args.data_dir, rows, args.seed), rows, args.seed, args.audit_ratio)
+        print(json.dumps({
+            "meta": {
+                "fixture": fixture_meta(path),
+                "scenarios": args.scenarios,
+                "duration_s": args.duration,
+                "clients": args.clients,
+                "concurrency_per_client": args.concurrency,
+                "cpus": os.cpu_count(),
+                "revision": git_revision(),
+            },
+            "scaling": bench_workers(path, args.workers, args.scenarios, args.duration, args.concurrency, args.clients,
+                                     args.port, args.seed),
+        }, indent=2))
+    elif args.command == "sse":
+        rows = parse_size(args.size)
+        path = seed_database(fixture_path(args.data_dir, rows, args.seed), rows, args.seed, args.audit_ratio)
+        print(json.dumps({
+            "meta": {
+                "fixture": fixture_meta(path),
+                "entity": args.entity,
+                "revision": git_revision(),
+                "python": platform.python_version(),
+            },
+            "sse": bench_sse(path, args.entity, args.subscribers, args.writes, args.burst, args.settle, args.port),
+        }, indent=2))
+    elif args.command == "shards":
+        print(json.dumps({
+            "meta": {
+                "duration_s": args.duration,
+                "concurrency": args.concurrency,
+                "batch": args.batch,
+                "workers": args.workers,
+                "cpus": os.cpu_count(),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+            },
+            "scaling": bench_shards(args.data_dir, args.plants, args.duration, args.concurrency, args.batch,
+                                    args.workers, args.port),
+        }, indent=2))
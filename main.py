@@ -1,22 +1,129 @@
 # main.py
-from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Form, File, UploadFile
+from fastapi.responses import HTMLResponse, StreamingResponse, Response, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from contextlib import asynccontextmanager
-from typing import Optional
+from starlette.datastructures import MutableHeaders
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import OrderedDict
+from typing import Optional, List
 import sqlite3
+import os
+import glob
+import threading
+import queue
+import time
+import asyncio
+import contextvars
+import functools
+import base64
+import zlib
+import gzip
+import hashlib
+import re
+import string
 import uuid
 import io
 import csv
 import json
+import bisect
+import calendar
+import heapq
+import itertools
 from datetime import datetime, timedelta
+from html import escape as html_escape
+from urllib.parse import urlencode, quote
 from enum import Enum
 from pydantic import BaseModel, Field, validator
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # ==================== CONFIGURATION ====================
 class Config:
-    DATABASE_PATH = 'qms.db'
+    DATABASE_PATH = os.environ.get('QMS_DATABASE_PATH', 'qms.db')
+    PLANTS = tuple(plant for plant in os.environ.get('QMS_PLANTS', '').split(',') if plant)  # empty: one unsharded file
+    PLANT_DATABASE_PATH = os.environ.get('QMS_PLANT_DATABASE_PATH', 'qms-{plant}.db')
+    DEFAULT_PLANT = os.environ.get('QMS_PLANT')  # serves requests that name no plant
+    PLANT_HEADER = "x-plant"
+    PLANT_PATH_PREFIX = "/plants/"
+    PLANT_COOKIE = "qms_plant"
     PAGE_SIZE = 20
+    POOL_SIZE = 8
+    POOL_TIMEOUT = 5.0
+    SQLITE_BUSY_TIMEOUT = 5.0
+    SQLITE_CACHE_SIZE_KB = 65536
+    SQLITE_MMAP_SIZE = 268435456
+    STATEMENT_CACHE_SIZE = 256
+    DB_READ_WORKERS = 4
+    DB_READ_QUEUE_LIMIT = 256
+    DB_WRITE_QUEUE_LIMIT = 256
+    PAGINATION_MODE = "keyset"
+    COUNT_MODE = "cached"
+    COUNT_CACHE_TTL = 30.0
+    COUNT_CACHE_SIZE = 1024
+    ENTITY_CACHE_SIZE = 10000
+    ENTITY_CACHE_TTL = None  # seconds; None relies on write invalidation alone
+    SEARCH_MIN_LENGTH = 3
+    SEARCH_STATE_RECHECK = 30.0
+    AUTOCOMPLETE_LIMIT = 10
+    AUTOCOMPLETE_MAX_LIMIT = 50
+    AUTOCOMPLETE_WARM = True
+    EXPORT_BATCH_SIZE = 1000
+    EXPORT_GZIP_LEVEL = 6
+    CHANGE_FEED_COALESCE = 0.05  # seconds a burst is collected before it is rendered once and fanned out
+    CHANGE_FEED_MAX_PENDING = 200
+    CHANGE_FEED_MAX_SUBSCRIBERS = 1000
+    CHANGE_FEED_HEARTBEAT = 15.0
+    CHANGE_FEED_POLL_INTERVAL = 1.0
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_ENCODINGS = ("zstd", "br", "gzip")  # server preference; unavailable codecs are skipped
+    COMPRESSION_LEVELS = {"zstd": 3, "br": 5, "gzip": 6}
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_MAX_ERRORS = 100
+    MAX_NAME_LENGTH = 200
+    BATCH_MAX_OPERATIONS = 1000
+    SQL_METRICS = True
+    SLOW_QUERY_MS = None
+    LOOP_LAG_INTERVAL = 0.5
+    STATS_RECONCILE_INTERVAL = 21600
+    RESPONSE_CACHE_SIZE = 512
+    VERSION_CHECK_INTERVAL = 0.05  # seconds another worker's commit may go unseen by this worker's caches; 0 checks every read
+    WORKERS = int(os.environ.get('QMS_WORKERS', '1'))
+    RELOAD = os.environ.get('QMS_RELOAD', '0') == '1'  # development only: restart on source changes, single process
+    MUTATION_RESPONSE = "incremental"
+    AUDIT_MODE = "strict"
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_FLUSH_INTERVAL = 0.05
+    AUDIT_QUEUE_LIMIT = 10000
+    AUDIT_SPILL_FSYNC = False
+    AUDIT_FLUSH_ATTEMPTS = 6  # durable writers get the error after this many tries; async batches keep retrying from the spill
+    AUDIT_PAGE_SIZE = 50
+    AUDIT_MAX_PAGE_SIZE = 500
+    DMT_PAGE_SIZE = 50
+    DMT_MAX_PAGE_SIZE = 500
+    DMT_DASHBOARD_DAYS = 30
+    DMT_CAR_AGE_BUCKETS = (7, 30, 90)  # upper bounds in days; older CARs land in a final open-ended bucket
+    AUDIT_RETENTION_DAYS = 365
+    AUDIT_ARCHIVE_BATCH_SIZE = 5000
+    AUDIT_ARCHIVE_INTERVAL = 86400
+    SNAPSHOT_KEEP = 7
+    SNAPSHOT_INTERVAL = 86400
+    SNAPSHOT_PAGES_PER_STEP = 256
+    SNAPSHOT_STEP_PAUSE = 0.005  # seconds slept between backup steps so live traffic keeps the disk
+    SNAPSHOT_GZIP_LEVEL = 6
 
 # ==================== ENUMS ====================
 class EntityType(str, Enum):
@@ -26,153 +133,3467 @@ class EntityType(str, Enum):
     PARTNUMBERS = "partnumbers"
     CALIBRATIONS = "calibrations"
 
+# ==================== METRICS ====================
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+    
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+    
+    def describe(self, name: str, kind: str, help: str):
+        self._help[name] = (kind, help)
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+    
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+    
+    def render(self, extra_gauges=()):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted([*self._gauges.items(), *extra_gauges])
+            histograms = sorted((key, (h.buckets, list(h.counts), h.sum, h.count)) for key, h in self._histograms.items())
+        
+        lines, described = [], set()
+        
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self._help.get(name, (kind, name.replace('_', ' ')))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+        
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+               for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+def stats_gauges(prefix: str, stats, labels=()):
+    # Flattens the nested stats() dicts already served on /stats into gauges
+    for key, value in stats.items():
+        name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}"
+        if isinstance(value, dict):
+            yield from stats_gauges(name, value, labels)
+        elif isinstance(value, (int, float)):
+            yield (name, labels), float(value)
+
+metrics = Metrics()
+metrics.describe("qms_http_request_duration_seconds", "histogram", "HTTP request latency by route")
+metrics.describe("qms_http_response_bytes", "histogram", "HTTP response body size by route")
+metrics.describe("qms_http_requests_in_flight", "gauge", "HTTP requests currently being served")
+metrics.describe("qms_sql_statements_total", "counter", "SQL statements executed by normalized text")
+metrics.describe("qms_sql_seconds_total", "counter", "Time spent executing and fetching by normalized statement")
+metrics.describe("qms_sql_rows_total", "counter", "Rows fetched by normalized statement")
+metrics.describe("qms_sql_slow_total", "counter", "Statements slower than Config.SLOW_QUERY_MS")
+metrics.describe("qms_render_seconds", "histogram", "HTML render time by helper")
+metrics.describe("qms_event_loop_lag_seconds", "histogram", "Event loop scheduling delay")
+metrics.describe("qms_compression_responses_total", "counter", "Compressed responses by encoding and source")
+metrics.describe("qms_compression_saved_bytes_total", "counter", "Bytes kept off the wire by response compression")
+metrics.describe("qms_compression_seconds_total", "counter", "CPU time spent compressing by encoding")
+
+# ==================== SQL INSTRUMENTATION ====================
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_REPEATS = re.compile(r"(\(\?(?:, \?)*\))(?:, \(\?(?:, \?)*\))+|\?(?:, \?)+")
+
+@functools.lru_cache(maxsize=2048)
+def normalize_sql(sql: str):
+    text = " ".join(sql.split())
+    text = SQL_LITERALS.sub("?", text)
+    # Multi-row VALUES lists and IN lists vary in length with the batch, so collapse them to one entry
+    return SQL_REPEATS.sub(lambda match: match.group(1) or "?", text)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _statement = None
+    _elapsed = 0.0
+    _rows = 0
+    _logged = False
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._begin(sql, time.perf_counter() - started)
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._begin(sql, time.perf_counter() - started)
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - started, row is not None)
+        return row
+    
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(size if size is not None else self.arraysize)
+        self._fetched(time.perf_counter() - started, len(rows))
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - started, len(rows))
+        return rows
+    
+    def __next__(self):
+        row = super().__next__()
+        self._rows += 1
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        self._finish()
+    
+    def _begin(self, sql: str, elapsed: float):
+        self._statement = normalize_sql(sql)
+        self._elapsed = elapsed
+        self._rows = 0
+        self._logged = False
+        self._check_slow()
+    
+    def _fetched(self, elapsed: float, rows: int):
+        self._elapsed += elapsed
+        self._rows += rows
+        self._check_slow()
+    
+    def _check_slow(self):
+        if Config.SLOW_QUERY_MS is not None and not self._logged and self._elapsed * 1000 >= Config.SLOW_QUERY_MS:
+            self._logged = True
+            metrics.inc("qms_sql_slow_total")
+            print(f"🐢 Slow query ({self._elapsed * 1000:.1f} ms): {self._statement}")
+    
+    def _finish(self):
+        # Time and rows accrue across execute and fetches, so a statement is recorded when its cursor moves on
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            metrics.inc("qms_sql_statements_total", statement=statement)
+            metrics.inc("qms_sql_seconds_total", self._elapsed, statement=statement)
+            metrics.inc("qms_sql_rows_total", self._rows, statement=statement)
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute builds a plain C cursor internally, so route it through the instrumented one
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def timed_render(fn):
+    name = fn.__name__
+    
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.observe("qms_render_seconds", time.perf_counter() - started, helper=name)
+    
+    return wrapper
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = 0
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        started = time.perf_counter()
+        status, size = 500, 0
+        
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+        
+        self._in_flight += 1
+        metrics.set("qms_http_requests_in_flight", self._in_flight)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._in_flight -= 1
+            metrics.set("qms_http_requests_in_flight", self._in_flight)
+            # Label by route template, not raw path, so ids and query strings don't explode cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.observe("qms_http_request_duration_seconds", time.perf_counter() - started,
+                            method=scope["method"], route=route, status=status)
+            metrics.observe("qms_http_response_bytes", size, SIZE_BUCKETS, route=route)
+
+# ==================== COMPRESSION ====================
+class BrotliStream:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+    
+    def compress(self, data: bytes):
+        return self._compressor.process(data)
+    
+    def flush(self):
+        return self._compressor.finish()
+
+# Each codec factory returns an incremental compressor exposing compress() and flush()
+CODECS = {"gzip": lambda level: zlib.compressobj(level, zlib.DEFLATED, 31)}
+if brotli is not None:
+    CODECS["br"] = BrotliStream
+if zstandard is not None:
+    CODECS["zstd"] = lambda level: zstandard.ZstdCompressor(level=level).compressobj()
+
+COMPRESSIBLE_TYPES = ("text/html", "text/plain", "text/csv", "text/css", "application/json",
+                      "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+@functools.lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding: Optional[str]):
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        match = re.search(r"q\s*=\s*([0-9.]+)", params)
+        try:
+            accepted[name.strip().lower()] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            continue
+    for encoding in Config.COMPRESSION_ENCODINGS:
+        if encoding in CODECS and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def compress_body(encoding: str, data: bytes, level: Optional[int] = None):
+    started = time.thread_time()
+    compressor = CODECS[encoding](level or Config.COMPRESSION_LEVELS[encoding])
+    compressed = compressor.compress(data) + compressor.flush()
+    metrics.inc("qms_compression_seconds_total", time.thread_time() - started, encoding=encoding)
+    return compressed
+
+def compress_stream(chunks, encoding: str, level: Optional[int] = None):
+    compressor = CODECS[encoding](level or Config.COMPRESSION_LEVELS[encoding])
+    for chunk in chunks:
+        started = time.thread_time()
+        data = compressor.compress(chunk)
+        metrics.inc("qms_compression_seconds_total", time.thread_time() - started, encoding=encoding)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def record_compression(encoding: str, raw: int, compressed: int, source: str):
+    metrics.inc("qms_compression_responses_total", encoding=encoding, source=source)
+    metrics.inc("qms_compression_saved_bytes_total", raw - compressed, encoding=encoding)
+
+class Precompressed:
+    # Encoded variants are built on the first request that asks for them, then served from memory
+    def __init__(self, content: str, media_type: str = "text/html; charset=utf-8"):
+        self.body = content.encode()
+        self.media_type = media_type
+        self.etag = f'W/"{hashlib.sha1(self.body).hexdigest()[:16]}"'
+        self._variants = {}
+    
+    def encoded(self, encoding: Optional[str]):
+        if encoding is None or len(self.body) < Config.COMPRESSION_MIN_SIZE:
+            return None, self.body
+        data = self._variants.get(encoding)
+        if data is None:
+            data = self._variants[encoding] = compress_body(encoding, self.body)
+            record_compression(encoding, len(self.body), len(data), "live")
+        else:
+            record_compression(encoding, len(self.body), len(data), "cached")
+        return encoding, data
+    
+    def response(self, request: Request, headers=None):
+        encoding, body = self.encoded(negotiate_encoding(request.headers.get("accept-encoding")))
+        headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=self.media_type, headers=headers)
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = next((value.decode("latin-1") for key, value in scope["headers"] if key == b"accept-encoding"), None)
+        encoding = negotiate_encoding(accept)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        
+        start, compressor, passthrough = None, None, False
+        raw = compressed = 0
+        cpu = 0.0
+        
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough, raw, compressed, cpu
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if (message["status"] in (204, 304) or "content-encoding" in headers
+                        or content_type not in COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+            
+            body, more = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                if not more and len(body) < Config.COMPRESSION_MIN_SIZE:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                headers = MutableHeaders(scope=start)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                del headers["Content-Length"]
+                compressor = CODECS[encoding](Config.COMPRESSION_LEVELS[encoding])
+            
+            # Streamed bodies (exports) are compressed chunk by chunk instead of being buffered whole
+            started = time.thread_time()
+            data = compressor.compress(body)
+            if not more:
+                data += compressor.flush()
+            cpu += time.thread_time() - started
+            raw += len(body)
+            compressed += len(data)
+            
+            if start is not None:
+                if not more:
+                    MutableHeaders(scope=start)["Content-Length"] = str(len(data))
+                await send(start)
+                start = None
+            if data or not more:
+                await send({"type": "http.response.body", "body": data, "more_body": more})
+            if not more:
+                metrics.inc("qms_compression_seconds_total", cpu, encoding=encoding)
+                record_compression(encoding, raw, compressed, "live")
+        
+        await self.app(scope, receive, send_wrapper)
+
+# ==================== CONNECTION POOL ====================
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    def __init__(self, factory, size: int, timeout: float):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+    
+    def acquire(self):
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            if grow:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = time.perf_counter() - start
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time += waited
+                    self._max_wait = max(self._max_wait, waited)
+        
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+        return conn
+    
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+            return
+        
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+    
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._created - self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time * 1000, 3),
+                "wait_time_max_ms": round(self._max_wait * 1000, 3),
+                "timeouts": self._timeouts,
+            }
+
+# ==================== DB EXECUTOR ====================
+class ExecutorSaturated(Exception):
+    pass
+
+class ExecutorLane:
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._peak_queued = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._run_time = 0.0
+    
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturated(f"Database {self.name} queue is full ({self.max_queue} pending)")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"db-{self.name}")
+            self._queued += 1
+            self._submitted += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+            executor = self._executor
+        
+        call = functools.partial(fn, *args, **kwargs)
+        # Carries the caller's plant into the worker thread, where repository code resolves the shard again
+        future = executor.submit(contextvars.copy_context().run, self._call, time.perf_counter(), call)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+    
+    def _call(self, submitted: float, call):
+        started = time.perf_counter()
+        waited = started - submitted
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._wait_time += waited
+            self._max_wait = max(self._max_wait, waited)
+        try:
+            return call()
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._run_time += time.perf_counter() - started
+    
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled():
+                self._queued -= 1
+            elif future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+    
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+    
+    def stats(self):
+        with self._lock:
+            started = self._completed + self._failed + self._active
+            return {
+                "workers": self.workers,
+                "queue_depth": self._queued,
+                "queue_limit": self.max_queue,
+                "peak_queue_depth": self._peak_queued,
+                "active": self._active,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "wait_time_total_ms": round(self._wait_time * 1000, 3),
+                "wait_time_avg_ms": round(self._wait_time * 1000 / started, 3) if started else 0.0,
+                "wait_time_max_ms": round(self._max_wait * 1000, 3),
+                "run_time_total_ms": round(self._run_time * 1000, 3),
+            }
+
+class DBExecutor:
+    def __init__(self):
+        self.read_lane = ExecutorLane("read", Config.DB_READ_WORKERS, Config.DB_READ_QUEUE_LIMIT)
+        self.write_lane = ExecutorLane("write", 1, Config.DB_WRITE_QUEUE_LIMIT)
+    
+    async def read(self, fn, *args, **kwargs):
+        return await self.read_lane.run(fn, *args, **kwargs)
+    
+    async def write(self, fn, *args, **kwargs):
+        return await self.write_lane.run(fn, *args, **kwargs)
+    
+    def shutdown(self):
+        self.read_lane.shutdown()
+        self.write_lane.shutdown()
+    
+    def stats(self):
+        return {"read": self.read_lane.stats(), "write": self.write_lane.stats()}
+
+# ==================== COUNT CACHE ====================
+class CountCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+            return None
+    
+    def put(self, key, total: int):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (total, time.monotonic() + self.ttl)
+    
+    def invalidate(self, table: str):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == table]:
+                del self._entries[key]
+    
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+# ==================== ENTITY CACHE ====================
+MISSING = object()
+
+class EntityCache:
+    def __init__(self, max_entries: int, ttl: Optional[float]):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+    
+    def generation(self, table: str):
+        with self._lock:
+            return self._generations.get(table, 0)
+    
+    def get_many(self, table: str, ids):
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for item_id in ids:
+                key = (table, item_id)
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self._expirations += 1
+                    entry = None
+                if entry is None:
+                    self._misses += 1
+                    missing.append(item_id)
+                    continue
+                self._entries.move_to_end(key)
+                if entry[0] is MISSING:
+                    self._negative_hits += 1
+                else:
+                    self._hits += 1
+                found[item_id] = entry[0]
+        return found, missing
+    
+    def put_many(self, table: str, items, generation: int):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            # A write landed while these rows were being read, so they may already be stale
+            if self._generations.get(table, 0) != generation:
+                return
+            for item_id, item in items.items():
+                self._entries[(table, item_id)] = (item, expires)
+                self._entries.move_to_end((table, item_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+    
+    def invalidate(self, table: str, ids):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for item_id in ids:
+                if self._entries.pop((table, item_id), None) is not None:
+                    self._invalidations += 1
+    
+    def invalidate_table(self, table: str):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            for key in [k for k in self._entries if k[0] == table]:
+                del self._entries[key]
+                self._invalidations += 1
+    
+    def stats(self):
+        with self._lock:
+            hits = self._hits + self._negative_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "negative_hits": self._negative_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+# ==================== SEARCH INDEX ====================
+class SearchIndexUnavailable(Exception):
+    pass
+
+class SearchIndex:
+    def __init__(self, database):
+        self.database = database
+        self.available = True
+        self._ready = {}
+        self._checked = 0.0
+    
+    def create(self, conn, table: str):
+        existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (f"{table}_fts",)).fetchone()
+        try:
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts
+                USING fts5(name, content='{table}', content_rowid='rowid', tokenize='trigram')
+            """)
+        except sqlite3.OperationalError:
+            self.available = False
+            return
+        
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+                INSERT INTO {table}_fts (rowid, name) VALUES (new.rowid, new.name);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF name ON {table} BEGIN
+                INSERT INTO {table}_fts ({table}_fts, rowid, name) VALUES ('delete', old.rowid, old.name);
+                INSERT INTO {table}_fts (rowid, name) VALUES (new.rowid, new.name);
+            END
+        """)
+        
+        # A fresh index over an empty table is complete; otherwise it waits for rebuild()
+        if not existed and conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None:
+            conn.execute("INSERT OR REPLACE INTO search_index_state (entity_type, built_at) VALUES (?, CURRENT_TIMESTAMP)",
+                         (table,))
+    
+    def usable(self, table: str, search: str):
+        if not self.available or len(search) < Config.SEARCH_MIN_LENGTH:
+            return False
+        if not self._ready.get(table) and time.monotonic() - self._checked > Config.SEARCH_STATE_RECHECK:
+            self.refresh()
+        return self._ready.get(table, False)
+    
+    def refresh(self):
+        with self.database.connection() as conn:
+            rows = conn.execute("SELECT entity_type FROM search_index_state").fetchall()
+            indexed = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB '*_fts'")}
+        self.available = all(f"{entity.value}_fts" in indexed for entity in EntityType)
+        self._ready = {row[0]: True for row in rows}
+        self._checked = time.monotonic()
+    
+    def rebuild(self, table: str):
+        if not self.available:
+            raise SearchIndexUnavailable("This SQLite build lacks FTS5 with the trigram tokenizer")
+        
+        with self.database.connection() as conn:
+            conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+            conn.execute("INSERT OR REPLACE INTO search_index_state (entity_type, built_at) VALUES (?, CURRENT_TIMESTAMP)",
+                         (table,))
+            conn.commit()
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        
+        self._ready[table] = True
+        return rows
+    
+    def stats(self):
+        return {"available": self.available, "ready": sorted(t for t, ready in self._ready.items() if ready)}
+
+# ==================== AUTOCOMPLETE INDEX ====================
+WORD_START = re.compile(r"\b\w")
+
+class PrefixTable:
+    # Sorted (casefolded key, name, id) tuples: whole names first, then the words inside them
+    def __init__(self, rows):
+        self._names = []
+        self._words = []
+        self._entries = {}
+        for item_id, name in rows:
+            self._entries[item_id] = name
+            for key, target in self._keys(item_id, name):
+                target.append(key)
+        self._names.sort()
+        self._words.sort()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _keys(self, item_id: str, name: str):
+        folded = name.casefold()
+        yield (folded, name, item_id), self._names
+        for match in WORD_START.finditer(folded):
+            if match.start():
+                yield (folded[match.start():], name, item_id), self._words
+    
+    def add(self, item_id: str, name: str):
+        self.remove(item_id)
+        self._entries[item_id] = name
+        for key, target in self._keys(item_id, name):
+            bisect.insort(target, key)
+    
+    def remove(self, item_id: str):
+        name = self._entries.pop(item_id, None)
+        if name is None:
+            return
+        for key, target in self._keys(item_id, name):
+            index = bisect.bisect_left(target, key)
+            if index < len(target) and target[index] == key:
+                del target[index]
+    
+    def search(self, prefix: str, limit: int):
+        prefix = prefix.casefold()
+        results, seen = [], set()
+        for target in (self._names, self._words):
+            index = bisect.bisect_left(target, (prefix,))
+            while index < len(target) and len(results) < limit and target[index][0].startswith(prefix):
+                _, name, item_id = target[index]
+                if item_id not in seen:
+                    seen.add(item_id)
+                    results.append({"id": item_id, "name": name})
+                index += 1
+        return results
+
+class AutocompleteIndex:
+    def __init__(self, database):
+        self.database = database
+        self._tables = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._builds = 0
+        self._lookups = 0
+    
+    def build(self, table: str):
+        while True:
+            with self._lock:
+                if table in self._tables:
+                    return
+                generation = self._generations.get(table, 0)
+            with self.database.connection() as conn:
+                rows = conn.execute(f"SELECT id, name FROM {table} WHERE is_active = 1").fetchall()
+            index = PrefixTable(rows)
+            with self._lock:
+                # A write that landed mid-read is missing from the snapshot, so read again
+                if self._generations.get(table, 0) == generation:
+                    self._tables[table] = index
+                    self._builds += 1
+                    return
+    
+    def search(self, table: str, prefix: str, limit: int):
+        with self._lock:
+            index = self._tables.get(table)
+            if index is None:
+                return None
+            self._lookups += 1
+            return index.search(prefix, limit)
+    
+    def apply(self, table: str, entries):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            index = self._tables.get(table)
+            if index is None:
+                return
+            for item_id, action, changes in entries:
+                if action == "CREATE":
+                    index.add(item_id, changes["name"])
+                elif action == "UPDATE":
+                    index.add(item_id, changes["new"])
+                else:
+                    index.remove(item_id)
+    
+    def invalidate(self, table: str):
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            self._tables.pop(table, None)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "tables": {table: len(index) for table, index in self._tables.items()},
+                "builds": self._builds,
+                "lookups": self._lookups,
+            }
+
+# ==================== ENTITY COUNTERS ====================
+class EntityCounters:
+    def __init__(self, database):
+        self.database = database
+    
+    def create(self, conn, table: str):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_ai AFTER INSERT ON {table} WHEN new.is_active = 1 BEGIN
+                UPDATE entity_stats SET active_count = active_count + 1 WHERE entity_type = '{table}';
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_au AFTER UPDATE OF is_active ON {table}
+            WHEN old.is_active IS NOT new.is_active BEGIN
+                UPDATE entity_stats
+                SET active_count = active_count + (new.is_active = 1) - (old.is_active = 1)
+                WHERE entity_type = '{table}';
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_stats_ad AFTER DELETE ON {table} WHEN old.is_active = 1 BEGIN
+                UPDATE entity_stats SET active_count = active_count - 1 WHERE entity_type = '{table}';
+            END
+        """)
+        
+        if not conn.execute("SELECT 1 FROM entity_stats WHERE entity_type = ?", (table,)).fetchone():
+            conn.execute(f"INSERT INTO entity_stats (entity_type, active_count) SELECT ?, COUNT(*) FROM {table} WHERE is_active = 1",
+                         (table,))
+    
+    def counts(self):
+        with self.database.connection() as conn:
+            rows = conn.execute("SELECT entity_type, active_count FROM entity_stats").fetchall()
+        return {row[0]: row[1] for row in rows}
+    
+    def count(self, table: str):
+        with self.database.connection() as conn:
+            row = conn.execute("SELECT active_count FROM entity_stats WHERE entity_type = ?", (table,)).fetchone()
+        return row[0] if row else None
+    
+    def reconcile(self):
+        drift = {}
+        with self.database.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for entity in EntityType:
+                actual = conn.execute(f"SELECT COUNT(*) FROM {entity.value} WHERE is_active = 1").fetchone()[0]
+                row = conn.execute("SELECT active_count FROM entity_stats WHERE entity_type = ?", (entity.value,)).fetchone()
+                if row is None or row[0] != actual:
+                    drift[entity.value] = {"stored": row[0] if row else None, "actual": actual}
+                    conn.execute("INSERT OR REPLACE INTO entity_stats (entity_type, active_count) VALUES (?, ?)",
+                                 (entity.value, actual))
+            conn.commit()
+        return drift
+
+# ==================== DMT ROLLUPS ====================
+DMT_TABLE = "dmt_records"
+
+class DmtRollups:
+    # Trigger-maintained aggregates, so dashboards read a few hundred rollup rows instead of every record
+    def __init__(self, database):
+        self.database = database
+    
+    def create(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dmt_defect_rollup (
+                day TEXT NOT NULL,
+                part_number_id TEXT NOT NULL,
+                workcenter_id TEXT NOT NULL,
+                records INTEGER NOT NULL DEFAULT 0,
+                qty INTEGER NOT NULL DEFAULT 0,
+                open_records INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, part_number_id, workcenter_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_dmt_defect_rollup_part ON dmt_defect_rollup(part_number_id, day)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_dmt_defect_rollup_workcenter ON dmt_defect_rollup(workcenter_id, day)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS dmt_open_car_rollup (
+                day TEXT NOT NULL,
+                car_type TEXT NOT NULL,
+                open_records INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, car_type)
+            ) WITHOUT ROWID
+        ''')
+        
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {DMT_TABLE}_rollup_ai AFTER INSERT ON {DMT_TABLE} BEGIN
+                {self._contribution("new", "")}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {DMT_TABLE}_rollup_ad AFTER DELETE ON {DMT_TABLE} BEGIN
+                {self._contribution("old", "-")}
+                {self._prune("old")}
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {DMT_TABLE}_rollup_au
+            AFTER UPDATE OF date, part_number_id, workcenter_id, qty, car_type, dmt_closed, is_active ON {DMT_TABLE} BEGIN
+                {self._contribution("old", "-")}
+                {self._contribution("new", "")}
+                {self._prune("old")}
+            END
+        """)
+    
+    def _contribution(self, row: str, sign: str):
+        # The WHERE clauses also keep SQLite from parsing ON CONFLICT as a join constraint
+        return f"""
+            INSERT INTO dmt_defect_rollup (day, part_number_id, workcenter_id, records, qty, open_records)
+            SELECT {row}.date, COALESCE({row}.part_number_id, ''), COALESCE({row}.workcenter_id, ''),
+                   {sign}1, {sign}COALESCE({row}.qty, 0), {sign}({row}.dmt_closed = 0)
+            WHERE {row}.is_active = 1
+            ON CONFLICT (day, part_number_id, workcenter_id) DO UPDATE SET
+                records = records + excluded.records,
+                qty = qty + excluded.qty,
+                open_records = open_records + excluded.open_records;
+            INSERT INTO dmt_open_car_rollup (day, car_type, open_records)
+            SELECT {row}.date, COALESCE({row}.car_type, ''), {sign}1
+            WHERE {row}.is_active = 1 AND {row}.dmt_closed = 0
+            ON CONFLICT (day, car_type) DO UPDATE SET open_records = open_records + excluded.open_records;
+        """
+    
+    def _prune(self, row: str):
+        return f"""
+            DELETE FROM dmt_defect_rollup
+            WHERE day = {row}.date AND part_number_id = COALESCE({row}.part_number_id, '')
+              AND workcenter_id = COALESCE({row}.workcenter_id, '') AND records = 0;
+            DELETE FROM dmt_open_car_rollup
+            WHERE day = {row}.date AND car_type = COALESCE({row}.car_type, '') AND open_records = 0;
+        """
+    
+    def defects(self, since: Optional[str], until: Optional[str], by: str, part_number_id: Optional[str] = None,
+                workcenter_id: Optional[str] = None, limit: int = 20):
+        key = {"part": "part_number_id", "workcenter": "workcenter_id", "day": "day"}[by]
+        where, params = [], []
+        for column, value in (("day >= ?", since), ("day <= ?", until),
+                              ("part_number_id = ?", part_number_id), ("workcenter_id = ?", workcenter_id)):
+            if value:
+                where.append(column)
+                params.append(value)
+        order = "key DESC" if by == "day" else "records DESC, key"
+        with self.database.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT {key} AS key, SUM(records) AS records, SUM(qty) AS qty, SUM(open_records) AS open_records
+                FROM dmt_defect_rollup {"WHERE " + " AND ".join(where) if where else ""}
+                GROUP BY key ORDER BY {order} LIMIT ?
+            """, (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def open_cars_by_age(self, today: Optional[str] = None):
+        today = datetime.strptime(today, "%Y-%m-%d") if today else datetime.now()
+        labels = [f"≤{days}d" for days in Config.DMT_CAR_AGE_BUCKETS] + [f">{Config.DMT_CAR_AGE_BUCKETS[-1]}d"]
+        buckets = {label: {"age": label, "dmt": 0, "ndmt": 0, "total": 0} for label in labels}
+        with self.database.connection() as conn:
+            rows = conn.execute("SELECT day, car_type, open_records FROM dmt_open_car_rollup").fetchall()
+        for day, car_type, count in rows:
+            age = (today - datetime.strptime(day, "%Y-%m-%d")).days
+            label = labels[bisect.bisect_left(Config.DMT_CAR_AGE_BUCKETS, age)]
+            if car_type in ("dmt", "ndmt"):
+                buckets[label][car_type] += count
+            buckets[label]["total"] += count
+        return list(buckets.values())
+    
+    def reconcile(self):
+        expected = {
+            "dmt_defect_rollup": f"""
+                SELECT date, COALESCE(part_number_id, ''), COALESCE(workcenter_id, ''),
+                       COUNT(*), SUM(COALESCE(qty, 0)), SUM(dmt_closed = 0)
+                FROM {DMT_TABLE} WHERE is_active = 1 GROUP BY 1, 2, 3
+            """,
+            "dmt_open_car_rollup": f"""
+                SELECT date, COALESCE(car_type, ''), COUNT(*)
+                FROM {DMT_TABLE} WHERE is_active = 1 AND dmt_closed = 0 GROUP BY 1, 2
+            """,
+        }
+        drift = {}
+        with self.database.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for table, query in expected.items():
+                differing = conn.execute(f"""
+                    SELECT (SELECT COUNT(*) FROM (SELECT * FROM ({query}) EXCEPT SELECT * FROM {table}))
+                         + (SELECT COUNT(*) FROM (SELECT * FROM {table} EXCEPT SELECT * FROM ({query})))
+                """).fetchone()[0]
+                if differing:
+                    drift[table] = differing
+                    conn.execute(f"DELETE FROM {table}")
+                    conn.execute(f"INSERT INTO {table} {query}")
+            conn.commit()
+        return drift
+
+# ==================== AUDIT PIPELINE ====================
+class AuditPipeline:
+    MODES = ("strict", "durable", "async")
+    
+    def __init__(self, database, mode: str, batch_size: int, flush_interval: float, max_queue: int, spill_prefix: str):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown audit mode: {mode}")
+        self.db = database
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_prefix = spill_prefix
+        self.spill_path = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+        self._spill = None
+        self._seq = 0
+        self._flushed_seq = 0
+        self._thread = None
+        self._stopping = False
+        self._staged = 0
+        self._flushes = 0
+        self._flushed = 0
+        self._max_batch = 0
+        self._flush_time = 0.0
+        self._max_flush = 0.0
+        self._failures = 0
+        self._spilled = 0
+        self._replayed = 0
+        self._full_waits = 0
+    
+    def create(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audit_spill_files (
+                spill TEXT PRIMARY KEY,
+                flushed_seq INTEGER NOT NULL
+            )
+        ''')
+    
+    def stage(self, c, entity_type: str, entries):
+        if self.mode == "strict":
+            c.executemany("INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, ?, ?)",
+                          [(entity_type, entity_id, action, json.dumps(changes) if changes is not None else None)
+                           for entity_id, action, changes in entries])
+            return []
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        return [[entity_type, entity_id, action, changes, timestamp] for entity_id, action, changes in entries]
+    
+    def dispatch(self, *events):
+        if not events:
+            return None
+        
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+                self._thread.start()
+        
+        future = Future() if self.mode == "durable" else None
+        with self._dispatch_lock:
+            if self.mode == "async":
+                # Spill before enqueueing so a crash between here and the flush is replayed on the next start
+                seqs = range(self._seq + 1, self._seq + 1 + len(events))
+                spill = self._spill_file()
+                spill.write("".join(json.dumps([seq, *event], separators=(",", ":")) + "\n"
+                                    for seq, event in zip(seqs, events)))
+                spill.flush()
+                if Config.AUDIT_SPILL_FSYNC:
+                    os.fsync(spill.fileno())
+                self._seq = seqs[-1]
+            else:
+                seqs = [None] * len(events)
+            for index, (seq, event) in enumerate(zip(seqs, events)):
+                self._put((seq, event, future if index == len(events) - 1 else None))
+        
+        with self._lock:
+            self._staged += len(events)
+            if self.mode == "async":
+                self._spilled += len(events)
+        
+        pending = getattr(self._local, "pending", None)
+        if future is not None and pending is not None:
+            pending.append(future)
+        return future
+    
+    def tracked(self, fn, *args):
+        self._local.pending = []
+        try:
+            result = fn(*args)
+            return result, self._local.pending
+        finally:
+            self._local.pending = None
+    
+    def _put(self, entry):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._full_waits += 1
+            self._queue.put(entry)
+    
+    def _spill_file(self):
+        if self._spill is None:
+            # One spill file per worker process, locked for the process lifetime so recovery can tell it is alive
+            self.spill_path = f"{self.spill_prefix}-{os.getpid()}.spill"
+            self._spill = open(self.spill_path, "a", encoding="utf-8")
+            try_lock(self._spill)
+        return self._spill
+    
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+            
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._flush(batch)
+            except Exception as exc:
+                # Never let one batch end the flusher: every later durable write would wait on it forever
+                print(f"⚠️ Audit flusher error: {exc!r}")
+                self._fail(batch, exc)
+    
+    def _fail(self, batch, exc):
+        for _, _, future in batch:
+            if future is not None and not future.done():
+                future.set_exception(exc)
+    
+    def _flush(self, batch):
+        seq = max((entry[0] for entry in batch if entry[0] is not None), default=None)
+        
+        delay, attempts = 0.05, 0
+        while True:
+            started = time.perf_counter()
+            try:
+                rows = [(entity_type, entity_id, action, json.dumps(changes) if changes is not None else None, timestamp)
+                        for _, (entity_type, entity_id, action, changes, timestamp), _ in batch]
+                with self.db.connection() as conn:
+                    self._insert(conn, rows, seq)
+                break
+            except Exception as exc:
+                attempts += 1
+                with self._lock:
+                    self._failures += 1
+                if attempts == 1:
+                    print(f"⚠️ Audit flush of {len(batch)} events failed: {exc!r}")
+                # Async events are already in the spill, so they retry until the database is back (or replay on
+                # restart); durable writers are waiting on us and get the error instead of hanging
+                if (self.mode == "durable" and attempts >= Config.AUDIT_FLUSH_ATTEMPTS) or (self._stopping and delay > 1.0):
+                    self._fail(batch, exc)
+                    return
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+        
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._flushes += 1
+            self._flushed += len(batch)
+            self._max_batch = max(self._max_batch, len(batch))
+            self._flush_time += elapsed
+            self._max_flush = max(self._max_flush, elapsed)
+            if seq is not None:
+                self._flushed_seq = seq
+        
+        # Truncation is opportunistic: a dispatcher blocked on a full queue holds the lock until we drain it
+        if seq is not None and self._dispatch_lock.acquire(blocking=False):
+            try:
+                if self._seq == seq and self._spill is not None:
+                    self._spill.truncate(0)
+            finally:
+                self._dispatch_lock.release()
+        
+        for _, _, future in batch:
+            if future is not None:
+                future.set_result(len(batch))
+    
+    def _insert(self, conn, rows, seq, spill: Optional[str] = None):
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT INTO audit_log (entity_type, entity_id, action, changes, timestamp) VALUES (?, ?, ?, ?, ?)",
+                         rows)
+        if seq is not None:
+            conn.execute('''
+                INSERT INTO audit_spill_files (spill, flushed_seq) VALUES (?, ?)
+                ON CONFLICT(spill) DO UPDATE SET flushed_seq = MAX(flushed_seq, excluded.flushed_seq)
+            ''', (os.path.basename(spill or self.spill_path), seq))
+        conn.commit()
+    
+    def recover(self):
+        replayed = 0
+        for path in sorted(glob.glob(f"{glob.escape(self.spill_prefix)}-*.spill")):
+            try:
+                spill = open(path, encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with spill:
+                if not try_lock(spill):
+                    # Still held by a live worker
+                    continue
+                replayed += self._replay(path, spill)
+        
+        with self._lock:
+            self._replayed += replayed
+        return replayed
+    
+    def _replay(self, path: str, spill):
+        name = os.path.basename(path)
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT flushed_seq FROM audit_spill_files WHERE spill = ?", (name,)).fetchone()
+            flushed_seq = row[0] if row else 0
+            pending, last_seq = [], flushed_seq
+            for line in spill:
+                try:
+                    seq, *event = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write never reached the queue
+                    continue
+                last_seq = max(last_seq, seq)
+                if seq > flushed_seq:
+                    pending.append(event)
+            
+            if pending:
+                self._insert(conn, [(entity_type, entity_id, action, json.dumps(changes) if changes is not None else None,
+                                     timestamp) for entity_type, entity_id, action, changes, timestamp in pending],
+                             last_seq, path)
+            conn.execute("DELETE FROM audit_spill_files WHERE spill = ?", (name,))
+            conn.commit()
+        
+        os.remove(path)
+        return len(pending)
+    
+    def close(self):
+        with self._lock:
+            thread = self._thread
+            self._stopping = True
+        if thread is not None:
+            thread.join()
+        with self._lock:
+            self._thread = None
+            self._stopping = False
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "queue_depth": self._queue.qsize(),
+                "queue_limit": self._queue.maxsize,
+                "staged": self._staged,
+                "flushes": self._flushes,
+                "flushed": self._flushed,
+                "avg_batch": round(self._flushed / self._flushes, 2) if self._flushes else 0.0,
+                "max_batch": self._max_batch,
+                "avg_flush_ms": round(self._flush_time * 1000 / self._flushes, 3) if self._flushes else 0.0,
+                "max_flush_ms": round(self._max_flush * 1000, 3),
+                "failures": self._failures,
+                "queue_full_waits": self._full_waits,
+                "spilled": self._spilled,
+                "replayed": self._replayed,
+                "pending_spill": self._seq - self._flushed_seq,
+            }
+
+# ==================== AUDIT ARCHIVE ====================
+def audit_key(row):
+    return row["timestamp"], row["id"]
+
+def audit_member(offset: int, length: int, rows):
+    keys = [audit_key(row) for row in rows]
+    return {"offset": offset, "length": length, "newest": max(keys), "oldest": min(keys),
+            "descending": keys == sorted(keys, reverse=True)}
+
+def scan_audit_members(path: str, offset: int):
+    # Indexes members written before segments had an index, or after a crash cut the index short;
+    # a member torn mid-write ends the scan
+    members = []
+    with open(path, "rb") as segment:
+        segment.seek(offset)
+        data = memoryview(segment.read())
+    start = 0
+    while start < len(data):
+        decompressor = zlib.decompressobj(31)
+        try:
+            text = decompressor.decompress(data[start:])
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break
+        length = len(data) - start - len(decompressor.unused_data)
+        rows = [json.loads(line) for line in text.decode("utf-8").splitlines()]
+        if rows:
+            members.append(audit_member(offset + start, length, rows))
+        start += length
+    return members
+
+@functools.lru_cache(maxsize=64)
+def load_audit_index(path: str, index_path: str, size: int, mtime_ns: int, index_size: int):
+    members = []
+    if index_size:
+        with open(index_path, encoding="utf-8") as index:
+            for line in index:
+                try:
+                    member = json.loads(line)
+                except ValueError:
+                    continue
+                members.append(dict(member, newest=tuple(member["newest"]), oldest=tuple(member["oldest"])))
+    end = max((member["offset"] + member["length"] for member in members), default=0)
+    if end < size:
+        members.extend(scan_audit_members(path, end))
+    return tuple(members)
+
+def read_audit_member(path: str, member: dict, bound: Optional[tuple]):
+    with open(path, "rb") as segment:
+        segment.seek(member["offset"])
+        data = segment.read(member["length"])
+    lines = io.TextIOWrapper(gzip.GzipFile(fileobj=io.BytesIO(data)), encoding="utf-8")
+    rows = map(json.loads, lines)
+    if not member["descending"]:
+        # Segments archived before members were written newest first
+        rows = sorted(rows, key=audit_key, reverse=True)
+    for row in rows:
+        if bound is None or audit_key(row) < bound:
+            yield row
+
+class AuditArchive:
+    def __init__(self, database, directory: str, retention_days: Optional[int], batch_size: int):
+        self.db = database
+        self.directory = directory
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.newest = None
+        self._lock = threading.Lock()
+        self._archived = 0
+        self._freed_pages = 0
+        self._last_run = None
+    
+    def create(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audit_archive_state (
+                month TEXT PRIMARY KEY,
+                rows INTEGER NOT NULL DEFAULT 0,
+                newest TIMESTAMP,
+                archived_at TIMESTAMP
+            )
+        ''')
+    
+    def refresh(self):
+        with self.db.connection() as conn:
+            self.newest = conn.execute("SELECT MAX(newest) FROM audit_archive_state").fetchone()[0]
+    
+    def cutoff(self, older_than_days: Optional[int] = None):
+        days = older_than_days if older_than_days is not None else self.retention_days
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - days * 86400))
+    
+    def archive_batch(self, cutoff: str):
+        with self.db.connection() as conn:
+            rows = [dict(row) for row in conn.execute(
+                "SELECT * FROM audit_log WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                (cutoff, self.batch_size))]
+            if not rows:
+                return 0
+            
+            months = {}
+            for row in rows:
+                months.setdefault(row["timestamp"][:7], []).append(row)
+            # Segments are fsynced before the rows leave the database, so a crash can only duplicate, never lose
+            for month, group in months.items():
+                self._append(month, group)
+            
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM audit_log WHERE id IN (SELECT value FROM json_each(?))",
+                         (json.dumps([row["id"] for row in rows]),))
+            conn.executemany('''
+                INSERT INTO audit_archive_state (month, rows, newest, archived_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(month) DO UPDATE SET rows = rows + excluded.rows,
+                    newest = MAX(newest, excluded.newest), archived_at = excluded.archived_at
+            ''', [(month, len(group), group[-1]["timestamp"]) for month, group in months.items()])
+            conn.commit()
+            freed = self._incremental_vacuum(conn)
+        
+        with self._lock:
+            self.newest = max(self.newest or "", rows[-1]["timestamp"])
+            self._archived += len(rows)
+            self._freed_pages += freed
+        return len(rows)
+    
+    def archive(self, older_than_days: Optional[int] = None):
+        cutoff = self.cutoff(older_than_days)
+        started = time.perf_counter()
+        archived = 0
+        while True:
+            moved = self.archive_batch(cutoff)
+            if not moved:
+                break
+            archived += moved
+        return self.record_run(cutoff, archived, started)
+    
+    def record_run(self, cutoff: str, archived: int, started: float):
+        summary = {"cutoff": cutoff, "archived": archived, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        with self._lock:
+            self._last_run = summary
+        return summary
+    
+    def _append(self, month: str, rows):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._segment_path(month)
+        members = list(self.members(month)) if os.path.exists(path) else []
+        end = max((member["offset"] + member["length"] for member in members), default=0)
+        # Newest first, so a page read stops decompressing a member as soon as it has passed the cursor
+        rows = rows[::-1]
+        data = "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        compressed = gzip.compress(data.encode("utf-8"), Config.EXPORT_GZIP_LEVEL)
+        # Each run appends a new gzip member, so segments are never rewritten; a member torn by a crash is cut
+        # off first, its rows never left the database
+        with open(path, "ab") as segment:
+            segment.truncate(end)
+            segment.write(compressed)
+            segment.flush()
+            os.fsync(segment.fileno())
+        
+        members.append(audit_member(end, len(compressed), rows))
+        index_path = self._index_path(month)
+        with open(f"{index_path}.tmp", "w", encoding="utf-8") as index:
+            index.write("".join(json.dumps(member, separators=(",", ":")) + "\n" for member in members))
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(f"{index_path}.tmp", index_path)
+    
+    def _incremental_vacuum(self, conn):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # executescript steps the pragma to completion; a plain execute frees a single page
+        conn.executescript("PRAGMA incremental_vacuum")
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    
+    def _segment_path(self, month: str):
+        return os.path.join(self.directory, f"audit-{month}.ndjson.gz")
+    
+    def _index_path(self, month: str):
+        return os.path.join(self.directory, f"audit-{month}.index")
+    
+    def months(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[6:13] for name in os.listdir(self.directory)
+                      if name.startswith("audit-") and name.endswith(".ndjson.gz"))
+    
+    def members(self, month: str):
+        path, index_path = self._segment_path(month), self._index_path(month)
+        info = os.stat(path)
+        index_size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        return load_audit_index(path, index_path, info.st_size, info.st_mtime_ns, index_size)
+    
+    def rows(self, month: str, bound: Optional[tuple] = None, since: Optional[str] = None):
+        # Newest first from the members that can hold rows below the bound. Runs archive in time order, so members
+        # rarely overlap: each overlapping group is merged on its own and a page only opens the members it reaches
+        path = self._segment_path(month)
+        members = sorted((member for member in self.members(month)
+                          if (bound is None or member["oldest"] < bound) and (not since or member["newest"][0] >= since)),
+                         key=lambda member: member["newest"], reverse=True)
+        groups = []
+        for member in members:
+            if groups and member["newest"] >= groups[-1][0]:
+                groups[-1][0] = min(groups[-1][0], member["oldest"])
+                groups[-1][1].append(member)
+            else:
+                groups.append([member["oldest"], [member]])
+        
+        previous = None
+        for _, group in groups:
+            for row in heapq.merge(*(read_audit_member(path, member, bound) for member in group),
+                                   key=audit_key, reverse=True):
+                # An interrupted archive run can append a batch twice; ids are unique, so keep one copy
+                if audit_key(row) != previous:
+                    previous = audit_key(row)
+                    yield row
+    
+    def query(self, criteria: dict, before: Optional[tuple], limit: int):
+        since, until = criteria.get("since"), criteria.get("until")
+        bound = before
+        if until and (bound is None or (until,) < bound):
+            bound = (until,)
+        first = (since or "")[:7]
+        last = bound[0][:7] if bound else "9999"
+        
+        found = []
+        for month in reversed(self.months()):
+            if month > last:
+                continue
+            if month < first:
+                break
+            for row in self.rows(month, bound, since):
+                if since and row["timestamp"] < since:
+                    return found
+                if audit_matches(row, criteria):
+                    found.append(row)
+                    if len(found) >= limit:
+                        return found
+        return found
+    
+    def stats(self):
+        months = self.months()
+        with self._lock:
+            return {
+                "retention_days": self.retention_days,
+                "segments": len(months),
+                "oldest_month": months[0] if months else None,
+                "newest_archived": self.newest,
+                "bytes": sum(os.path.getsize(self._segment_path(month)) for month in months),
+                "archived": self._archived,
+                "freed_pages": self._freed_pages,
+                "last_run": self._last_run,
+            }
+
+# ==================== SNAPSHOTS ====================
+SNAPSHOT_NAME = re.compile(r"snapshot-\d{8}T\d{9}Z")
+
+class SnapshotNotFound(Exception):
+    pass
+
+class SnapshotBusy(Exception):
+    pass
+
+class SnapshotCorrupt(Exception):
+    pass
+
+class SnapshotStore:
+    def __init__(self, database, directory: str, keep: int, pages_per_step: int, step_pause: float):
+        self.db = database
+        self.directory = directory
+        self.keep = keep
+        self.pages_per_step = pages_per_step
+        self.step_pause = step_pause
+        self._lock = threading.Lock()
+        self._running = False
+        self._created = 0
+        self._failed = 0
+        self._restored = 0
+        self._last_run = None
+    
+    def create(self):
+        with self._lock:
+            if self._running:
+                raise SnapshotBusy("A snapshot is already being written")
+            self._running = True
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, ".lock"), "a") as handle:
+                if not try_lock(handle):
+                    raise SnapshotBusy("Another worker is writing a snapshot")
+                manifest = self._create()
+            self.rotate()
+        except SnapshotBusy:
+            raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running = False
+        
+        with self._lock:
+            self._created += 1
+            self._last_run = manifest
+        return manifest
+    
+    def _create(self):
+        started = time.perf_counter()
+        now = time.time()
+        name = f"snapshot-{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now * 1000) % 1000:03d}Z"
+        raw_path = os.path.join(self.directory, f".{name}.db")
+        progress = {"steps": 0, "pages": 0}
+        
+        def step(status, remaining, total):
+            progress["steps"] += 1
+            progress["pages"] = total
+            if remaining and self.step_pause:
+                time.sleep(self.step_pause)
+        
+        source = self.db.get_connection()
+        target = sqlite3.connect(raw_path)
+        try:
+            # One read transaction spans every step, pinning a single WAL snapshot: writers keep committing
+            # and the copy never restarts because pages changed underneath it
+            source.execute("BEGIN")
+            schema_version = source.execute("PRAGMA user_version").fetchone()[0]
+            source.backup(target, pages=self.pages_per_step, progress=step)
+            source.commit()
+            # A standalone rollback-journal file restores by copying it into place
+            target.execute("PRAGMA journal_mode = DELETE")
+            check = target.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise SnapshotCorrupt(f"Snapshot {name} failed quick_check: {check}")
+            target.close()
+            
+            path = self._path(name, "db.gz")
+            size = os.path.getsize(raw_path)
+            digest = hashlib.sha256()
+            compressed = 0
+            with open(raw_path, "rb") as raw, open(f"{path}.partial", "wb") as out:
+                chunks = iter(functools.partial(raw.read, 1 << 20), b"")
+                for chunk in compress_stream(chunks, "gzip", Config.SNAPSHOT_GZIP_LEVEL):
+                    digest.update(chunk)
+                    compressed += len(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(f"{path}.partial", path)
+        finally:
+            source.close()
+            target.close()
+            if os.path.exists(raw_path):
+                os.remove(raw_path)
+        
+        manifest = {
+            "name": name,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now)),
+            "schema_version": schema_version,
+            "pages": progress["pages"],
+            "steps": progress["steps"],
+            "bytes": size,
+            "compressed_bytes": compressed,
+            "sha256": digest.hexdigest(),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        # The manifest lands last and marks the snapshot complete
+        with open(self._path(name, "json.partial"), "w") as out:
+            json.dump(manifest, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(self._path(name, "json.partial"), self._path(name, "json"))
+        return manifest
+    
+    def _path(self, name: str, suffix: str):
+        return os.path.join(self.directory, f"{name}.{suffix}")
+    
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        manifests = []
+        for entry in sorted(os.listdir(self.directory), reverse=True):
+            if not (entry.endswith(".json") and SNAPSHOT_NAME.fullmatch(entry[:-5])):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as manifest:
+                    manifests.append(json.load(manifest))
+            except FileNotFoundError:
+                continue
+        return manifests
+    
+    def manifest(self, name: str):
+        if name == "latest":
+            snapshots = self.list()
+            if not snapshots:
+                raise SnapshotNotFound("No snapshots have been taken yet")
+            return snapshots[0]
+        if not SNAPSHOT_NAME.fullmatch(name):
+            raise SnapshotNotFound(f"Unknown snapshot: {name}")
+        try:
+            with open(self._path(name, "json")) as manifest:
+                return json.load(manifest)
+        except FileNotFoundError:
+            raise SnapshotNotFound(f"Unknown snapshot: {name}") from None
+    
+    def rotate(self):
+        cutoff = time.time() - 86400
+        for entry in os.listdir(self.directory):
+            # Leftovers of a crashed backup or of an export whose client went away before streaming began
+            if entry.startswith(".snapshot-") and (entry.endswith(".restore") or entry.endswith(".db")):
+                try:
+                    if os.path.getmtime(os.path.join(self.directory, entry)) < cutoff:
+                        os.remove(os.path.join(self.directory, entry))
+                except OSError:
+                    pass
+        
+        removed = []
+        for manifest in self.list()[self.keep:]:
+            # Manifest first, so a half-removed snapshot is never listed
+            for suffix in ("json", "db.gz"):
+                try:
+                    os.remove(self._path(manifest["name"], suffix))
+                except FileNotFoundError:
+                    pass
+            removed.append(manifest["name"])
+        return removed
+    
+    def _read(self, manifest, out=None):
+        digest = hashlib.sha256()
+        decompressor = zlib.decompressobj(31)
+        try:
+            with open(self._path(manifest["name"], "db.gz"), "rb") as source:
+                for chunk in iter(functools.partial(source.read, 1 << 20), b""):
+                    digest.update(chunk)
+                    if out is not None:
+                        out.write(decompressor.decompress(chunk))
+            if out is not None:
+                out.write(decompressor.flush())
+        except FileNotFoundError:
+            raise SnapshotNotFound(f"Snapshot {manifest['name']} has been rotated away") from None
+        except zlib.error as exc:
+            raise SnapshotCorrupt(f"Snapshot {manifest['name']} is not a valid gzip stream: {exc}") from None
+        if digest.hexdigest() != manifest["sha256"]:
+            raise SnapshotCorrupt(f"Snapshot {manifest['name']} does not match its recorded sha256")
+    
+    def verify(self, name: str):
+        manifest = self.manifest(name)
+        self._read(manifest)
+        return manifest
+    
+    def restore(self, name: str):
+        manifest = self.manifest(name)
+        path = os.path.join(self.directory, f".{manifest['name']}-{uuid.uuid4().hex}.restore")
+        try:
+            with open(path, "wb") as out:
+                self._read(manifest, out)
+        except BaseException:
+            os.remove(path)
+            raise
+        with self._lock:
+            self._restored += 1
+        return manifest, path
+    
+    def iter_tables(self, path: str, tables, batch_size: Optional[int] = None):
+        # The restored copy is private and never written, so immutable skips locking and WAL probing
+        conn = sqlite3.connect(f"file:{quote(os.path.abspath(path))}?immutable=1", uri=True, check_same_thread=False)
+        try:
+            for table in tables:
+                cursor = conn.execute(f"SELECT * FROM {table} ORDER BY rowid")
+                columns = tuple(column[0] for column in cursor.description)
+                size = batch_size or Config.EXPORT_BATCH_SIZE
+                # Empty tables still yield one batch so every table is present in a JSON export
+                yield table, columns, cursor.fetchmany(size)
+                while rows := cursor.fetchmany(size):
+                    yield table, columns, rows
+        finally:
+            conn.close()
+            os.remove(path)
+    
+    def stats(self):
+        snapshots = self.list()
+        latest = snapshots[0] if snapshots else None
+        with self._lock:
+            return {
+                "keep": self.keep,
+                "snapshots": len(snapshots),
+                "compressed_bytes": sum(snapshot["compressed_bytes"] for snapshot in snapshots),
+                "latest": latest["name"] if latest else None,
+                "latest_bytes": latest["bytes"] if latest else None,
+                "running": self._running,
+                "created": self._created,
+                "failed": self._failed,
+                "restored": self._restored,
+                "last_run": self._last_run,
+            }
+
+# ==================== RESPONSE CACHE ====================
+# Changes with every deploy, so ETags from an older build never validate against new markup
+APP_FINGERPRINT = hashlib.sha1(open(__file__, "rb").read()).hexdigest()[:8]
+
+class TableVersions:
+    def __init__(self, database):
+        self.database = database
+        self.epoch = APP_FINGERPRINT
+        self._versions = {}
+        self._local = {}
+        self._data_version = None
+        self._checked = 0.0
+        self._conn = None
+        self._lock = threading.Lock()
+        self._syncs = 0
+        self._reloads = 0
+    
+    def create(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                entity_type TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.executemany("INSERT OR IGNORE INTO table_versions (entity_type, version) VALUES (?, 0)",
+                         [(entity.value,) for entity in EntityType])
+    
+    def get(self, table: str):
+        return self._versions.get(table, 0)
+    
+    def bump(self, c, table: str):
+        return c.execute("UPDATE table_versions SET version = version + 1 WHERE entity_type = ? RETURNING version",
+                         (table,)).fetchone()[0]
+    
+    def record_local(self, table: str, version: int):
+        # Versions this process committed itself were already invalidated exactly, id by id
+        with self._lock:
+            self._local.setdefault(table, set()).add(version)
+            # Our own commit is seen on the next read, only other workers' wait out the check interval
+            self._checked = 0.0
+    
+    def due(self):
+        return not Config.VERSION_CHECK_INTERVAL or time.monotonic() - self._checked >= Config.VERSION_CHECK_INTERVAL
+    
+    def sync(self):
+        if not self.due():
+            return
+        
+        with self._lock:
+            if self._conn is None:
+                self._conn = self.database.get_connection()
+            # data_version moves whenever any other connection, in this process or another worker, commits
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            self._checked = time.monotonic()
+            self._syncs += 1
+            if data_version == self._data_version:
+                return
+            
+            self._data_version = data_version
+            versions = dict(self._conn.execute("SELECT entity_type, version FROM table_versions").fetchall())
+            changed = [table for table, version in versions.items() if version != self._versions.get(table)]
+            foreign = [table for table in changed if self._foreign(table, self._versions.get(table), versions[table])]
+            # The first load after startup has nothing stale to push out to live subscribers
+            pushed = [table for table in foreign if table in self._versions]
+            self._versions = versions
+            self._reloads += 1
+        
+        for table in changed:
+            self.database.counts.invalidate(table)
+        for table in foreign:
+            self.database.entities.invalidate_table(table)
+            self.database.autocomplete.invalidate(table)
+        for table in pushed:
+            self.database.changes.reset(table)
+    
+    def _foreign(self, table: str, old: Optional[int], new: int):
+        local = self._local.get(table, set())
+        foreign = old is None or new - old > len(local) or any(v not in local for v in range(old + 1, new + 1))
+        self._local[table] = {v for v in local if v > new}
+        return foreign
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "versions": dict(self._versions),
+                "data_version": self._data_version,
+                "syncs": self._syncs,
+                "reloads": self._reloads,
+            }
+
+class ResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._not_modified = 0
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+    
+    def record_not_modified(self):
+        with self._lock:
+            self._not_modified += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "not_modified": self._not_modified,
+            }
+
+# ==================== PROCESS COORDINATION ====================
+@contextmanager
+def process_lock(path: str):
+    # Serializes one-time setup across uvicorn workers; without fcntl (Windows) only a single worker is supported
+    with open(path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+def try_lock(handle):
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+# ==================== CHANGE FEED ====================
+class Subscriber:
+    __slots__ = ("table", "view", "pending", "reset", "wakeup")
+    
+    def __init__(self, table: str, view: Optional[str] = None):
+        self.table = table
+        self.view = view
+        self.pending = {}
+        self.reset = False
+        self.wakeup = asyncio.Event()
+    
+    def push(self, key, message: str, limit: int):
+        if self.reset:
+            return False
+        # Keyed by row, so a burst of edits to one row leaves only its latest state queued
+        self.pending.pop(key, None)
+        self.pending[key] = message
+        self.wakeup.set()
+        if len(self.pending) <= limit:
+            return False
+        # A client this far behind reloads its list once instead of replaying every change
+        self.pending.clear()
+        self.reset = True
+        return True
+    
+    def drain(self):
+        self.wakeup.clear()
+        messages, reset = list(self.pending.values()), self.reset
+        self.pending, self.reset = {}, False
+        return messages, reset
+
+class ChangeFeed:
+    def __init__(self, max_pending: int, coalesce: float):
+        self.max_pending = max_pending
+        self.coalesce = coalesce
+        self._render = None
+        self._loop = None
+        self._context = None
+        self._subscribers = {}
+        self._incoming = {}
+        self._flushing = False
+        self._published = 0
+        self._coalesced = 0
+        self._delivered = 0
+        self._resets = 0
+        self._flushes = 0
+        self._failures = 0
+    
+    def attach(self, loop, render):
+        # Collection and flushes run in the context the feed was attached from, so renders read this feed's shard
+        self._loop = loop
+        self._render = render
+        self._context = contextvars.copy_context()
+    
+    def detach(self):
+        self._loop = None
+    
+    def subscribers(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+    
+    def subscribe(self, table: str, view: Optional[str] = None):
+        subscriber = Subscriber(table, view)
+        self._subscribers.setdefault(table, set()).add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.get(subscriber.table, set()).discard(subscriber)
+    
+    def publish(self, table: str, changes):
+        # Called from executor threads after commit; collection and delivery happen on the event loop
+        loop = self._loop
+        if loop is not None and self._subscribers.get(table):
+            loop.call_soon_threadsafe(self._collect, table, changes, context=self._context)
+    
+    def reset(self, table: str):
+        loop = self._loop
+        if loop is not None and self._subscribers.get(table):
+            loop.call_soon_threadsafe(self._reset, table, context=self._context)
+    
+    def _collect(self, table: str, changes):
+        for item_id, action in changes:
+            key = (table, item_id)
+            if self._incoming.pop(key, None) is not None:
+                self._coalesced += 1
+            self._incoming[key] = action
+            self._published += 1
+        if not self._flushing:
+            self._flushing = True
+            self._loop.call_later(self.coalesce, lambda: self._loop.create_task(self._flush()), context=self._context)
+    
+    def _reset(self, table: str):
+        for subscriber in self._subscribers.get(table, ()):
+            self._reset_subscriber(subscriber)
+    
+    def _reset_subscriber(self, subscriber: Subscriber):
+        if not subscriber.reset:
+            subscriber.pending.clear()
+            subscriber.reset = True
+            subscriber.wakeup.set()
+            self._resets += 1
+    
+    async def _flush(self):
+        try:
+            incoming, self._incoming = self._incoming, {}
+            by_table = {}
+            for (table, item_id), action in incoming.items():
+                by_table.setdefault(table, {})[item_id] = action
+            for table, changes in by_table.items():
+                views = {}
+                for subscriber in self._subscribers.get(table, ()):
+                    views.setdefault(subscriber.view, []).append(subscriber)
+                for view, subscribers in views.items():
+                    # Rendered once per burst and view, however many clients are watching
+                    try:
+                        messages = await self._render(table, changes, view)
+                    except Exception as exc:
+                        # Without this the flush task dies and its subscribers silently stop hearing about changes
+                        print(f"⚠️ Change feed render failed for {table} ({view}): {exc!r}")
+                        self._failures += 1
+                        for subscriber in subscribers:
+                            self._reset_subscriber(subscriber)
+                        continue
+                    for subscriber in subscribers:
+                        for key, message in messages:
+                            if subscriber.push(key, message, self.max_pending):
+                                self._resets += 1
+                                break
+                        self._delivered += len(messages)
+            self._flushes += 1
+        finally:
+            self._flushing = False
+            if self._incoming and self._loop is not None:
+                self._flushing = True
+                self._loop.call_later(self.coalesce, lambda: self._loop.create_task(self._flush()),
+                                      context=self._context)
+    
+    def stats(self):
+        return {
+            "subscribers": {table: len(subscribers) for table, subscribers in self._subscribers.items()},
+            "published": self._published,
+            "coalesced": self._coalesced,
+            "delivered": self._delivered,
+            "resets": self._resets,
+            "flushes": self._flushes,
+            "failures": self._failures,
+        }
+
+# ==================== MIGRATIONS ====================
+class SchemaTooNew(Exception):
+    pass
+
+def create_base_schema(database, conn):
+    # IF NOT EXISTS lets databases created before versioning adopt version 1 in place
+    c = conn.cursor()
+    
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS entity_stats (
+            entity_type TEXT PRIMARY KEY,
+            active_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS search_index_state (
+            entity_type TEXT PRIMARY KEY,
+            built_at TIMESTAMP
+        )
+    ''')
+    
+    for entity in EntityType:
+        c.execute(f'''
+            CREATE TABLE IF NOT EXISTS {entity.value} (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active BOOLEAN DEFAULT 1
+            )
+        ''')
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity.value}_name ON {entity.value}(name)')
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity.value}_created ON {entity.value}(created_at)')
+        c.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity.value}_active_created ON {entity.value}(is_active, created_at, id)')
+        database.search.create(conn, entity.value)
+        database.counters.create(conn, entity.value)
+    
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity_type TEXT NOT NULL,
+            entity_id TEXT NOT NULL,
+            action TEXT NOT NULL,
+            changes TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_timestamp ON audit_log(timestamp)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(entity_type, entity_id, timestamp)')
+    database.audit.create(conn)
+    database.versions.create(conn)
+    database.archive.create(conn)
+
+def drop_audit_spill_state(database, conn):
+    # Superseded by the per-worker audit_spill_files bookkeeping
+    conn.execute("DROP TABLE IF EXISTS audit_spill_state")
+
+def create_dmt_records(database, conn):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {DMT_TABLE} (
+            id TEXT PRIMARY KEY,
+            workcenter_id TEXT REFERENCES areas(id),
+            part_number_id TEXT REFERENCES partnumbers(id),
+            operation TEXT DEFAULT '',
+            employee_id TEXT REFERENCES employees(id),
+            qty INTEGER DEFAULT 0,
+            customer_id TEXT,
+            shop_order TEXT DEFAULT '',
+            serial_number TEXT DEFAULT '',
+            inspection_item_id TEXT,
+            date TEXT NOT NULL DEFAULT (date('now')),
+            prepared_by_id TEXT REFERENCES employees(id),
+            defect_description TEXT DEFAULT '',
+            car_type TEXT DEFAULT 'dmt',
+            car_cycle INTEGER DEFAULT 1,
+            car_second_cycle_date TEXT,
+            disposition_approved_date TEXT,
+            disposition_approved_by_id TEXT REFERENCES employees(id),
+            sdr_number TEXT DEFAULT '',
+            sdr_approve_date TEXT,
+            dmt_closed INTEGER NOT NULL DEFAULT 0,
+            car_closed_date TEXT,
+            is_return INTEGER NOT NULL DEFAULT 0,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Partial indexes: record queries always spell out is_active = 1 (and dmt_closed = 0) as literals
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{DMT_TABLE}_date ON {DMT_TABLE}(date, id) WHERE is_active = 1')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{DMT_TABLE}_part ON {DMT_TABLE}(part_number_id, date, id) '
+                 f'WHERE is_active = 1')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{DMT_TABLE}_workcenter ON {DMT_TABLE}(workcenter_id, date, id) '
+                 f'WHERE is_active = 1')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{DMT_TABLE}_open ON {DMT_TABLE}(date, id) '
+                 f'WHERE is_active = 1 AND dmt_closed = 0')
+    database.rollups.create(conn)
+    conn.execute("INSERT OR IGNORE INTO table_versions (entity_type, version) VALUES (?, 0)", (DMT_TABLE,))
+
+# Append only: a migration's position is its PRAGMA user_version, so never reorder or remove entries
+MIGRATIONS = [
+    create_base_schema,
+    drop_audit_spill_state,
+    create_dmt_records,
+]
+
+class Migrator:
+    def __init__(self, database, migrations):
+        self.database = database
+        self.migrations = migrations
+        self.version = None
+        self.applied = []
+        self.elapsed = None
+    
+    @property
+    def target(self):
+        return len(self.migrations)
+    
+    def migrate(self):
+        started = time.perf_counter()
+        with self.database.connection() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < self.target:
+                with process_lock(f"{self.database.db_path}.lock"):
+                    # Another worker may have finished the job while we waited for the lock
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    for number in range(version + 1, self.target + 1):
+                        self._apply(conn, number, self.migrations[number - 1])
+                        version = number
+        if version > self.target:
+            raise SchemaTooNew(f"{self.database.db_path} is at schema version {version}, "
+                               f"this build only knows {self.target}")
+        self.version = version
+        self.elapsed = time.perf_counter() - started
+        return self.applied
+    
+    def _apply(self, conn, number: int, migration):
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration(self.database, conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        elapsed = time.perf_counter() - started
+        self.applied.append({"version": number, "name": migration.__name__, "seconds": round(elapsed, 4)})
+        print(f"🗃️ Applied migration {number} ({migration.__name__}) in {elapsed * 1000:.1f} ms")
+    
+    def stats(self):
+        return {
+            "version": self.version,
+            "target": self.target,
+            "applied": list(self.applied),
+            "migrate_seconds": round(self.elapsed, 4) if self.elapsed is not None else None,
+            "startup_seconds": round(self.database.startup_seconds, 4) if self.database.startup_seconds is not None else None,
+        }
+
 # ==================== DATABASE ====================
 class Database:
     def __init__(self, db_path: str):
         self.db_path = db_path
+        self.pool = ConnectionPool(self.get_connection, Config.POOL_SIZE, Config.POOL_TIMEOUT)
+        self.executor = DBExecutor()
+        self.counts = CountCache(Config.COUNT_CACHE_TTL, Config.COUNT_CACHE_SIZE)
+        self.entities = EntityCache(Config.ENTITY_CACHE_SIZE, Config.ENTITY_CACHE_TTL)
+        self.versions = TableVersions(self)
+        self.responses = ResponseCache(Config.RESPONSE_CACHE_SIZE)
+        self.changes = ChangeFeed(Config.CHANGE_FEED_MAX_PENDING, Config.CHANGE_FEED_COALESCE)
+        self.search = SearchIndex(self)
+        self.autocomplete = AutocompleteIndex(self)
+        self.counters = EntityCounters(self)
+        self.rollups = DmtRollups(self)
+        self.audit = AuditPipeline(self, Config.AUDIT_MODE, Config.AUDIT_BATCH_SIZE, Config.AUDIT_FLUSH_INTERVAL,
+                                   Config.AUDIT_QUEUE_LIMIT, f"{db_path}-audit")
+        self.archive = AuditArchive(self, f"{db_path}-audit-archive", Config.AUDIT_RETENTION_DAYS,
+                                    Config.AUDIT_ARCHIVE_BATCH_SIZE)
+        self.snapshots = SnapshotStore(self, f"{db_path}-snapshots", Config.SNAPSHOT_KEEP,
+                                       Config.SNAPSHOT_PAGES_PER_STEP, Config.SNAPSHOT_STEP_PAUSE)
+        self.migrator = Migrator(self, MIGRATIONS)
+        self.startup_seconds = None
         self.init_db()
     
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               timeout=Config.SQLITE_BUSY_TIMEOUT,
+                               cached_statements=Config.STATEMENT_CACHE_SIZE,
+                               factory=InstrumentedConnection if Config.SQL_METRICS else sqlite3.Connection)
         conn.row_factory = sqlite3.Row
+        # Only takes effect on a brand-new file (or after VACUUM), so it has to precede the WAL switch
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{Config.SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {Config.SQLITE_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store = MEMORY")
         return conn
     
+    @contextmanager
+    def connection(self):
+        conn = self.pool.acquire()
+        try:
+            yield conn
+        finally:
+            self.pool.release(conn)
+    
+    def close(self):
+        self.executor.shutdown()
+        self.audit.close()
+        self.versions.close()
+        with self.connection() as conn:
+            conn.execute("PRAGMA optimize")
+        self.pool.close()
+    
     def init_db(self):
-        conn = self.get_connection()
-        c = conn.cursor()
-        
-        for entity in EntityType:
-            c.execute(f'''
-                CREATE TABLE IF NOT EXISTS {entity.value} (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            ''')
-            c.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity.value}_name ON {entity.value}(name)')
-            c.execute(f'CREATE INDEX IF NOT EXISTS idx_{entity.value}_created ON {entity.value}(created_at)')
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS audit_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                entity_type TEXT NOT NULL,
-                entity_id TEXT NOT NULL,
-                action TEXT NOT NULL,
-                changes TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        started = time.perf_counter()
+        self.migrator.migrate()
+        self.audit.recover()
+        self.search.refresh()
+        self.archive.refresh()
+        self.startup_seconds = time.perf_counter() - started
+
+# ==================== SHARDING ====================
+PLANT_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+current_plant = contextvars.ContextVar("current_plant", default=None)
+
+class PlantRequired(Exception):
+    pass
+
+class UnknownPlant(Exception):
+    pass
+
+class ShardRouter:
+    # Stands in for a single Database: attribute access resolves to the shard of the plant in the current context
+    def __init__(self, shards: dict, default: Optional[str] = None):
+        self.shards = shards
+        self.default = default
+    
+    @property
+    def plants(self):
+        return list(self.shards)
+    
+    @property
+    def sharded(self):
+        return None not in self.shards
+    
+    def current(self):
+        plant = current_plant.get() or self.default
+        try:
+            return self.shards[plant]
+        except KeyError:
+            if plant is None:
+                raise PlantRequired("Choose a plant with the X-Plant header or a /plants/<plant>/ prefix") from None
+            raise UnknownPlant(f"Unknown plant: {plant}") from None
+    
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
+
+def open_shards():
+    if not Config.PLANTS:
+        return ShardRouter({None: Database(Config.DATABASE_PATH)})
+    for plant in Config.PLANTS:
+        if not PLANT_NAME.fullmatch(plant):
+            raise ValueError(f"Invalid plant name: {plant!r}")
+    if Config.DEFAULT_PLANT and Config.DEFAULT_PLANT not in Config.PLANTS:
+        raise ValueError(f"Default plant {Config.DEFAULT_PLANT!r} is not one of {Config.PLANTS}")
+    # Every plant gets its own file, and with it its own writer lock, pool, executor lanes and caches
+    return ShardRouter({plant: Database(Config.PLANT_DATABASE_PATH.format(plant=plant)) for plant in Config.PLANTS},
+                       Config.DEFAULT_PLANT)
+
+db = open_shards()
 
-db = Database(Config.DATABASE_PATH)
+async def fan_out(fn, *args):
+    # One task per plant, each bound to its shard, so every shard's read lane works at once
+    async def on_plant(plant):
+        current_plant.set(plant)
+        return await db.executor.read(fn, *args)
+    
+    return dict(zip(db.plants, await asyncio.gather(*(on_plant(plant) for plant in db.plants))))
+
+class ShardMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not db.sharded:
+            return await self.app(scope, receive, send)
+        
+        remember = scope["path"].startswith(Config.PLANT_PATH_PREFIX)
+        if remember:
+            plant, _, rest = scope["path"][len(Config.PLANT_PATH_PREFIX):].partition("/")
+            scope = {**scope, "path": f"/{rest}", "raw_path": f"/{rest}".encode()}
+        else:
+            request = Request(scope)
+            plant = request.headers.get(Config.PLANT_HEADER) or request.cookies.get(Config.PLANT_COOKIE)
+        if plant and plant not in db.shards:
+            response = Response(json.dumps({"detail": f"Unknown plant: {plant}"}), status_code=404,
+                                media_type="application/json")
+            return await response(scope, receive, send)
+        
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                # One URL serves every plant, so browser caches must key on whatever picked it
+                headers.add_vary_header("X-Plant")
+                headers.add_vary_header("Cookie")
+                if remember and plant:
+                    # Pages link to unprefixed paths; the cookie keeps their follow-up requests on this plant
+                    headers.append("Set-Cookie", f"{Config.PLANT_COOKIE}={plant}; Path=/; SameSite=Lax")
+            await send(message)
+        
+        token = current_plant.set(plant or None)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_plant.reset(token)
 
 # ==================== REPOSITORY ====================
+def encode_cursor(*parts):
+    raw = json.dumps(parts, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, kinds: str, size: int):
+    # Every endpoint names the cursor kinds it issues, so a cursor from another listing is rejected, not misread
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        parts = json.loads(raw)
+        if not isinstance(parts, list) or len(parts) != size or parts[0] not in kinds:
+            raise ValueError(cursor)
+        if any(isinstance(part, (list, dict, bool)) for part in parts[1:]):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return parts
+
+# Two bound parameters per row keeps multi-row statements under SQLite's historical 999-variable limit
+MAX_ROWS_PER_STATEMENT = 400
+
+def new_id():
+    return str(uuid.uuid4())[:8]
+
+def fts_phrase(term: str):
+    return '"' + term.replace('"', '""') + '"'
+
 class Repository:
     def __init__(self, entity_type: EntityType):
         self.entity_type = entity_type
         self.table = entity_type.value
     
-    def get_all(self, days: Optional[int] = None, page: int = 1, search: Optional[str] = None):
-        conn = db.get_connection()
-        c = conn.cursor()
-        
-        query = f"SELECT * FROM {self.table} WHERE is_active = 1"
+    def _filters(self, days: Optional[int] = None, search: Optional[str] = None):
+        source = f"{self.table} t"
+        where = "t.is_active = 1"
         params = []
+        ranked = False
         
         if days:
             date_filter = datetime.now() - timedelta(days=days)
-            query += " AND created_at >= ?"
+            where += " AND t.created_at >= ?"
             params.append(date_filter)
         
         if search:
-            query += " AND name LIKE ?"
-            params.append(f"%{search}%")
-        
-        count_query = query.replace("SELECT *", "SELECT COUNT(*)")
-        c.execute(count_query, params)
-        total = c.fetchone()[0]
+            if db.search.usable(self.table, search):
+                source = f"{self.table}_fts f JOIN {self.table} t ON t.rowid = f.rowid"
+                where += f" AND {self.table}_fts MATCH ?"
+                params.append(fts_phrase(search))
+                ranked = True
+            else:
+                where += " AND t.name LIKE ?"
+                params.append(f"%{search}%")
         
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([Config.PAGE_SIZE, (page - 1) * Config.PAGE_SIZE])
+        return source, where, params, ranked
+    
+    def _fetch(self, days: Optional[int], search: Optional[str], limit: int, offset: int):
+        source, where, params, ranked = self._filters(days, search)
+        order = "t.created_at DESC"
         
-        c.execute(query, params)
-        items = [dict(row) for row in c.fetchall()]
-        conn.close()
+        # Search results: exact matches, then prefix matches, then FTS relevance
+        if search:
+            order = "lower(t.name) = lower(?) DESC, t.name LIKE ? DESC, " + ("f.rank, " if ranked else "") + order
+            params.extend([search, f"{search}%"])
         
-        return items, total
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute(f"SELECT t.* FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                      params + [limit, offset])
+            return [dict(row) for row in c.fetchall()]
     
-    def get_by_id(self, item_id: str):
-        conn = db.get_connection()
-        c = conn.cursor()
-        c.execute(f"SELECT * FROM {self.table} WHERE id = ? AND is_active = 1", (item_id,))
-        row = c.fetchone()
-        conn.close()
-        return dict(row) if row else None
+    def get_all(self, days: Optional[int] = None, page: int = 1, search: Optional[str] = None):
+        items = self._fetch(days, search, Config.PAGE_SIZE, (page - 1) * Config.PAGE_SIZE)
+        return items, self.count(days, search)
     
-    def create(self, name: str):
-        conn = db.get_connection()
-        c = conn.cursor()
+    def get_page(self, cursor: Optional[str] = None, days: Optional[int] = None,
+                 search: Optional[str] = None, count_mode: Optional[str] = None):
+        if search:
+            return self._search_page(cursor, days, search, count_mode)
         
-        item_id = str(uuid.uuid4())[:8]
-        c.execute(f"INSERT INTO {self.table} (id, name) VALUES (?, ?)", (item_id, name))
-        c.execute("INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, ?, ?)",
-                  (self.entity_type.value, item_id, "CREATE", json.dumps({"name": name})))
+        source, where, params, _ = self._filters(days)
+        direction = "n"
         
-        conn.commit()
-        c.execute(f"SELECT * FROM {self.table} WHERE id = ?", (item_id,))
-        new_item = dict(c.fetchone())
-        conn.close()
+        if cursor:
+            direction, created_at, item_id = decode_cursor(cursor, "np", 3)
+            where += " AND (t.created_at, t.id) < (?, ?)" if direction == "n" else " AND (t.created_at, t.id) > (?, ?)"
+            params.extend([created_at, item_id])
+        
+        order = "DESC" if direction == "n" else "ASC"
+        query = f"SELECT t.* FROM {source} WHERE {where} ORDER BY t.created_at {order}, t.id {order} LIMIT ?"
+        
+        with db.connection() as conn:
+            c = conn.cursor()
+            c.execute(query, params + [Config.PAGE_SIZE + 1])
+            items = [dict(row) for row in c.fetchall()]
         
-        return new_item
+        has_more = len(items) > Config.PAGE_SIZE
+        items = items[:Config.PAGE_SIZE]
+        if direction == "n":
+            has_next, has_prev = has_more, cursor is not None
+        else:
+            items.reverse()
+            has_next, has_prev = True, has_more
+        
+        return {
+            "items": items,
+            "total": self.count(days, None, count_mode),
+            "next_cursor": encode_cursor("n", items[-1]['created_at'], items[-1]['id']) if has_next and items else None,
+            "prev_cursor": encode_cursor("p", items[0]['created_at'], items[0]['id']) if has_prev and items else None,
+        }
     
-    def update(self, item_id: str, name: str):
-        conn = db.get_connection()
-        c = conn.cursor()
+    def _search_page(self, cursor: Optional[str], days: Optional[int], search: str, count_mode: Optional[str]):
+        # Ranked results have no stable keyset, so search cursors carry an offset
+        offset = 0
+        if cursor:
+            _, offset = decode_cursor(cursor, "o", 2)
+            if not isinstance(offset, int):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            offset = max(0, offset)
         
-        c.execute(f"SELECT name FROM {self.table} WHERE id = ?", (item_id,))
-        old_item = c.fetchone()
-        if not old_item:
-            conn.close()
+        items = self._fetch(days, search, Config.PAGE_SIZE + 1, offset)
+        has_next = len(items) > Config.PAGE_SIZE
+        
+        return {
+            "items": items[:Config.PAGE_SIZE],
+            "total": self.count(days, search, count_mode),
+            "next_cursor": encode_cursor("o", offset + Config.PAGE_SIZE) if has_next else None,
+            "prev_cursor": encode_cursor("o", max(0, offset - Config.PAGE_SIZE)) if offset > 0 else None,
+        }
+    
+    def count(self, days: Optional[int] = None, search: Optional[str] = None, mode: Optional[str] = None):
+        mode = mode or Config.COUNT_MODE
+        if mode == "none":
             return None
+        if not days and not search:
+            total = db.counters.count(self.table)
+            if total is not None:
+                return total
+        if mode == "estimate":
+            if not days and not search:
+                estimate = self._estimate_count()
+                if estimate is not None:
+                    return estimate
+            mode = "cached"
         
-        c.execute(f"UPDATE {self.table} SET name = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (name, item_id))
-        c.execute("INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, ?, ?)",
-                  (self.entity_type.value, item_id, "UPDATE", json.dumps({"old": old_item['name'], "new": name})))
+        key = (self.table, days, search)
+        if mode == "cached":
+            db.versions.sync()
+            total = db.counts.get(key)
+            if total is not None:
+                return total
         
-        conn.commit()
-        c.execute(f"SELECT * FROM {self.table} WHERE id = ?", (item_id,))
-        updated_item = dict(c.fetchone())
-        conn.close()
+        source, where, params, _ = self._filters(days, search)
+        with db.connection() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {where}", params).fetchone()[0]
+        db.counts.put(key, total)
+        return total
+    
+    def _estimate_count(self):
+        try:
+            with db.connection() as conn:
+                row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? AND idx = ?",
+                                   (self.table, f"idx_{self.table}_active_created")).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return int(row[0].split()[0]) if row else None
+    
+    def bulk_import(self, rows, batch_size: Optional[int] = None):
+        batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+        imported, failed, errors = [], 0, []
         
-        return updated_item
+        with db.connection() as conn:
+            c = conn.cursor()
+            batch = []
+            for number, name, error in rows:
+                if error:
+                    failed += 1
+                    if len(errors) < Config.IMPORT_MAX_ERRORS:
+                        errors.append({"row": number, "error": error})
+                    continue
+                
+                batch.append(name)
+                if len(batch) >= batch_size:
+                    imported += self._insert_batch(c, batch)
+                    batch = []
+            
+            if batch:
+                imported += self._insert_batch(c, batch)
+            if imported:
+                version = db.versions.bump(c, self.table)
+            conn.commit()
+        
+        if imported:
+            self._changed(version, imported)
+        return {"imported": len(imported), "failed": failed, "errors": errors, "errors_truncated": failed > len(errors)}
     
-    def delete(self, item_id: str):
+    def _insert_batch(self, c, names):
+        ids = self._unique_ids(c, len(names))
+        c.executemany(f"INSERT INTO {self.table} (id, name) VALUES (?, ?)", zip(ids, names))
+        c.executemany("INSERT INTO audit_log (entity_type, entity_id, action, changes) VALUES (?, ?, 'CREATE', ?)",
+                      [(self.table, item_id, json.dumps({"name": name})) for item_id, name in zip(ids, names)])
+        return [(item_id, "CREATE", {"name": name}) for item_id, name in zip(ids, names)]
+    
+    def _unique_ids(self, c, count: int):
+        # Short ids collide at bulk volumes, so re-draw any that are already taken
+        ids = set()
+        while True:
+            while len(ids) < count:
+                ids.add(new_id())
+            taken = c.execute(f"SELECT id FROM {self.table} WHERE id IN (SELECT value FROM json_each(?))",
+                              (json.dumps(list(ids)),)).fetchall()
+            if not taken:
+                return list(ids)
+            ids.difference_update(row[0] for row in taken)
+    
+    def iter_export(self, days: Optional[int] = None, batch_size: Optional[int] = None):
+        source, where, params, _ = self._filters(days)
+        columns = ", ".join(f"t.{column}" for column in EXPORT_COLUMNS)
+        
+        # Exports can run for minutes, so they use their own connection instead of holding a pool slot
         conn = db.get_connection()
-        c = conn.cursor()
+        try:
+            cursor = conn.execute(f"SELECT {columns} FROM {source} WHERE {where} ORDER BY t.created_at DESC, t.id DESC",
+                                  params)
+            while True:
+                rows = cursor.fetchmany(batch_size or Config.EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+    
+    def get_by_id(self, item_id: str):
+        return self.get_many([item_id]).get(item_id)
+    
+    def get_many(self, item_ids):
+        db.versions.sync()
+        ids = list(dict.fromkeys(item_ids))
+        generation = db.entities.generation(self.table)
+        found, missing = db.entities.get_many(self.table, ids)
+        if missing:
+            with db.connection() as conn:
+                rows = conn.execute(f"SELECT * FROM {self.table} WHERE id IN (SELECT value FROM json_each(?)) "
+                                    f"AND is_active = 1", (json.dumps(missing),)).fetchall()
+            # Unknown and deleted ids are cached too, so repeated lookups of stale references stay off SQLite
+            loaded = dict.fromkeys(missing, MISSING)
+            loaded.update((row["id"], dict(row)) for row in rows)
+            db.entities.put_many(self.table, loaded, generation)
+            found.update(loaded)
+        return {item_id: dict(found[item_id]) for item_id in ids if found[item_id] is not MISSING}
+    
+    def get_names(self, item_ids):
+        return {item_id: item["name"] for item_id, item in self.get_many(item_ids).items()}
+    
+    def create(self, name: str):
+        return self._write(lambda c: self._create(c, [name], [new_id()]))[0]
+    
+    def update(self, item_id: str, name: str):
+        updated = self._write(lambda c: self._update(c, [(item_id, name)]))
+        return updated[0] if updated else None
+    
+    def delete(self, item_id: str):
+        return bool(self._write(lambda c: self._delete(c, [item_id])))
+    
+    def create_many(self, names):
+        return self._write(lambda c: self._create(c, names, self._unique_ids(c, len(names))))
+    
+    def update_many(self, changes):
+        return self._write(lambda c: self._update(c, changes))
+    
+    def delete_many(self, item_ids):
+        return self._write(lambda c: self._delete(c, item_ids))
+    
+    def apply_batch(self, create=(), update=(), delete=()):
+        def operation(c):
+            created, created_audit = self._create(c, create, self._unique_ids(c, len(create))) if create else ([], [])
+            updated, updated_audit = self._update(c, update) if update else ([], [])
+            deleted, deleted_audit = self._delete(c, delete) if delete else ([], [])
+            return ({"created": created, "updated": updated, "deleted": deleted},
+                    created_audit + updated_audit + deleted_audit)
         
-        c.execute(f"UPDATE {self.table} SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (item_id,))
-        affected = c.rowcount
+        return self._write(operation)
+    
+    def _write(self, operation):
+        with db.connection() as conn:
+            # Take the write lock up front: updates read the old values they audit, and another worker must not
+            # commit between that read and the write
+            conn.execute("BEGIN IMMEDIATE")
+            c = conn.cursor()
+            result, audit = operation(c)
+            events = db.audit.stage(c, self.table, audit)
+            if audit:
+                version = db.versions.bump(c, self.table)
+            conn.commit()
         
-        if affected > 0:
-            c.execute("INSERT INTO audit_log (entity_type, entity_id, action) VALUES (?, ?, ?)",
-                      (self.entity_type.value, item_id, "DELETE"))
+        if audit:
+            db.audit.dispatch(*events)
+            self._changed(version, audit)
+        return result
+    
+    def _create(self, c, names, ids):
+        items = []
+        for start in range(0, len(names), MAX_ROWS_PER_STATEMENT):
+            chunk_ids = ids[start:start + MAX_ROWS_PER_STATEMENT]
+            chunk = [value for pair in zip(chunk_ids, names[start:start + MAX_ROWS_PER_STATEMENT]) for value in pair]
+            rows = c.execute(f"INSERT INTO {self.table} (id, name) VALUES {', '.join(['(?, ?)'] * len(chunk_ids))} "
+                             f"RETURNING *", chunk).fetchall()
+            # RETURNING order is unspecified, so restore the caller's order
+            returned = {row["id"]: dict(row) for row in rows}
+            items.extend(returned[item_id] for item_id in chunk_ids)
+        return items, [(item["id"], "CREATE", {"name": item["name"]}) for item in items]
+    
+    def _update(self, c, changes):
+        changes = dict(changes)
+        # RETURNING only sees post-update values, so the previous names need their own read, inside _write's transaction
+        old_names = dict(c.execute(f"SELECT id, name FROM {self.table} WHERE id IN (SELECT value FROM json_each(?))",
+                                   (json.dumps(list(changes)),)).fetchall())
+        if not old_names:
+            return [], []
         
-        conn.commit()
-        conn.close()
-        return affected > 0
+        rows = c.execute(f"""
+            UPDATE {self.table} SET name = json_extract(j.value, '$[1]'), updated_at = CURRENT_TIMESTAMP
+            FROM json_each(?) j WHERE {self.table}.id = json_extract(j.value, '$[0]')
+            RETURNING *
+        """, (json.dumps([[item_id, changes[item_id]] for item_id in old_names]),)).fetchall()
+        returned = {row["id"]: dict(row) for row in rows}
+        items = [returned[item_id] for item_id in changes if item_id in returned]
+        return items, [(item["id"], "UPDATE", {"old": old_names[item["id"]], "new": item["name"]}) for item in items]
+    
+    def _delete(self, c, item_ids):
+        rows = c.execute(f"UPDATE {self.table} SET is_active = 0, updated_at = CURRENT_TIMESTAMP "
+                         f"WHERE id IN (SELECT value FROM json_each(?)) RETURNING id", (json.dumps(list(item_ids)),))
+        deleted = [row[0] for row in rows.fetchall()]
+        return deleted, [(item_id, "DELETE", None) for item_id in deleted]
+    
+    def _changed(self, version: int, entries):
+        # Creates are included so a negatively cached id never outlives the row that now carries it
+        db.entities.invalidate(self.table, [entry[0] for entry in entries])
+        db.autocomplete.apply(self.table, entries)
+        db.changes.publish(self.table, [(entry[0], entry[1]) for entry in entries])
+        db.versions.record_local(self.table, version)
+        db.counts.invalidate(self.table)
+
+def fetch_dashboard_data():
+    counts = db.counters.counts()
+    stats = {entity.value: counts.get(entity.value, 0) for entity in EntityType}
+    recent_logs = query_audit_logs(limit=10)["items"]
+    since = (datetime.now() - timedelta(days=Config.DMT_DASHBOARD_DAYS)).strftime("%Y-%m-%d")
+    dmts = DmtRepository()
+    quality = {
+        "parts": dmts.with_names(db.rollups.defects(since, None, "part", limit=5), "key", EntityType.PARTNUMBERS),
+        "workcenters": dmts.with_names(db.rollups.defects(since, None, "workcenter", limit=5), "key", EntityType.AREAS),
+        "open_cars": db.rollups.open_cars_by_age(),
+    }
+    return stats, recent_logs, quality
+
+AUDIT_ACTIONS = ("CREATE", "UPDATE", "DELETE")
+
+def parse_audit_time(value: Optional[str], end: bool = False):
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp: {value}")
+    if end and len(value.strip()) == 10:
+        # A bare end date covers that whole day
+        moment += timedelta(days=1)
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+AUDIT_CRITERIA_SQL = {
+    "entity_type": "entity_type = ?",
+    "entity_id": "entity_id = ?",
+    "action": "action = ?",
+    "since": "timestamp >= ?",
+    "until": "timestamp < ?",
+}
+
+AUDIT_ENTITY_TYPES = [entity.value for entity in EntityType] + [DMT_TABLE]
+
+def audit_criteria(entity_type: Optional[str] = None, entity_id: Optional[str] = None, action: Optional[str] = None,
+                   since: Optional[str] = None, until: Optional[str] = None):
+    criteria = {}
+    if entity_type:
+        if entity_type not in AUDIT_ENTITY_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unknown entity type: {entity_type}")
+        criteria["entity_type"] = entity_type
+    if entity_id:
+        criteria["entity_id"] = entity_id
+    if action:
+        if action.upper() not in AUDIT_ACTIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown audit action: {action}")
+        criteria["action"] = action.upper()
+    if since:
+        criteria["since"] = parse_audit_time(since)
+    if until:
+        criteria["until"] = parse_audit_time(until, end=True)
+    return criteria
+
+def audit_matches(row, criteria: dict):
+    for key, value in criteria.items():
+        if key == "since":
+            if row["timestamp"] < value:
+                return False
+        elif key == "until":
+            if row["timestamp"] >= value:
+                return False
+        elif row[key] != value:
+            return False
+    return True
+
+def query_audit_logs(entity_type: Optional[str] = None, entity_id: Optional[str] = None, action: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None, cursor: Optional[str] = None,
+                     limit: Optional[int] = None):
+    limit = max(1, min(limit or Config.AUDIT_PAGE_SIZE, Config.AUDIT_MAX_PAGE_SIZE))
+    criteria = audit_criteria(entity_type, entity_id, action, since, until)
+    before = None
+    if cursor:
+        _, timestamp, log_id = decode_cursor(cursor, "a", 3)
+        before = (timestamp, log_id)
+    
+    rows = fetch_audit_rows(criteria, before, limit)
+    items = rows[:limit]
+    next_cursor = encode_cursor("a", items[-1]["timestamp"], items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+def fetch_audit_rows(criteria: dict, before: Optional[tuple], limit: int):
+    where = [AUDIT_CRITERIA_SQL[key] for key in criteria]
+    params = list(criteria.values())
+    if before:
+        where.append("(timestamp, id) < (?, ?)")
+        params.extend(before)
+    
+    with db.connection() as conn:
+        rows = [dict(row) for row in conn.execute(f"SELECT * FROM audit_log WHERE {' AND '.join(where) or '1'} "
+                                                  f"ORDER BY timestamp DESC, id DESC LIMIT ?", (*params, limit + 1))]
+    
+    # Archived rows are all older than the newest archived timestamp, so segments are only read once the page reaches it
+    if db.archive.newest and (len(rows) <= limit or rows[-1]["timestamp"] <= db.archive.newest):
+        rows.extend(db.archive.query(criteria, before, limit + 1))
+        rows.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    return rows
+
+def audit_order(row):
+    return row["timestamp"], row["plant"] or "", row["id"]
+
+async def query_global_audit_logs(entity_type: Optional[str] = None, entity_id: Optional[str] = None,
+                                  action: Optional[str] = None, since: Optional[str] = None,
+                                  until: Optional[str] = None, cursor: Optional[str] = None,
+                                  limit: Optional[int] = None):
+    limit = max(1, min(limit or Config.AUDIT_PAGE_SIZE, Config.AUDIT_MAX_PAGE_SIZE))
+    criteria = audit_criteria(entity_type, entity_id, action, since, until)
+    position = decode_cursor(cursor, "g", 4)[1:] if cursor else None
+    
+    def shard_rows():
+        plant = current_plant.get()
+        before = None
+        if position:
+            timestamp, last_plant, log_id = position
+            # Pages run in (timestamp, plant, id) order, so each shard resumes relative to the last plant served:
+            # plants sorting below it still owe rows from that same second, plants above only older ones
+            if plant == last_plant:
+                before = (timestamp, log_id)
+            else:
+                before = (timestamp, float("inf") if (plant or "") < (last_plant or "") else 0)
+        return [dict(row, plant=plant) for row in fetch_audit_rows(criteria, before, limit)]
+    
+    shards = await fan_out(shard_rows)
+    rows = list(itertools.islice(heapq.merge(*shards.values(), key=audit_order, reverse=True), limit + 1))
+    items = rows[:limit]
+    last = items[-1] if items else None
+    next_cursor = encode_cursor("g", last["timestamp"], last["plant"], last["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+# ==================== DMT RECORDS ====================
+DMT_TEXT_FIELDS = ("operation", "customer_id", "shop_order", "serial_number", "inspection_item_id",
+                   "defect_description", "sdr_number")
+DMT_DATE_FIELDS = ("date", "car_second_cycle_date", "disposition_approved_date", "sdr_approve_date", "car_closed_date")
+DMT_INT_FIELDS = ("qty", "car_cycle")
+DMT_BOOL_FIELDS = ("dmt_closed", "is_return")
+DMT_REFERENCES = {
+    "workcenter_id": EntityType.AREAS,
+    "part_number_id": EntityType.PARTNUMBERS,
+    "employee_id": EntityType.EMPLOYEES,
+    "prepared_by_id": EntityType.EMPLOYEES,
+    "disposition_approved_by_id": EntityType.EMPLOYEES,
+}
+DMT_REQUIRED = ("workcenter_id", "part_number_id")
+CAR_TYPES = ("dmt", "ndmt")
+
+def new_dmt_id():
+    return f"DMT-{int(time.time() * 1000):x}-{uuid.uuid4().hex[:5]}".upper()
+
+def validate_dmt_fields(values: dict, partial: bool = False):
+    fields, errors = {}, []
+    for key, value in values.items():
+        if value is None:
+            if key in DMT_REQUIRED or key == "date":
+                errors.append({"field": key, "error": f"{key} cannot be null"})
+            else:
+                fields[key] = None
+        elif key in DMT_TEXT_FIELDS or key in DMT_REFERENCES:
+            fields[key] = str(value).strip()
+        elif key in DMT_DATE_FIELDS:
+            try:
+                fields[key] = datetime.strptime(str(value), "%Y-%m-%d").strftime("%Y-%m-%d")
+            except ValueError:
+                errors.append({"field": key, "error": "expected a YYYY-MM-DD date"})
+        elif key in DMT_INT_FIELDS:
+            if not isinstance(value, int) or value < 0:
+                errors.append({"field": key, "error": "expected a non-negative integer"})
+            fields[key] = value
+        elif key in DMT_BOOL_FIELDS:
+            fields[key] = int(bool(value))
+        elif key == "car_type":
+            if value not in CAR_TYPES:
+                errors.append({"field": key, "error": f"car_type must be one of {', '.join(CAR_TYPES)}"})
+            fields[key] = value
+        else:
+            errors.append({"field": key, "error": "unknown field"})
+    
+    if not partial:
+        errors.extend({"field": key, "error": f"{key} is required"} for key in DMT_REQUIRED if not fields.get(key))
+    
+    # Reference checks go through the entity cache, so repeated picks of the same master data skip SQLite
+    by_entity = {}
+    for key, entity in DMT_REFERENCES.items():
+        if fields.get(key):
+            by_entity.setdefault(entity, set()).add(fields[key])
+    for entity, ids in by_entity.items():
+        known = Repository(entity).get_many(ids)
+        errors.extend({"field": key, "error": f"unknown {entity.value} id {fields[key]}"}
+                      for key, ref in DMT_REFERENCES.items()
+                      if ref is entity and fields.get(key) and fields[key] not in known)
+    return fields, errors
+
+class DmtRepository:
+    def get(self, record_id: str):
+        with db.connection() as conn:
+            row = conn.execute(f"SELECT * FROM {DMT_TABLE} WHERE id = ? AND is_active = 1", (record_id,)).fetchone()
+        return dict(row) if row else None
+    
+    def list(self, since: Optional[str] = None, until: Optional[str] = None, part_number_id: Optional[str] = None,
+             workcenter_id: Optional[str] = None, status: Optional[str] = None, cursor: Optional[str] = None,
+             limit: Optional[int] = None):
+        limit = max(1, min(limit or Config.DMT_PAGE_SIZE, Config.DMT_MAX_PAGE_SIZE))
+        where, params = ["is_active = 1"], []
+        if status == "open":
+            where.append("dmt_closed = 0")
+        elif status == "closed":
+            where.append("dmt_closed = 1")
+        for clause, value in (("part_number_id = ?", part_number_id), ("workcenter_id = ?", workcenter_id),
+                              ("date >= ?", since), ("date <= ?", until)):
+            if value:
+                where.append(clause)
+                params.append(value)
+        if cursor:
+            _, day, record_id = decode_cursor(cursor, "d", 3)
+            where.append("(date, id) < (?, ?)")
+            params.extend([day, record_id])
+        
+        with db.connection() as conn:
+            rows = [dict(row) for row in conn.execute(f"SELECT * FROM {DMT_TABLE} WHERE {' AND '.join(where)} "
+                                                      f"ORDER BY date DESC, id DESC LIMIT ?", (*params, limit + 1))]
+        items = rows[:limit]
+        next_cursor = encode_cursor("d", items[-1]["date"], items[-1]["id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+    
+    def with_names(self, rows, key: str, entity: EntityType):
+        names = Repository(entity).get_names(row[key] for row in rows if row[key])
+        return [{**row, "name": names.get(row[key], row[key] or "—")} for row in rows]
+    
+    def create(self, fields: dict):
+        def operation(c):
+            values = {"id": fields.get("id") or new_dmt_id(), **{k: v for k, v in fields.items() if k != "id"}}
+            row = c.execute(f"INSERT INTO {DMT_TABLE} ({', '.join(values)}) VALUES ({', '.join('?' * len(values))}) "
+                            f"RETURNING *", list(values.values())).fetchone()
+            return dict(row), [(row["id"], "CREATE", {k: v for k, v in values.items() if k != "id"})]
+        
+        return self._write(operation)
+    
+    def update(self, record_id: str, fields: dict):
+        def operation(c):
+            old = c.execute(f"SELECT * FROM {DMT_TABLE} WHERE id = ? AND is_active = 1", (record_id,)).fetchone()
+            if old is None:
+                return None, []
+            changed = {k: v for k, v in fields.items() if old[k] != v}
+            if not changed:
+                return dict(old), []
+            row = c.execute(f"UPDATE {DMT_TABLE} SET {', '.join(f'{k} = ?' for k in changed)}, "
+                            f"updated_at = CURRENT_TIMESTAMP WHERE id = ? RETURNING *",
+                            (*changed.values(), record_id)).fetchone()
+            return dict(row), [(record_id, "UPDATE", {"old": {k: old[k] for k in changed}, "new": changed})]
+        
+        return self._write(operation)
+    
+    def close(self, record_id: str, closed_date: Optional[str] = None):
+        return self.update(record_id, {"dmt_closed": 1,
+                                       "car_closed_date": closed_date or datetime.now().strftime("%Y-%m-%d")})
+    
+    def delete(self, record_id: str):
+        def operation(c):
+            row = c.execute(f"UPDATE {DMT_TABLE} SET is_active = 0, updated_at = CURRENT_TIMESTAMP "
+                            f"WHERE id = ? AND is_active = 1 RETURNING id", (record_id,)).fetchone()
+            return row is not None, [(record_id, "DELETE", None)] if row else []
+        
+        return self._write(operation)
+    
+    def _write(self, operation):
+        with db.connection() as conn:
+            # Take the write lock up front: updates read the old values they audit, and another worker must not
+            # commit between that read and the write
+            conn.execute("BEGIN IMMEDIATE")
+            c = conn.cursor()
+            result, audit = operation(c)
+            events = db.audit.stage(c, DMT_TABLE, audit)
+            if audit:
+                version = db.versions.bump(c, DMT_TABLE)
+            conn.commit()
+        
+        if audit:
+            db.audit.dispatch(*events)
+            db.versions.record_local(DMT_TABLE, version)
+            db.changes.publish(DMT_TABLE, [(entry[0], entry[1]) for entry in audit])
+        return result
+
+# ==================== EXPORT ====================
+EXPORT_COLUMNS = ("id", "name", "created_at", "updated_at")
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+def encode_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def encode_json(batches, columns):
+    yield "["
+    separator = "\n"
+    for rows in batches:
+        chunk = []
+        for row in rows:
+            chunk.append(separator)
+            chunk.append(json.dumps(dict(zip(columns, row)), default=str))
+            separator = ",\n"
+        yield "".join(chunk)
+    yield "\n]\n"
+
+def encode_ndjson(batches, columns):
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+EXPORT_ENCODERS = {"csv": encode_csv, "json": encode_json, "ndjson": encode_ndjson}
+
+EXPORT_COMPRESSION = {"gzip": ("application/gzip", "gz"), "br": ("application/x-brotli", "br"),
+                      "zstd": ("application/zstd", "zst")}
+
+def stream_export(batches, format: str, columns=EXPORT_COLUMNS, compress: Optional[str] = None):
+    chunks = (chunk.encode() for chunk in EXPORT_ENCODERS[format](batches, columns))
+    if compress:
+        return compress_stream(chunks, compress, Config.EXPORT_GZIP_LEVEL if compress == "gzip" else None)
+    return chunks
+
+SNAPSHOT_TABLES = tuple(entity.value for entity in EntityType) + ("audit_log",)
+SNAPSHOT_EXPORT_FORMATS = {"ndjson": ("application/x-ndjson", "ndjson"), "json": ("application/json", "json")}
+
+def encode_snapshot_ndjson(batches, manifest):
+    for table, columns, rows in batches:
+        yield "".join(json.dumps({"table": table, **dict(zip(columns, row))}, default=str) + "\n" for row in rows)
+
+def encode_snapshot_json(batches, manifest):
+    yield '{"snapshot": ' + json.dumps(manifest) + ', "tables": {'
+    current = None
+    for table, columns, rows in batches:
+        chunk = []
+        if table != current:
+            if current is not None:
+                chunk.append("\n], ")
+            chunk.append(json.dumps(table) + ": [")
+            separator = "\n"
+            current = table
+        for row in rows:
+            chunk.append(separator)
+            chunk.append(json.dumps(dict(zip(columns, row)), default=str))
+            separator = ",\n"
+        yield "".join(chunk)
+    yield "\n]}}\n" if current else "}}\n"
+
+SNAPSHOT_ENCODERS = {"ndjson": encode_snapshot_ndjson, "json": encode_snapshot_json}
+
+def stream_snapshot_export(batches, format: str, manifest, compress: Optional[str] = None):
+    chunks = (chunk.encode() for chunk in SNAPSHOT_ENCODERS[format](batches, manifest))
+    if compress:
+        return compress_stream(chunks, compress, Config.EXPORT_GZIP_LEVEL if compress == "gzip" else None)
+    return chunks
+
+# ==================== IMPORT ====================
+IMPORT_FORMATS = ("csv", "ndjson")
+
+class ImportFormatError(ValueError):
+    pass
+
+def validate_name(value):
+    if not isinstance(value, str):
+        return None, "name must be a string"
+    name = value.strip()
+    if not name:
+        return None, "name is required"
+    if len(name) > Config.MAX_NAME_LENGTH:
+        return None, f"name exceeds {Config.MAX_NAME_LENGTH} characters"
+    return name, None
+
+def parse_import_rows(stream, format: str):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if format == "csv":
+            reader = csv.DictReader(text)
+            if not reader.fieldnames or "name" not in reader.fieldnames:
+                raise ImportFormatError("CSV header must include a 'name' column")
+            for record in reader:
+                name, error = validate_name(record.get("name"))
+                yield reader.line_num, name, error
+        else:
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield number, None, "invalid JSON"
+                    continue
+                if not isinstance(record, dict):
+                    yield number, None, "expected a JSON object"
+                    continue
+                name, error = validate_name(record.get("name"))
+                yield number, name, error
+    except UnicodeDecodeError:
+        raise ImportFormatError("File is not valid UTF-8")
+    finally:
+        text.detach()
+
+# ==================== ASYNC REPOSITORY ====================
+async def sync_versions():
+    # The check queries SQLite, so it belongs on the read lane; between checks the loop only compares a timestamp
+    if db.versions.due():
+        await db.executor.read(db.versions.sync)
+
+class AsyncRepository:
+    def __init__(self, entity_type: EntityType):
+        self.entity_type = entity_type
+        self.repo = Repository(entity_type)
+    
+    async def get_all(self, days: Optional[int] = None, page: int = 1, search: Optional[str] = None):
+        return await db.executor.read(self.repo.get_all, days, page, search)
+    
+    async def get_page(self, cursor: Optional[str] = None, days: Optional[int] = None,
+                       search: Optional[str] = None, count_mode: Optional[str] = None):
+        return await db.executor.read(self.repo.get_page, cursor, days, search, count_mode)
+    
+    async def get_by_id(self, item_id: str):
+        return await db.executor.read(self.repo.get_by_id, item_id)
+    
+    async def get_many(self, item_ids):
+        return await db.executor.read(self.repo.get_many, item_ids)
+    
+    async def get_names(self, item_ids):
+        return await db.executor.read(self.repo.get_names, item_ids)
+    
+    async def autocomplete(self, prefix: str, limit: int):
+        # Served on the event loop: a warm lookup is a bisect, cheaper than a hop to the read lane
+        await sync_versions()
+        items = db.autocomplete.search(self.repo.table, prefix, limit)
+        if items is None:
+            await db.executor.read(db.autocomplete.build, self.repo.table)
+            items = db.autocomplete.search(self.repo.table, prefix, limit) or []
+        return items
+    
+    async def create(self, name: str):
+        return await self._write(self.repo.create, name)
+    
+    async def update(self, item_id: str, name: str):
+        return await self._write(self.repo.update, item_id, name)
+    
+    async def delete(self, item_id: str):
+        return await self._write(self.repo.delete, item_id)
+    
+    async def _write(self, fn, *args):
+        # Durable audit mode only answers once the group commit holding this change's audit row has landed
+        result, pending = await db.executor.write(db.audit.tracked, fn, *args)
+        if pending:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in pending))
+        return result
+    
+    async def apply_batch(self, create=(), update=(), delete=()):
+        return await self._write(self.repo.apply_batch, create, update, delete)
+    
+    async def bulk_import(self, stream, format: str, batch_size: Optional[int] = None):
+        return await db.executor.write(lambda: self.repo.bulk_import(parse_import_rows(stream, format), batch_size))
+
+class AsyncDmtRepository:
+    def __init__(self):
+        self.repo = DmtRepository()
+    
+    async def get(self, record_id: str):
+        return await db.executor.read(self.repo.get, record_id)
+    
+    async def list(self, **filters):
+        return await db.executor.read(functools.partial(self.repo.list, **filters))
+    
+    async def validate(self, values: dict, partial: bool = False):
+        fields, errors = await db.executor.read(validate_dmt_fields, values, partial)
+        if errors:
+            raise HTTPException(status_code=400, detail=errors)
+        return fields
+    
+    async def create(self, fields: dict):
+        return await self._write(self.repo.create, fields)
+    
+    async def update(self, record_id: str, fields: dict):
+        return await self._write(self.repo.update, record_id, fields)
+    
+    async def close(self, record_id: str, closed_date: Optional[str] = None):
+        return await self._write(self.repo.close, record_id, closed_date)
+    
+    async def delete(self, record_id: str):
+        return await self._write(self.repo.delete, record_id)
+    
+    async def _write(self, fn, *args):
+        result, pending = await db.executor.write(db.audit.tracked, fn, *args)
+        if pending:
+            await asyncio.gather(*(asyncio.wrap_future(future) for future in pending))
+        return result
 
 # ==================== FASTAPI APP ====================
+async def reconcile_counters_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        drift = await db.executor.write(db.counters.reconcile)
+        if drift:
+            print(f"⚠️ Repaired drifted entity counters: {drift}")
+
+async def watch_foreign_changes(interval: float):
+    # Other workers' commits only surface through the shared version table, so poll it while anyone is listening
+    while True:
+        await asyncio.sleep(interval)
+        if db.changes.subscribers():
+            await db.executor.read(db.versions.sync)
+
+async def warm_autocomplete():
+    for entity in EntityType:
+        started = time.perf_counter()
+        await db.executor.read(db.autocomplete.build, entity.value)
+        print(f"🔤 Autocomplete index for {entity.value} built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+async def archive_audit_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        cutoff = db.archive.cutoff()
+        started = time.perf_counter()
+        archived = 0
+        # One write-lane call per batch, so live edits interleave with a long archive run
+        while moved := await db.executor.write(db.archive.archive_batch, cutoff):
+            archived += moved
+        if archived:
+            print(f"🗄️ Archived {archived} audit rows older than {cutoff}")
+        db.archive.record_run(cutoff, archived, started)
+
+async def snapshot_periodically(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        latest = db.snapshots.list()[:1]
+        taken = [calendar.timegm(time.strptime(snapshot["created_at"], "%Y-%m-%d %H:%M:%S")) for snapshot in latest]
+        # Every worker runs this loop; the first to wake takes the snapshot and the others find it fresh
+        if taken and time.time() - taken[0] < interval / 2:
+            continue
+        try:
+            manifest = await asyncio.to_thread(db.snapshots.create)
+        except SnapshotBusy:
+            continue
+        except Exception as exc:
+            print(f"⚠️ Snapshot failed: {exc}")
+            continue
+        print(f"💾 Snapshot {manifest['name']} written ({manifest['compressed_bytes']} bytes in {manifest['elapsed_ms']} ms)")
+
+async def monitor_event_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        metrics.observe("qms_event_loop_lag_seconds", max(0.0, loop.time() - expected))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Starting Quality Management System...")
+    tasks = []
+    if Config.LOOP_LAG_INTERVAL:
+        tasks.append(asyncio.create_task(monitor_event_loop_lag(Config.LOOP_LAG_INTERVAL)))
+    for plant in db.plants:
+        # Tasks copy the context they are created in, so each plant's background work stays on its own shard
+        token = current_plant.set(plant)
+        where = f" for plant {plant}" if plant else ""
+        print(f"🗃️ Schema version {db.migrator.version} ready{where} in {db.startup_seconds * 1000:.1f} ms")
+        if Config.STATS_RECONCILE_INTERVAL:
+            tasks.append(asyncio.create_task(reconcile_counters_periodically(Config.STATS_RECONCILE_INTERVAL)))
+        if Config.AUDIT_RETENTION_DAYS is not None and Config.AUDIT_ARCHIVE_INTERVAL:
+            tasks.append(asyncio.create_task(archive_audit_periodically(Config.AUDIT_ARCHIVE_INTERVAL)))
+        if Config.SNAPSHOT_INTERVAL:
+            tasks.append(asyncio.create_task(snapshot_periodically(Config.SNAPSHOT_INTERVAL)))
+        if Config.AUTOCOMPLETE_WARM:
+            tasks.append(asyncio.create_task(warm_autocomplete()))
+        if Config.CHANGE_FEED_POLL_INTERVAL:
+            tasks.append(asyncio.create_task(watch_foreign_changes(Config.CHANGE_FEED_POLL_INTERVAL)))
+        db.changes.attach(asyncio.get_running_loop(), render_change_messages)
+        current_plant.reset(token)
     yield
     print("👋 Shutting down...")
+    for database in db.shards.values():
+        database.changes.detach()
+    for task in tasks:
+        task.cancel()
+    for database in db.shards.values():
+        database.close()
 
 app = FastAPI(title="Quality Management System", version="2.0.0", lifespan=lifespan)
+app.add_middleware(ShardMiddleware)
+app.add_middleware(CompressionMiddleware)
+# Added last so it wraps compression and records on-the-wire sizes
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(ExecutorSaturated)
+@app.exception_handler(PoolTimeout)
+async def database_busy_handler(request: Request, exc: Exception):
+    return HTMLResponse(render_toast("Database is busy, please retry", "error"), status_code=503)
+
+@app.exception_handler(PlantRequired)
+async def plant_required_handler(request: Request, exc: PlantRequired):
+    return HTMLResponse(render_toast(str(exc), "error"), status_code=400)
 
 # ==================== HELPER FUNCTIONS ====================
 def get_entity_info(entity: str):
@@ -181,124 +3602,246 @@ def get_entity_info(entity: str):
         "levels": {"label": "Level", "icon": "📊", "color": "indigo"},
         "areas": {"label": "Area", "icon": "🏢", "color": "pink"},
         "partnumbers": {"label": "Part Number", "icon": "🔧", "color": "orange"},
-        "calibrations": {"label": "Calibration", "icon": "⚙️", "color": "teal"}
+        "calibrations": {"label": "Calibration", "icon": "⚙️", "color": "teal"},
+        "dmt_records": {"label": "DMT Record", "icon": "📋", "color": "blue"}
     }
     return info.get(entity, {"label": entity, "icon": "📄", "color": "gray"})
 
 # ==================== HTML TEMPLATES ====================
+class Fragment:
+    # Fields are HTML-escaped on render; "{field:safe}" inserts already-rendered markup verbatim
+    def __init__(self, source: str):
+        # Template indentation carries no meaning in HTML, so collapse it once at compile time
+        source = re.sub(r"\s*\n\s*", " ", source.strip())
+        head, pairs = "", []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if pairs:
+                pairs[-1] = (pairs[-1][0], pairs[-1][1], pairs[-1][2] + literal)
+            else:
+                head += literal
+            if field is not None:
+                if not field.isidentifier() or spec not in ("", "safe") or conversion is not None:
+                    raise ValueError(f"Invalid template field: {field}:{spec}")
+                pairs.append((field, spec == "safe", ""))
+        self._compile(head, pairs)
+    
+    def _compile(self, head: str, pairs):
+        # Each template becomes one generated f-string, so rendering is a single string build
+        self.head, self.pairs = head, pairs
+        namespace = {"_e": html_escape, "_head": head}
+        pieces = ["{_head}"]
+        for index, (field, safe, literal) in enumerate(pairs):
+            namespace[f"_l{index}"] = literal
+            pieces.append(f"{{{field}}}{{_l{index}}}" if safe else f"{{_e(str({field}))}}{{_l{index}}}")
+        
+        fields = ", ".join(dict.fromkeys(field for field, _, _ in pairs))
+        signature = f"*, {fields}" if fields else ""
+        exec(f'def render({signature}):\n    return f"{"".join(pieces)}"\n', namespace)
+        self.render = namespace["render"]
+    
+    def bind(self, **values):
+        head, pairs = self.head, []
+        for field, safe, literal in self.pairs:
+            if field in values:
+                text = (str(values[field]) if safe else html_escape(str(values[field]))) + literal
+                if pairs:
+                    pairs[-1] = (pairs[-1][0], pairs[-1][1], pairs[-1][2] + text)
+                else:
+                    head += text
+            else:
+                pairs.append((field, safe, literal))
+        
+        fragment = Fragment.__new__(Fragment)
+        fragment._compile(head, pairs)
+        return fragment
+
+def join_html(parts):
+    return "".join(parts)
+
+ACTION_COLORS = {
+    "CREATE": "bg-green-100 text-green-700",
+    "UPDATE": "bg-yellow-100 text-yellow-700",
+    "DELETE": "bg-red-100 text-red-700"
+}
+DEFAULT_ACTION_COLOR = "bg-gray-100 text-gray-700"
+
+TOAST = Fragment("""
+    <div id="toast" class="fixed top-4 right-4 bg-{color}-500 text-white px-6 py-3 rounded-lg shadow-lg z-50"
+         hx-swap-oob="true">
+        {message}
+    </div>
+    <script>setTimeout(() => document.getElementById('toast')?.remove(), 3000)</script>
+""")
+
+EMPTY_LIST = Fragment("""
+    <div id="items-empty" class="text-center py-12 text-gray-400">
+        <div class="text-4xl mb-2">📭</div>
+        <p class="text-lg">No items found</p>
+    </div>
+    <div id="items-rows" class="space-y-3"></div>
+""").render()
+
+LIST_HEADER = Fragment("""
+    <div class="mb-4 text-sm text-gray-600 font-semibold">
+        Showing {count} <span id="items-total">{of_total}</span> records
+    </div>
+    <div id="items-rows" class="space-y-3">
+""")
+
+ITEMS_TOTAL_OOB = Fragment('<span id="items-total" hx-swap-oob="true">of {total} total</span>')
+# The feed lives inside the list, so every re-render (search, paging) reconnects scoped to what is now shown
+ITEMS_FEED = Fragment("""
+    <div hx-ext="sse" sse-connect="/entity/{entity}/events?view={view}" class="hidden">
+        <div sse-swap="change" hx-swap="none"></div>
+        <div hx-get="/entity/{entity}/items" hx-trigger="sse:refresh" hx-target="#items-list"
+             hx-include="[name='search']"></div>
+    </div>
+""")
+FEED_VIEWS = ("live", "page", "refresh")
+
+ITEMS_EMPTY_OOB = '<div id="items-empty" hx-swap-oob="outerHTML"></div>'
+EDIT_MODAL_CLOSE = '<div hx-swap-oob="true" id="edit-modal"></div>'
+ITEM_DELETE_OOB = Fragment('<div id="item-{id}" hx-swap-oob="delete"></div>')
+ITEM_PREPEND_OOB = Fragment('<div hx-swap-oob="afterbegin:#items-rows">{row:safe}</div>')
+
+ITEM_ROW = Fragment("""
+    <div id="item-{id}" class="item-row">
+        <div class="flex-1">
+            <div class="flex items-center gap-3 mb-2">
+                <span class="item-id">{id}</span>
+                <span class="text-xs text-gray-400">{created_at}</span>
+            </div>
+            <p class="font-bold text-gray-800 text-lg">{name}</p>
+            {updated_info:safe}
+        </div>
+        <div class="flex gap-2">
+            <button hx-get="/entity/{entity}/edit/{id}" hx-target="#edit-modal" class="item-edit">&#x270F;&#xFE0F; Edit</button>
+            <button hx-delete="/entity/{entity}/delete/{id}" hx-target="#items-list"
+                    hx-confirm="Are you sure you want to delete this {label}?" class="item-delete">&#x1F5D1;&#xFE0F; Delete</button>
+        </div>
+    </div>
+""")
+
+UPDATED_INFO = Fragment("<p class='text-xs text-gray-500 mt-1'>Updated: {updated_at}</p>")
+
+PAGE_BUTTON = Fragment("""
+    <button hx-get="/entity/{entity}/items?{query}"
+            hx-target="#items-list"
+            class="px-4 py-2 rounded-lg transition {classes}">
+        {label}
+    </button>
+""")
+
+PAGINATION_OPEN = '<div class="flex justify-center items-center gap-2 mt-6">'
+PREV_DISABLED = '<button disabled class="px-4 py-2 rounded-lg bg-gray-200 opacity-50 cursor-not-allowed">← Prev</button>'
+NEXT_DISABLED = '<button disabled class="px-4 py-2 rounded-lg bg-gray-200 opacity-50 cursor-not-allowed">Next →</button>'
+ELLIPSIS = '<span class="px-3 py-2">...</span>'
+INACTIVE_BUTTON = "bg-gray-200 hover:bg-gray-300"
+ACTIVE_BUTTON = "bg-blue-500 text-white font-bold"
+
+@timed_render
 def render_toast(message: str, type: str = "success"):
     colors = {"success": "green", "error": "red", "info": "blue"}
-    color = colors.get(type, "blue")
-    return f"""
-        <div id="toast" class="fixed top-4 right-4 bg-{color}-500 text-white px-6 py-3 rounded-lg shadow-lg z-50"
-             hx-swap-oob="true">
-            {message}
-        </div>
-        <script>setTimeout(() => document.getElementById('toast')?.remove(), 3000)</script>
-    """
+    return TOAST.render(color=colors.get(type, "blue"), message=message)
 
-def render_items_list(items, total, entity, page, search=""):
-    info = get_entity_info(entity)
-    total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
-    
+@functools.lru_cache(maxsize=None)
+def item_row_fragment(entity: str):
+    return ITEM_ROW.bind(entity=entity, label=get_entity_info(entity)['label'].lower())
+
+@timed_render
+def render_rows(items, entity):
+    row = item_row_fragment(entity).render
+    updated = UPDATED_INFO.render
+    return [
+        row(id=item['id'], created_at=item['created_at'], name=item['name'],
+            updated_info=updated(updated_at=item['updated_at']) if item['updated_at'] != item['created_at'] else "")
+        for item in items
+    ]
+
+@timed_render
+def render_item_row(item, entity):
+    return render_rows([item], entity)[0]
+
+@timed_render
+def render_items_list(items, total, entity, page, search="", next_cursor=None, prev_cursor=None):
+    if search:
+        view = "refresh"
+    elif prev_cursor or (page or 1) > 1:
+        view = "page"
+    else:
+        view = "live"
+    feed = ITEMS_FEED.render(entity=entity, view=view)
     if not items:
-        return """
-            <div class="text-center py-12 text-gray-400">
-                <div class="text-4xl mb-2">📭</div>
-                <p class="text-lg">No items found</p>
-            </div>
-        """
-    
-    html = f"""
-        <div class="mb-4 text-sm text-gray-600 font-semibold">
-            Showing {len(items)} of {total} total records
-        </div>
-        <div class="space-y-3">
-    """
-    
-    for item in items:
-        updated_info = ""
-        if item['updated_at'] != item['created_at']:
-            updated_info = f"<p class='text-xs text-gray-500 mt-1'>Updated: {item['updated_at']}</p>"
-        
-        html += f"""
-            <div class="bg-gradient-to-r from-gray-50 to-gray-100 rounded-xl p-5 flex items-center justify-between hover:shadow-lg transition-all border-2 border-transparent hover:border-blue-200">
-                <div class="flex-1">
-                    <div class="flex items-center gap-3 mb-2">
-                        <span class="font-mono text-xs bg-blue-100 text-blue-700 px-3 py-1 rounded-full font-bold">{item['id']}</span>
-                        <span class="text-xs text-gray-400">{item['created_at']}</span>
-                    </div>
-                    <p class="font-bold text-gray-800 text-lg">{item['name']}</p>
-                    {updated_info}
-                </div>
-                <div class="flex gap-2">
-                    <button hx-get="/entity/{entity}/edit/{item['id']}" 
-                            hx-target="#edit-modal"
-                            class="bg-gradient-to-r from-yellow-400 to-yellow-500 hover:from-yellow-500 hover:to-yellow-600 text-white font-semibold py-2 px-5 rounded-lg transition-all transform hover:scale-105 shadow-md">
-                        ✏️ Edit
-                    </button>
-                    <button hx-delete="/entity/{entity}/delete/{item['id']}" 
-                            hx-target="#items-list"
-                            hx-confirm="Are you sure you want to delete this {info['label'].lower()}?"
-                            class="bg-gradient-to-r from-red-500 to-red-600 hover:from-red-600 hover:to-red-700 text-white font-semibold py-2 px-5 rounded-lg transition-all transform hover:scale-105 shadow-md">
-                        🗑️ Delete
-                    </button>
-                </div>
-            </div>
-        """
+        return EMPTY_LIST + feed
     
-    html += "</div>"
+    parts = [LIST_HEADER.render(count=len(items), of_total=f"of {total} total" if total is not None else "")]
+    parts.extend(render_rows(items, entity))
+    parts.append("</div>")
     
     # Pagination
-    if total_pages > 1:
-        html += '<div class="flex justify-center items-center gap-2 mt-6">'
-        
-        # Previous button
-        if page > 1:
-            html += f"""
-                <button hx-get="/entity/{entity}/items?page={page-1}&search={search}" 
-                        hx-target="#items-list"
-                        class="px-4 py-2 rounded-lg bg-gray-200 hover:bg-gray-300 transition">
-                    ← Prev
-                </button>
-            """
-        else:
-            html += '<button disabled class="px-4 py-2 rounded-lg bg-gray-200 opacity-50 cursor-not-allowed">← Prev</button>'
-        
-        # Page numbers
-        for p in range(1, total_pages + 1):
-            if p == 1 or p == total_pages or (p >= page - 2 and p <= page + 2):
-                active_class = "bg-blue-500 text-white font-bold" if p == page else "bg-gray-200 hover:bg-gray-300"
-                html += f"""
-                    <button hx-get="/entity/{entity}/items?page={p}&search={search}" 
-                            hx-target="#items-list"
-                            class="px-4 py-2 rounded-lg transition {active_class}">
-                        {p}
-                    </button>
-                """
-            elif (p == page - 3 or p == page + 3) and total_pages > 7:
-                html += '<span class="px-3 py-2">...</span>'
-        
-        # Next button
-        if page < total_pages:
-            html += f"""
-                <button hx-get="/entity/{entity}/items?page={page+1}&search={search}" 
-                        hx-target="#items-list"
-                        class="px-4 py-2 rounded-lg bg-gray-200 hover:bg-gray-300 transition">
-                    Next →
-                </button>
-            """
+    if page is None:
+        parts.append(render_cursor_pagination(entity, search, next_cursor, prev_cursor))
+    else:
+        if total is not None:
+            total_pages = (total + Config.PAGE_SIZE - 1) // Config.PAGE_SIZE
         else:
-            html += '<button disabled class="px-4 py-2 rounded-lg bg-gray-200 opacity-50 cursor-not-allowed">Next →</button>'
-        
-        html += '</div>'
+            total_pages = page + 1 if len(items) == Config.PAGE_SIZE else page
+        parts.append(render_pagination(entity, page, total_pages, search))
     
-    return html
+    parts.append(feed)
+    return join_html(parts)
 
-# ==================== ROUTES ====================
-@app.get("/", response_class=HTMLResponse)
-async def root():
-    return """
+@timed_render
+@functools.lru_cache(maxsize=1024)
+def render_pagination(entity: str, page: int, total_pages: int, search: str = ""):
+    if total_pages <= 1:
+        return ""
+    
+    def button(target_page, label, classes=INACTIVE_BUTTON):
+        return PAGE_BUTTON.render(entity=entity, query=urlencode({"page": target_page, "search": search}),
+                                  classes=classes, label=label)
+    
+    parts = [PAGINATION_OPEN, button(page - 1, "← Prev") if page > 1 else PREV_DISABLED]
+    
+    window = {1, total_pages, *range(max(1, page - 3), min(total_pages, page + 3) + 1)}
+    for p in sorted(window):
+        if p == 1 or p == total_pages or (p >= page - 2 and p <= page + 2):
+            parts.append(button(p, p, ACTIVE_BUTTON if p == page else INACTIVE_BUTTON))
+        elif (p == page - 3 or p == page + 3) and total_pages > 7:
+            parts.append(ELLIPSIS)
+    
+    parts.append(button(page + 1, "Next →") if page < total_pages else NEXT_DISABLED)
+    parts.append("</div>")
+    return join_html(parts)
+
+@timed_render
+def render_cursor_pagination(entity, search, next_cursor, prev_cursor):
+    if not next_cursor and not prev_cursor:
+        return ""
+    
+    def button(cursor, label):
+        return PAGE_BUTTON.render(entity=entity, query=urlencode({"cursor": cursor, "search": search}),
+                                  classes=INACTIVE_BUTTON, label=label)
+    
+    return join_html([
+        PAGINATION_OPEN,
+        button(prev_cursor, "← Prev") if prev_cursor else PREV_DISABLED,
+        button(next_cursor, "Next →") if next_cursor else NEXT_DISABLED,
+        "</div>",
+    ])
+
+async def load_items_html(entity: str, page: Optional[int] = None, search: str = "", cursor: Optional[str] = None):
+    repo = AsyncRepository(EntityType(entity))
+    if page is None and Config.PAGINATION_MODE == "keyset":
+        result = await repo.get_page(cursor=cursor, search=search or None)
+        return render_items_list(result["items"], result["total"], entity, None, search,
+                                 result["next_cursor"], result["prev_cursor"])
+    
+    page = page or 1
+    items, total = await repo.get_all(page=page, search=search or None)
+    return render_items_list(items, total, entity, page, search)
+
+ROOT_PAGE = Fragment("""
 <!DOCTYPE html>
 <html lang="es">
 <head>
@@ -306,7 +3849,15 @@ async def root():
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Quality Management System</title>
     <script src="https://unpkg.com/htmx.org@1.9.10"></script>
+    <script src="https://unpkg.com/htmx.org@1.9.10/dist/ext/sse.js"></script>
     <script src="https://cdn.tailwindcss.com"></script>
+    <!-- Row styles are declared once here instead of being repeated on every list row -->
+    <style type="text/tailwindcss">
+        .item-row {{ @apply bg-gradient-to-r from-gray-50 to-gray-100 rounded-xl p-5 flex items-center justify-between hover:shadow-lg transition-all border-2 border-transparent hover:border-blue-200; }}
+        .item-id {{ @apply font-mono text-xs bg-blue-100 text-blue-700 px-3 py-1 rounded-full font-bold; }}
+        .item-edit {{ @apply bg-gradient-to-r from-yellow-400 to-yellow-500 hover:from-yellow-500 hover:to-yellow-600 text-white font-semibold py-2 px-5 rounded-lg transition-all transform hover:scale-105 shadow-md; }}
+        .item-delete {{ @apply bg-gradient-to-r from-red-500 to-red-600 hover:from-red-600 hover:to-red-700 text-white font-semibold py-2 px-5 rounded-lg transition-all transform hover:scale-105 shadow-md; }}
+    </style>
 </head>
 <body class="bg-gradient-to-br from-gray-50 to-gray-100 min-h-screen">
     <div id="toast-container"></div>
@@ -319,19 +3870,19 @@ async def root():
                 Quality Management System
             </h1>
             <div class="flex justify-center gap-4">
-                <button hx-get="/general-info" 
+                <button hx-get="/general-info"
                         hx-target="#main-content"
                         hx-swap="innerHTML"
                         class="bg-gradient-to-r from-blue-500 to-blue-600 hover:from-blue-600 hover:to-blue-700 text-white font-bold py-4 px-10 rounded-xl shadow-lg transition-all transform hover:scale-105">
                     📊 General Info
                 </button>
-                <button hx-get="/dmt" 
+                <button hx-get="/dmt"
                         hx-target="#main-content"
                         hx-swap="innerHTML"
                         class="bg-gradient-to-r from-green-500 to-green-600 hover:from-green-600 hover:to-green-700 text-white font-bold py-4 px-10 rounded-xl shadow-lg transition-all transform hover:scale-105">
                     📈 DMT
                 </button>
-                <button hx-get="/audit" 
+                <button hx-get="/audit"
                         hx-target="#main-content"
                         hx-swap="innerHTML"
                         class="bg-gradient-to-r from-purple-500 to-purple-600 hover:from-purple-600 hover:to-purple-700 text-white font-bold py-4 px-10 rounded-xl shadow-lg transition-all transform hover:scale-105">
@@ -345,373 +3896,946 @@ async def root():
     </div>
 </body>
 </html>
-    """
+""").render()
 
-@app.get("/general-info", response_class=HTMLResponse)
-async def general_info():
-    entities = [
-        {"key": "employees", "label": "Employees", "icon": "👤", "color": "purple"},
-        {"key": "levels", "label": "Levels", "icon": "📊", "color": "indigo"},
-        {"key": "areas", "label": "Areas", "icon": "🏢", "color": "pink"},
-        {"key": "partnumbers", "label": "Part Numbers", "icon": "🔧", "color": "orange"},
-        {"key": "calibrations", "label": "Calibrations", "icon": "⚙️", "color": "teal"}
-    ]
-    
-    html = """
-        <div class="bg-white rounded-xl shadow-xl p-6 mb-6">
-            <h2 class="text-3xl font-bold text-gray-800 mb-6">General Information Management</h2>
-            <div class="grid grid-cols-2 md:grid-cols-5 gap-4 mb-4">
-    """
-    
-    for entity in entities:
-        html += f"""
-            <button hx-get="/entity/{entity['key']}" 
-                    hx-target="#main-content"
-                    class="bg-gradient-to-br from-{entity['color']}-500 to-{entity['color']}-600 hover:from-{entity['color']}-600 hover:to-{entity['color']}-700 text-white font-semibold py-4 px-4 rounded-xl shadow-lg transition-all transform hover:scale-105">
-                <div class="text-2xl mb-1">{entity['icon']}</div>
-                {entity['label']}
-            </button>
-        """
-    
-    html += """
+GENERAL_INFO_ENTITIES = [
+    {"key": "employees", "label": "Employees", "icon": "👤", "color": "purple"},
+    {"key": "levels", "label": "Levels", "icon": "📊", "color": "indigo"},
+    {"key": "areas", "label": "Areas", "icon": "🏢", "color": "pink"},
+    {"key": "partnumbers", "label": "Part Numbers", "icon": "🔧", "color": "orange"},
+    {"key": "calibrations", "label": "Calibrations", "icon": "⚙️", "color": "teal"}
+]
+
+GENERAL_INFO_BUTTON = Fragment("""
+    <button hx-get="/entity/{key}"
+            hx-target="#main-content"
+            class="bg-gradient-to-br from-{color}-500 to-{color}-600 hover:from-{color}-600 hover:to-{color}-700 text-white font-semibold py-4 px-4 rounded-xl shadow-lg transition-all transform hover:scale-105">
+        <div class="text-2xl mb-1">{icon}</div>
+        {label}
+    </button>
+""")
+
+GENERAL_INFO_PAGE = Fragment("""
+    <div class="bg-white rounded-xl shadow-xl p-6 mb-6">
+        <h2 class="text-3xl font-bold text-gray-800 mb-6">General Information Management</h2>
+        <div class="grid grid-cols-2 md:grid-cols-5 gap-4 mb-4">
+            {buttons:safe}
+        </div>
+        <button hx-get="/"
+                hx-target="body"
+                hx-swap="innerHTML"
+                class="bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
+            ← Back
+        </button>
+    </div>
+""").render(buttons=join_html(GENERAL_INFO_BUTTON.render(**entity) for entity in GENERAL_INFO_ENTITIES))
+
+ENTITY_PAGE = Fragment("""
+    <div class="bg-white rounded-xl shadow-xl p-8">
+        <div class="flex items-center gap-3 mb-6">
+            <span class="text-4xl">{icon}</span>
+            <h3 class="text-3xl font-bold text-gray-800">{label} Management</h3>
+        </div>
+
+        <!-- Search Bar -->
+        <div class="mb-6">
+            <input type="text"
+                   name="search"
+                   placeholder="🔍 Search {label_lower}s..."
+                   hx-get="/entity/{entity}/items"
+                   hx-trigger="keyup changed delay:500ms"
+                   hx-target="#items-list"
+                   hx-include="this"
+                   class="w-full px-6 py-3 border-2 border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent transition">
+        </div>
+
+        <!-- Create Form -->
+        <div class="bg-gradient-to-br from-blue-50 to-blue-100 rounded-xl p-6 mb-6 border-2 border-blue-200">
+            <h4 class="font-bold text-gray-800 mb-4 text-lg">➕ Add New {label}</h4>
+            <form hx-post="/entity/{entity}/create"
+                  hx-target="#items-list"
+                  hx-swap="innerHTML"
+                  hx-include="[name='search']"
+                  class="flex gap-3">
+                <input type="text"
+                       name="name"
+                       placeholder="Enter {label_lower} name"
+                       class="flex-1 px-4 py-3 border-2 border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+                       required>
+                <button type="submit"
+                        class="bg-gradient-to-r from-green-500 to-green-600 hover:from-green-600 hover:to-green-700 text-white font-semibold py-3 px-8 rounded-lg shadow-lg transition-all transform hover:scale-105">
+                    ✓ Add
+                </button>
+                <button type="reset"
+                        class="bg-gray-400 hover:bg-gray-500 text-white font-semibold py-3 px-6 rounded-lg transition">
+                    ✕ Cancel
+                </button>
+            </form>
+        </div>
+
+        <!-- Export Options -->
+        <div class="bg-gradient-to-br from-purple-50 to-purple-100 rounded-xl p-6 mb-6 border-2 border-purple-200">
+            <h4 class="font-bold text-gray-800 mb-4 text-lg">📥 Export Data</h4>
+            <div class="flex flex-wrap gap-2">
+                <a href="/entity/{entity}/export/json?days=1"
+                   class="bg-blue-500 hover:bg-blue-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
+                    JSON - Last Day
+                </a>
+                <a href="/entity/{entity}/export/json?days=7"
+                   class="bg-blue-500 hover:bg-blue-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
+                    JSON - Last 7 Days
+                </a>
+                <a href="/entity/{entity}/export/json"
+                   class="bg-blue-500 hover:bg-blue-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
+                    JSON - All
+                </a>
+                <a href="/entity/{entity}/export/csv"
+                   class="bg-green-500 hover:bg-green-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
+                    CSV - All
+                </a>
+                <a href="/entity/{entity}/export/csv?compress=gzip"
+                   class="bg-green-500 hover:bg-green-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
+                    CSV - All (gzip)
+                </a>
+                <a href="/entity/{entity}/export/ndjson"
+                   class="bg-teal-500 hover:bg-teal-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
+                    NDJSON - All
+                </a>
             </div>
-            <button hx-get="/" 
-                    hx-target="body"
-                    hx-swap="innerHTML"
-                    class="bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
-                ← Back
-            </button>
         </div>
-    """
-    
-    return html
 
-@app.get("/entity/{entity}", response_class=HTMLResponse)
-async def entity_page(entity: str):
+        <!-- Items List -->
+        <div id="items-list">
+            {items:safe}
+        </div>
+
+        <button hx-get="/general-info"
+                hx-target="#main-content"
+                class="mt-6 bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
+            ← Back
+        </button>
+    </div>
+""")
+
+@functools.lru_cache(maxsize=None)
+def entity_page_fragment(entity: str):
     info = get_entity_info(entity)
-    repo = Repository(EntityType(entity))
-    items, total = repo.get_all(page=1)
-    
-    html = f"""
-        <div class="bg-white rounded-xl shadow-xl p-8">
-            <div class="flex items-center gap-3 mb-6">
-                <span class="text-4xl">{info['icon']}</span>
-                <h3 class="text-3xl font-bold text-gray-800">{info['label']} Management</h3>
-            </div>
-            
-            <!-- Search Bar -->
-            <div class="mb-6">
-                <input type="text" 
-                       name="search"
-                       placeholder="🔍 Search {info['label'].lower()}s..."
-                       hx-get="/entity/{entity}/items"
-                       hx-trigger="keyup changed delay:500ms"
-                       hx-target="#items-list"
-                       hx-include="this"
-                       class="w-full px-6 py-3 border-2 border-gray-300 rounded-xl focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent transition">
-            </div>
+    return ENTITY_PAGE.bind(entity=entity, icon=info['icon'], label=info['label'], label_lower=info['label'].lower())
 
-            <!-- Create Form -->
-            <div class="bg-gradient-to-br from-blue-50 to-blue-100 rounded-xl p-6 mb-6 border-2 border-blue-200">
-                <h4 class="font-bold text-gray-800 mb-4 text-lg">➕ Add New {info['label']}</h4>
-                <form hx-post="/entity/{entity}/create" 
-                      hx-target="#items-list"
-                      hx-swap="innerHTML"
-                      class="flex gap-3">
-                    <input type="text" 
-                           name="name" 
-                           placeholder="Enter {info['label'].lower()} name" 
-                           class="flex-1 px-4 py-3 border-2 border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent" 
+EDIT_MODAL = Fragment("""
+    <div class="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50" id="edit-modal">
+        <div class="bg-white rounded-xl p-8 max-w-md w-full mx-4 shadow-2xl">
+            <h3 class="text-2xl font-bold mb-4">Edit {label}</h3>
+            <form hx-put="/entity/{entity}/update/{item_id}"
+                  hx-target="#items-list"
+                  class="space-y-4">
+                <div>
+                    <label class="block text-sm font-semibold text-gray-700 mb-2">Name</label>
+                    <input type="text"
+                           name="name"
+                           value="{name}"
+                           class="w-full px-4 py-3 border-2 border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
                            required>
-                    <button type="submit" 
-                            class="bg-gradient-to-r from-green-500 to-green-600 hover:from-green-600 hover:to-green-700 text-white font-semibold py-3 px-8 rounded-lg shadow-lg transition-all transform hover:scale-105">
-                        ✓ Add
+                </div>
+                <div class="flex gap-3">
+                    <button type="submit"
+                            class="flex-1 bg-blue-500 hover:bg-blue-600 text-white font-semibold py-3 rounded-lg transition">
+                        ✓ Save
                     </button>
-                    <button type="reset" 
-                            class="bg-gray-400 hover:bg-gray-500 text-white font-semibold py-3 px-6 rounded-lg transition">
+                    <button type="button"
+                            onclick="document.getElementById('edit-modal').remove()"
+                            class="flex-1 bg-gray-400 hover:bg-gray-500 text-white font-semibold py-3 rounded-lg transition">
                         ✕ Cancel
                     </button>
-                </form>
-            </div>
+                </div>
+            </form>
+        </div>
+    </div>
+""")
+
+STAT_CARD = Fragment("""
+    <div class="bg-white p-4 rounded-lg shadow">
+        <div class="text-3xl font-bold text-blue-600">{value}</div>
+        <div class="text-sm text-gray-600">{label}</div>
+    </div>
+""")
+
+ACTIVITY_CARD = Fragment("""
+    <div class="bg-white p-3 rounded-lg shadow-sm">
+        <div class="flex items-center justify-between">
+            <span class="px-2 py-1 rounded text-xs font-semibold {action_color}">{action}</span>
+            <span class="text-xs text-gray-500">{timestamp}</span>
+        </div>
+        <div class="text-sm text-gray-700 mt-1">{entity_type}: {entity_id}</div>
+    </div>
+""")
+
+DMT_PAGE = Fragment("""
+    <div class="bg-white rounded-xl shadow-xl p-8" hx-ext="sse" sse-connect="/dmt/events">
+        <div hx-get="/dmt" hx-trigger="sse:change throttle:5s, sse:refresh" hx-target="#main-content" class="hidden"></div>
+        <h2 class="text-3xl font-bold text-gray-800 mb-6">📈 DMT Analytics Dashboard</h2>
+
+        <div class="grid grid-cols-2 md:grid-cols-5 gap-4 mb-6">
+            {stats:safe}
+        </div>
 
-            <!-- Export Options -->
-            <div class="bg-gradient-to-br from-purple-50 to-purple-100 rounded-xl p-6 mb-6 border-2 border-purple-200">
-                <h4 class="font-bold text-gray-800 mb-4 text-lg">📥 Export Data</h4>
-                <div class="flex flex-wrap gap-2">
-                    <a href="/entity/{entity}/export/json?days=1" 
-                       class="bg-blue-500 hover:bg-blue-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
-                        JSON - Last Day
-                    </a>
-                    <a href="/entity/{entity}/export/json?days=7" 
-                       class="bg-blue-500 hover:bg-blue-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
-                        JSON - Last 7 Days
-                    </a>
-                    <a href="/entity/{entity}/export/json" 
-                       class="bg-blue-500 hover:bg-blue-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
-                        JSON - All
-                    </a>
-                    <a href="/entity/{entity}/export/csv" 
-                       class="bg-green-500 hover:bg-green-600 text-white font-semibold py-2 px-4 rounded-lg transition inline-block">
-                        CSV - All
-                    </a>
+        <div class="grid grid-cols-1 md:grid-cols-3 gap-4 mb-6">
+            <div class="bg-gradient-to-br from-red-50 to-red-100 rounded-xl p-6">
+                <h3 class="text-xl font-semibold mb-4">Top Defect Parts ({days}d)</h3>
+                <div class="space-y-2">
+                    {parts:safe}
+                </div>
+            </div>
+            <div class="bg-gradient-to-br from-orange-50 to-orange-100 rounded-xl p-6">
+                <h3 class="text-xl font-semibold mb-4">Top Workcenters ({days}d)</h3>
+                <div class="space-y-2">
+                    {workcenters:safe}
                 </div>
             </div>
+            <div class="bg-gradient-to-br from-yellow-50 to-yellow-100 rounded-xl p-6">
+                <h3 class="text-xl font-semibold mb-4">Open CARs by Age</h3>
+                <div class="space-y-2">
+                    {open_cars:safe}
+                </div>
+            </div>
+        </div>
 
-            <!-- Items List -->
-            <div id="items-list">
-                {render_items_list(items, total, entity, 1)}
+        <div class="bg-gradient-to-br from-green-50 to-green-100 rounded-xl p-6">
+            <h3 class="text-xl font-semibold mb-4">Recent Activity</h3>
+            <div class="space-y-2">
+                {logs:safe}
             </div>
+        </div>
+
+        <button hx-get="/"
+                hx-target="body"
+                hx-swap="innerHTML"
+                class="mt-6 bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
+            ← Back
+        </button>
+    </div>
+""")
+
+ROLLUP_ROW = Fragment("""
+    <div class="bg-white p-3 rounded-lg shadow-sm flex items-center justify-between">
+        <span class="font-semibold text-gray-800">{name}</span>
+        <span class="text-xs text-gray-600">{records} DMTs · {qty} pcs · {open_records} open</span>
+    </div>
+""")
+
+CAR_AGE_ROW = Fragment("""
+    <div class="bg-white p-3 rounded-lg shadow-sm flex items-center justify-between">
+        <span class="font-semibold text-gray-800">{age}</span>
+        <span class="text-xs text-gray-600">{total} open · {dmt} DMT · {ndmt} NDMT</span>
+    </div>
+""")
+
+ROLLUP_EMPTY = '<p class="text-sm text-gray-500">No DMT records yet</p>'
+
+def render_rollup_row(row):
+    return ROLLUP_ROW.render(name=row["name"], records=row["records"], qty=row["qty"], open_records=row["open_records"])
+
+@timed_render
+def render_dmt_page(stats, recent_logs, quality):
+    return DMT_PAGE.render(
+        stats=join_html(STAT_CARD.render(value=value, label=key.capitalize()) for key, value in stats.items()),
+        days=Config.DMT_DASHBOARD_DAYS,
+        parts=join_html(render_rollup_row(row) for row in quality["parts"]) or ROLLUP_EMPTY,
+        workcenters=join_html(render_rollup_row(row) for row in quality["workcenters"]) or ROLLUP_EMPTY,
+        open_cars=join_html(CAR_AGE_ROW.render(**row) for row in quality["open_cars"]),
+        logs=join_html(
+            ACTIVITY_CARD.render(action_color=ACTION_COLORS.get(log['action'], DEFAULT_ACTION_COLOR),
+                                 action=log['action'], timestamp=log['timestamp'],
+                                 entity_type=log['entity_type'], entity_id=log['entity_id'])
+            for log in recent_logs
+        ),
+    )
+
+AUDIT_ROW = Fragment("""
+    <tr class="hover:bg-blue-50 transition">
+        <td class="px-6 py-4 text-sm text-gray-600">{timestamp}</td>
+        <td class="px-6 py-4 text-sm font-semibold text-gray-800">{entity_type}</td>
+        <td class="px-6 py-4 text-sm font-mono text-blue-600">{entity_id}</td>
+        <td class="px-6 py-4">
+            <span class="px-3 py-1 rounded-full text-xs font-semibold {action_color}">
+                {action}
+            </span>
+        </td>
+        <td class="px-6 py-4 text-sm text-gray-600">
+            <pre class="text-xs bg-gray-100 p-2 rounded max-w-xs overflow-x-auto">{changes}</pre>
+        </td>
+    </tr>
+""")
+
+AUDIT_PAGE = Fragment("""
+    <div class="bg-white rounded-xl shadow-xl p-8">
+        <h2 class="text-3xl font-bold text-gray-800 mb-6">📋 Audit Log</h2>
 
-            <button hx-get="/general-info" 
-                    hx-target="#main-content"
-                    class="mt-6 bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
-                ← Back
-            </button>
+        <form hx-get="/audit/rows"
+              hx-target="#audit-rows"
+              hx-trigger="change, keyup changed delay:500ms from:input[name='entity_id'], submit"
+              class="flex flex-wrap gap-3 mb-6">
+            <select name="entity_type" class="px-4 py-2 border-2 border-gray-300 rounded-lg">
+                <option value="">All entities</option>
+                {entity_options:safe}
+            </select>
+            <input type="text" name="entity_id" placeholder="Entity ID"
+                   class="px-4 py-2 border-2 border-gray-300 rounded-lg font-mono">
+            <select name="action" class="px-4 py-2 border-2 border-gray-300 rounded-lg">
+                <option value="">All actions</option>
+                {action_options:safe}
+            </select>
+            <input type="date" name="since" class="px-4 py-2 border-2 border-gray-300 rounded-lg">
+            <input type="date" name="until" class="px-4 py-2 border-2 border-gray-300 rounded-lg">
+        </form>
+
+        <div class="overflow-x-auto">
+            <table class="min-w-full bg-white rounded-lg overflow-hidden">
+                <thead class="bg-gradient-to-r from-gray-100 to-gray-200">
+                    <tr>
+                        <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Timestamp</th>
+                        <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Entity Type</th>
+                        <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Entity ID</th>
+                        <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Action</th>
+                        <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Changes</th>
+                    </tr>
+                </thead>
+                <tbody id="audit-rows" class="divide-y divide-gray-200">
+                    {rows:safe}
+                </tbody>
+            </table>
         </div>
-    """
+
+        <button hx-get="/"
+                hx-target="body"
+                hx-swap="innerHTML"
+                class="mt-6 bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
+            ← Back
+        </button>
+    </div>
+""")
+
+AUDIT_OPTION = Fragment('<option value="{value}">{label}</option>')
+
+AUTOCOMPLETE_OPTION = Fragment('<option value="{id}">{name}</option>')
+
+AUDIT_MORE = Fragment("""
+    <tr hx-get="/audit/rows?{query}" hx-trigger="revealed" hx-swap="outerHTML">
+        <td colspan="5" class="px-6 py-4 text-center text-sm text-gray-400">Loading more…</td>
+    </tr>
+""")
+
+AUDIT_EMPTY = Fragment("""
+    <tr>
+        <td colspan="5" class="px-6 py-8 text-center text-gray-500">No audit entries match these filters</td>
+    </tr>
+""")
+
+@timed_render
+def render_audit_rows(logs):
+    return join_html(
+        AUDIT_ROW.render(timestamp=log['timestamp'], entity_type=log['entity_type'], entity_id=log['entity_id'],
+                         action_color=ACTION_COLORS.get(log['action'], DEFAULT_ACTION_COLOR),
+                         action=log['action'], changes=log.get('changes', '{}'))
+        for log in logs
+    )
+
+@timed_render
+def render_audit_page_rows(result, filters, first: bool):
+    if first and not result["items"]:
+        return AUDIT_EMPTY.render()
+    
+    rows = render_audit_rows(result["items"])
+    if result["next_cursor"]:
+        query = urlencode({**{k: v for k, v in filters.items() if v}, "cursor": result["next_cursor"]})
+        rows += AUDIT_MORE.render(query=query)
+    return rows
+
+@timed_render
+def render_audit_page(result, filters):
+    return AUDIT_PAGE.render(
+        entity_options=join_html(AUDIT_OPTION.render(value=entity, label=get_entity_info(entity)['label'])
+                                 for entity in AUDIT_ENTITY_TYPES),
+        action_options=join_html(AUDIT_OPTION.render(value=action, label=action.title()) for action in AUDIT_ACTIONS),
+        rows=render_audit_page_rows(result, filters, first=True),
+    )
+
+# ==================== CONDITIONAL RESPONSES ====================
+def etag_matches(header: Optional[str], etag: str):
+    if not header:
+        return False
+    return any(tag.strip() in ("*", etag) for tag in header.split(","))
+
+async def cached_html(request: Request, table: str, key: tuple, render):
+    # The version is read before rendering, so a concurrent write can only make the entry unreachable, never stale
+    await sync_versions()
+    key = (table, *key, db.versions.get(table))
+    etag = f'W/"{db.versions.epoch}-{hashlib.sha1(repr((db.db_path, key)).encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        db.responses.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    
+    body = db.responses.get(key)
+    if body is None:
+        body = Precompressed(await render())
+        db.responses.put(key, body)
+    return body.response(request, headers)
+
+ROOT_BODY = Precompressed(ROOT_PAGE)
+GENERAL_INFO_BODY = Precompressed(GENERAL_INFO_PAGE)
+
+def static_html(request: Request, body: Precompressed):
+    headers = {"ETag": body.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), body.etag):
+        return Response(status_code=304, headers=headers)
+    return body.response(request, headers)
+
+# ==================== CHANGE STREAMS ====================
+SSE_REFRESH = "event: refresh\ndata: \n\n"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_message(event: str, data: str):
+    return f"event: {event}\n" + "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+
+async def render_change_messages(table: str, changes: dict, view: Optional[str] = None):
+    if table == DMT_TABLE:
+        return [((table, item_id), sse_message("change", json.dumps({"id": item_id, "action": action})))
+                for item_id, action in changes.items()]
+    if view not in FEED_VIEWS or view == "refresh":
+        # A filtered list can't tell which pushed rows match its search, so it reloads instead
+        return [((table, None), SSE_REFRESH)]
+    
+    rows = await AsyncRepository(EntityType(table)).get_many([item_id for item_id, action in changes.items()
+                                                              if action != "DELETE"])
+    messages = []
+    for item_id, action in changes.items():
+        row = rows.get(item_id)
+        if row is None:
+            html = ITEM_DELETE_OOB.render(id=item_id)
+        elif action == "CREATE" and view == "page":
+            # New rows sort onto the first page, never into a later one
+            continue
+        elif action == "CREATE":
+            # Drop the copy the creating station already swapped in before prepending the pushed one
+            html = join_html([ITEM_DELETE_OOB.render(id=item_id), ITEM_PREPEND_OOB.render(row=render_item_row(row, table)),
+                              ITEMS_EMPTY_OOB])
+        else:
+            html = render_item_row(row, table).replace('<div id="item-', '<div hx-swap-oob="true" id="item-', 1)
+        messages.append(((table, item_id), sse_message("change", html)))
+    
+    total = await items_total_oob(table)
+    if total:
+        messages.append(((table, None), sse_message("change", total)))
+    return messages
+
+async def change_stream(table: str, view: Optional[str] = None):
+    # Subscribing inside the generator ties the subscription's lifetime to the stream's finally block
+    subscriber = db.changes.subscribe(table, view)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), Config.CHANGE_FEED_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            messages, reset = subscriber.drain()
+            yield SSE_REFRESH if reset else "".join(messages)
+    finally:
+        db.changes.unsubscribe(subscriber)
+
+def subscribe_response(table: str, view: Optional[str] = None):
+    if db.changes.subscribers() >= Config.CHANGE_FEED_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many change-feed subscribers")
+    return StreamingResponse(change_stream(table, view), media_type="text/event-stream",
+                             headers=SSE_HEADERS)
+
+# ==================== ROUTES ====================
+@app.get("/", response_class=HTMLResponse)
+async def root(request: Request):
+    return static_html(request, ROOT_BODY)
+
+@app.get("/general-info", response_class=HTMLResponse)
+async def general_info(request: Request):
+    return static_html(request, GENERAL_INFO_BODY)
+
+@app.get("/entity/{entity}", response_class=HTMLResponse)
+async def entity_page(request: Request, entity: str):
+    entity = EntityType(entity).value
     
-    return html
+    async def render():
+        return entity_page_fragment(entity).render(items=await load_items_html(entity))
+    
+    return await cached_html(request, entity, ("page",), render)
 
 @app.get("/entity/{entity}/items", response_class=HTMLResponse)
-async def get_items(entity: str, page: int = 1, search: str = ""):
-    repo = Repository(EntityType(entity))
-    items, total = repo.get_all(page=page, search=search if search else None)
-    return render_items_list(items, total, entity, page, search)
+async def get_items(request: Request, entity: str, page: Optional[int] = None, search: str = "",
+                    cursor: Optional[str] = None):
+    entity = EntityType(entity).value
+    return await cached_html(request, entity, ("items", page, search, cursor),
+                             lambda: load_items_html(entity, page, search, cursor))
+
+async def items_total_oob(entity: str, search: str = ""):
+    if search or Config.COUNT_MODE == "none":
+        return ""
+    total = await db.executor.read(db.counters.count, entity)
+    return ITEMS_TOTAL_OOB.render(total=total) if total is not None else ""
+
+def swap_response(html: str, target: str, swap: str):
+    # Mutations keep their full-list hx-target in the markup; incremental responses redirect the swap instead
+    return HTMLResponse(html, headers={"HX-Retarget": target, "HX-Reswap": swap})
 
 @app.post("/entity/{entity}/create", response_class=HTMLResponse)
-async def create_item(entity: str, name: str = Form(...)):
-    repo = Repository(EntityType(entity))
-    repo.create(name.strip())
+async def create_item(entity: str, name: str = Form(...), search: str = Form("")):
+    repo = AsyncRepository(EntityType(entity))
+    item = await repo.create(name.strip())
+    toast = render_toast(f"{get_entity_info(entity)['label']} created successfully!", "success")
     
-    items, total = repo.get_all(page=1)
-    html = render_items_list(items, total, entity, 1)
-    html += render_toast(f"{get_entity_info(entity)['label']} created successfully!", "success")
-    return html
+    if Config.MUTATION_RESPONSE != "incremental":
+        return join_html([await load_items_html(entity, search=search), toast])
+    
+    if search and search.strip().lower() not in item['name'].lower():
+        return swap_response(toast, "#items-rows", "none")
+    return swap_response(join_html([
+        render_item_row(item, entity),
+        ITEMS_EMPTY_OOB,
+        await items_total_oob(entity, search),
+        toast,
+    ]), "#items-rows", "afterbegin")
 
 @app.get("/entity/{entity}/edit/{item_id}", response_class=HTMLResponse)
-async def edit_form(entity: str, item_id: str):
-    repo = Repository(EntityType(entity))
-    item = repo.get_by_id(item_id)
-    info = get_entity_info(entity)
+async def edit_form(request: Request, entity: str, item_id: str):
+    entity = EntityType(entity).value
     
-    if not item:
-        return render_toast("Item not found", "error")
+    async def render():
+        item = await AsyncRepository(EntityType(entity)).get_by_id(item_id)
+        if not item:
+            return render_toast("Item not found", "error")
+        return EDIT_MODAL.render(label=get_entity_info(entity)['label'], entity=entity, item_id=item_id, name=item['name'])
     
-    return f"""
-        <div class="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50" id="edit-modal">
-            <div class="bg-white rounded-xl p-8 max-w-md w-full mx-4 shadow-2xl">
-                <h3 class="text-2xl font-bold mb-4">Edit {info['label']}</h3>
-                <form hx-put="/entity/{entity}/update/{item_id}" 
-                      hx-target="#items-list"
-                      class="space-y-4">
-                    <div>
-                        <label class="block text-sm font-semibold text-gray-700 mb-2">Name</label>
-                        <input type="text" 
-                               name="name" 
-                               value="{item['name']}" 
-                               class="w-full px-4 py-3 border-2 border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500" 
-                               required>
-                    </div>
-                    <div class="flex gap-3">
-                        <button type="submit" 
-                                class="flex-1 bg-blue-500 hover:bg-blue-600 text-white font-semibold py-3 rounded-lg transition">
-                            ✓ Save
-                        </button>
-                        <button type="button" 
-                                onclick="document.getElementById('edit-modal').remove()"
-                                class="flex-1 bg-gray-400 hover:bg-gray-500 text-white font-semibold py-3 rounded-lg transition">
-                            ✕ Cancel
-                        </button>
-                    </div>
-                </form>
-            </div>
-        </div>
-    """
+    return await cached_html(request, entity, ("edit", item_id), render)
 
 @app.put("/entity/{entity}/update/{item_id}", response_class=HTMLResponse)
 async def update_item(entity: str, item_id: str, name: str = Form(...)):
-    repo = Repository(EntityType(entity))
-    updated = repo.update(item_id, name.strip())
+    repo = AsyncRepository(EntityType(entity))
+    updated = await repo.update(item_id, name.strip())
     
     if not updated:
         return render_toast("Item not found", "error")
     
-    items, total = repo.get_all(page=1)
-    html = render_items_list(items, total, entity, 1)
-    html += render_toast(f"{get_entity_info(entity)['label']} updated successfully!", "success")
-    html += '<div hx-swap-oob="true" id="edit-modal"></div>'
-    return html
+    toast = render_toast(f"{get_entity_info(entity)['label']} updated successfully!", "success")
+    if Config.MUTATION_RESPONSE != "incremental":
+        return join_html([await load_items_html(entity), toast, EDIT_MODAL_CLOSE])
+    
+    return swap_response(join_html([render_item_row(updated, entity), toast, EDIT_MODAL_CLOSE]),
+                         f"#item-{item_id}", "outerHTML")
 
 @app.delete("/entity/{entity}/delete/{item_id}", response_class=HTMLResponse)
 async def delete_item(entity: str, item_id: str):
-    repo = Repository(EntityType(entity))
-    success = repo.delete(item_id)
+    repo = AsyncRepository(EntityType(entity))
+    success = await repo.delete(item_id)
     
     if not success:
         return render_toast("Item not found", "error")
     
-    items, total = repo.get_all(page=1)
-    html = render_items_list(items, total, entity, 1)
-    html += render_toast(f"{get_entity_info(entity)['label']} deleted successfully!", "success")
-    return html
+    toast = render_toast(f"{get_entity_info(entity)['label']} deleted successfully!", "success")
+    if Config.MUTATION_RESPONSE != "incremental":
+        return join_html([await load_items_html(entity), toast])
+    
+    return swap_response(join_html([await items_total_oob(entity), toast]), f"#item-{item_id}", "outerHTML")
 
-@app.get("/entity/{entity}/export/{format}")
-async def export_data(entity: str, format: str, days: Optional[int] = None):
-    repo = Repository(EntityType(entity))
-    items, _ = repo.get_all(days=days, page=1)
-    
-    for item in items:
-        item.pop('is_active', None)
-    
-    if format == "csv":
-        output = io.StringIO()
-        if items:
-            writer = csv.DictWriter(output, fieldnames=items[0].keys())
-            writer.writeheader()
-            writer.writerows(items)
-        
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode()),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={entity}_{datetime.now().strftime('%Y%m%d')}.csv"}
-        )
-    else:
-        json_str = json.dumps(items, indent=2, default=str)
-        return StreamingResponse(
-            io.BytesIO(json_str.encode()),
-            media_type="application/json",
-            headers={"Content-Disposition": f"attachment; filename={entity}_{datetime.now().strftime('%Y%m%d')}.json"}
-        )
+class BatchUpdate(BaseModel):
+    id: str
+    name: str
 
-@app.get("/dmt", response_class=HTMLResponse)
-async def dmt_page():
-    conn = db.get_connection()
-    c = conn.cursor()
+class BatchRequest(BaseModel):
+    create: List[str] = []
+    update: List[BatchUpdate] = []
+    delete: List[str] = []
+
+@app.post("/entity/{entity}/batch")
+async def batch_mutations(entity: str, batch: BatchRequest):
+    operations = len(batch.create) + len(batch.update) + len(batch.delete)
+    if operations > Config.BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {Config.BATCH_MAX_OPERATIONS} operations")
     
-    stats = {}
-    for entity in EntityType:
-        c.execute(f"SELECT COUNT(*) as count FROM {entity.value} WHERE is_active = 1")
-        stats[entity.value] = c.fetchone()[0]
+    errors, create, update = [], [], []
+    for index, value in enumerate(batch.create):
+        name, error = validate_name(value)
+        if error:
+            errors.append({"operation": "create", "index": index, "error": error})
+        create.append(name)
+    for index, change in enumerate(batch.update):
+        name, error = validate_name(change.name)
+        if error:
+            errors.append({"operation": "update", "index": index, "error": error})
+        update.append((change.id, name))
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
     
-    c.execute("SELECT * FROM audit_log ORDER BY timestamp DESC LIMIT 10")
-    recent_logs = [dict(row) for row in c.fetchall()]
-    conn.close()
+    repo = AsyncRepository(EntityType(entity))
+    started = time.perf_counter()
+    result = await repo.apply_batch(create, update, batch.delete)
     
-    stats_html = ""
-    for key, value in stats.items():
-        stats_html += f"""
-            <div class="bg-white p-4 rounded-lg shadow">
-                <div class="text-3xl font-bold text-blue-600">{value}</div>
-                <div class="text-sm text-gray-600">{key.capitalize()}</div>
-            </div>
-        """
+    result["missing"] = {
+        "update": sorted({item_id for item_id, _ in update} - {item["id"] for item in result["updated"]}),
+        "delete": sorted(set(batch.delete) - set(result["deleted"])),
+    }
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+@app.get("/entity/{entity}/events")
+async def entity_events(entity: str, view: str = "refresh"):
+    if view not in FEED_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown change-feed view: {view}")
+    return subscribe_response(EntityType(entity).value, view)
+
+@app.get("/entity/{entity}/autocomplete")
+async def autocomplete(entity: str, q: str = "", limit: int = Config.AUTOCOMPLETE_LIMIT, format: str = "json"):
+    if format not in ("json", "options"):
+        raise HTTPException(status_code=400, detail=f"Unsupported autocomplete format: {format}")
     
-    logs_html = ""
-    for log in recent_logs:
-        action_color = {
-            "CREATE": "bg-green-100 text-green-700",
-            "UPDATE": "bg-yellow-100 text-yellow-700",
-            "DELETE": "bg-red-100 text-red-700"
-        }.get(log['action'], "bg-gray-100 text-gray-700")
-        
-        logs_html += f"""
-            <div class="bg-white p-3 rounded-lg shadow-sm">
-                <div class="flex items-center justify-between">
-                    <span class="px-2 py-1 rounded text-xs font-semibold {action_color}">{log['action']}</span>
-                    <span class="text-xs text-gray-500">{log['timestamp']}</span>
-                </div>
-                <div class="text-sm text-gray-700 mt-1">{log['entity_type']}: {log['entity_id']}</div>
-            </div>
-        """
+    limit = max(1, min(limit, Config.AUTOCOMPLETE_MAX_LIMIT))
+    items = await AsyncRepository(EntityType(entity)).autocomplete(q.strip(), limit)
+    if format == "options":
+        return HTMLResponse(join_html(AUTOCOMPLETE_OPTION.render(**item) for item in items))
+    return Response(json.dumps({"items": items}, separators=(",", ":")), media_type="application/json")
+
+@app.post("/entity/{entity}/import")
+async def import_data(entity: str, file: UploadFile = File(...), format: Optional[str] = None,
+                      batch_size: Optional[int] = None):
+    if not format:
+        filename = (file.filename or "").lower()
+        format = "ndjson" if filename.endswith((".ndjson", ".jsonl")) else "csv"
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format: {format}")
+    if batch_size is not None and batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be positive")
     
-    return f"""
-        <div class="bg-white rounded-xl shadow-xl p-8">
-            <h2 class="text-3xl font-bold text-gray-800 mb-6">📈 DMT Analytics Dashboard</h2>
-            
-            <div class="grid grid-cols-2 md:grid-cols-5 gap-4 mb-6">
-                {stats_html}
-            </div>
-            
-            <div class="bg-gradient-to-br from-green-50 to-green-100 rounded-xl p-6">
-                <h3 class="text-xl font-semibold mb-4">Recent Activity</h3>
-                <div class="space-y-2">
-                    {logs_html}
-                </div>
-            </div>
-            
-            <button hx-get="/" 
-                    hx-target="body"
-                    hx-swap="innerHTML"
-                    class="mt-6 bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
-                ← Back
-            </button>
-        </div>
-    """
+    repo = AsyncRepository(EntityType(entity))
+    started = time.perf_counter()
+    try:
+        result = await repo.bulk_import(file.file, format, batch_size)
+    except ImportFormatError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+@app.get("/entity/{entity}/export/{format}")
+async def export_data(entity: str, format: str, days: Optional[int] = None, compress: Optional[str] = None):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    if compress is not None and (compress not in CODECS or compress not in EXPORT_COMPRESSION):
+        raise HTTPException(status_code=400, detail=f"Unsupported compression: {compress}")
+    
+    repo = Repository(EntityType(entity))
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"{entity}_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    if compress:
+        media_type, extension = EXPORT_COMPRESSION[compress]
+        filename = f"{filename}.{extension}"
+    
+    return StreamingResponse(
+        stream_export(repo.iter_export(days), format, compress=compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@app.get("/dmt", response_class=HTMLResponse)
+async def dmt_page():
+    stats, recent_logs, quality = await db.executor.read(fetch_dashboard_data)
+    return render_dmt_page(stats, recent_logs, quality)
+
+class DmtRecordIn(BaseModel):
+    id: Optional[str] = None
+    workcenter_id: Optional[str] = None
+    part_number_id: Optional[str] = None
+    operation: Optional[str] = None
+    employee_id: Optional[str] = None
+    qty: Optional[int] = None
+    customer_id: Optional[str] = None
+    shop_order: Optional[str] = None
+    serial_number: Optional[str] = None
+    inspection_item_id: Optional[str] = None
+    date: Optional[str] = None
+    prepared_by_id: Optional[str] = None
+    defect_description: Optional[str] = None
+    car_type: Optional[str] = None
+    car_cycle: Optional[int] = None
+    car_second_cycle_date: Optional[str] = None
+    disposition_approved_date: Optional[str] = None
+    disposition_approved_by_id: Optional[str] = None
+    sdr_number: Optional[str] = None
+    sdr_approve_date: Optional[str] = None
+    dmt_closed: Optional[bool] = None
+    car_closed_date: Optional[str] = None
+    is_return: Optional[bool] = None
+
+DMT_STATUSES = ("open", "closed")
+ROLLUP_GROUPS = ("part", "workcenter", "day")
+
+@app.get("/dmt/events")
+async def dmt_events():
+    return subscribe_response(DMT_TABLE)
+
+@app.get("/dmt/records")
+async def list_dmt_records(since: Optional[str] = None, until: Optional[str] = None,
+                           part_number_id: Optional[str] = None, workcenter_id: Optional[str] = None,
+                           status: Optional[str] = None, cursor: Optional[str] = None, limit: Optional[int] = None):
+    if status and status not in DMT_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown DMT status: {status}")
+    return await AsyncDmtRepository().list(since=since, until=until, part_number_id=part_number_id,
+                                           workcenter_id=workcenter_id, status=status, cursor=cursor, limit=limit)
+
+@app.post("/dmt/records", status_code=201)
+async def create_dmt_record(record: DmtRecordIn):
+    values = record.model_dump(exclude_unset=True)
+    record_id = (values.pop("id", None) or "").strip()
+    repo = AsyncDmtRepository()
+    fields = await repo.validate(values)
+    try:
+        return await repo.create({"id": record_id, **fields})
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=409, detail=f"DMT record {record_id} already exists")
+
+@app.get("/dmt/records/{record_id}")
+async def get_dmt_record(record_id: str):
+    record = await AsyncDmtRepository().get(record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="DMT record not found")
+    return record
+
+@app.patch("/dmt/records/{record_id}")
+async def update_dmt_record(record_id: str, record: DmtRecordIn):
+    values = record.model_dump(exclude_unset=True)
+    values.pop("id", None)
+    repo = AsyncDmtRepository()
+    updated = await repo.update(record_id, await repo.validate(values, partial=True))
+    if updated is None:
+        raise HTTPException(status_code=404, detail="DMT record not found")
+    return updated
+
+@app.post("/dmt/records/{record_id}/close")
+async def close_dmt_record(record_id: str, closed_date: Optional[str] = None):
+    repo = AsyncDmtRepository()
+    if closed_date:
+        closed_date = (await repo.validate({"car_closed_date": closed_date}, partial=True))["car_closed_date"]
+    closed = await repo.close(record_id, closed_date)
+    if closed is None:
+        raise HTTPException(status_code=404, detail="DMT record not found")
+    return closed
+
+@app.delete("/dmt/records/{record_id}")
+async def delete_dmt_record(record_id: str):
+    if not await AsyncDmtRepository().delete(record_id):
+        raise HTTPException(status_code=404, detail="DMT record not found")
+    return {"deleted": record_id}
+
+@app.get("/dmt/rollups/defects")
+async def dmt_defect_rollup(since: Optional[str] = None, until: Optional[str] = None, by: str = "part",
+                            part_number_id: Optional[str] = None, workcenter_id: Optional[str] = None, limit: int = 20):
+    if by not in ROLLUP_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Unsupported grouping: {by}")
+    rows = await db.executor.read(db.rollups.defects, since, until, by, part_number_id, workcenter_id,
+                                  max(1, min(limit, Config.DMT_MAX_PAGE_SIZE)))
+    if by != "day":
+        entity = EntityType.PARTNUMBERS if by == "part" else EntityType.AREAS
+        rows = await db.executor.read(DmtRepository().with_names, rows, "key", entity)
+    return {"by": by, "items": rows}
+
+@app.get("/dmt/rollups/open-cars")
+async def dmt_open_car_rollup():
+    return {"buckets": await db.executor.read(db.rollups.open_cars_by_age)}
 
 @app.get("/audit", response_class=HTMLResponse)
 async def audit_page():
-    conn = db.get_connection()
-    c = conn.cursor()
-    c.execute("SELECT * FROM audit_log ORDER BY timestamp DESC LIMIT 100")
-    logs = [dict(row) for row in c.fetchall()]
-    conn.close()
-    
-    logs_html = ""
-    for log in logs:
-        action_color = {
-            "CREATE": "bg-green-100 text-green-700",
-            "UPDATE": "bg-yellow-100 text-yellow-700",
-            "DELETE": "bg-red-100 text-red-700"
-        }.get(log['action'], "bg-gray-100 text-gray-700")
-        
-        changes = log.get('changes', '{}')
-        
-        logs_html += f"""
-            <tr class="hover:bg-blue-50 transition">
-                <td class="px-6 py-4 text-sm text-gray-600">{log['timestamp']}</td>
-                <td class="px-6 py-4 text-sm font-semibold text-gray-800">{log['entity_type']}</td>
-                <td class="px-6 py-4 text-sm font-mono text-blue-600">{log['entity_id']}</td>
-                <td class="px-6 py-4">
-                    <span class="px-3 py-1 rounded-full text-xs font-semibold {action_color}">
-                        {log['action']}
-                    </span>
-                </td>
-                <td class="px-6 py-4 text-sm text-gray-600">
-                    <pre class="text-xs bg-gray-100 p-2 rounded max-w-xs overflow-x-auto">{changes}</pre>
-                </td>
-            </tr>
-        """
+    result = await db.executor.read(query_audit_logs)
+    return render_audit_page(result, {})
+
+@app.get("/audit/rows", response_class=HTMLResponse)
+async def audit_rows(entity_type: Optional[str] = None, entity_id: Optional[str] = None, action: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None, cursor: Optional[str] = None):
+    filters = {"entity_type": entity_type, "entity_id": entity_id, "action": action, "since": since, "until": until}
+    result = await db.executor.read(query_audit_logs, **filters, cursor=cursor)
+    return render_audit_page_rows(result, filters, first=cursor is None)
+
+@app.get("/audit/logs")
+async def audit_logs(entity_type: Optional[str] = None, entity_id: Optional[str] = None, action: Optional[str] = None,
+                     since: Optional[str] = None, until: Optional[str] = None, cursor: Optional[str] = None,
+                     limit: Optional[int] = None):
+    return await db.executor.read(query_audit_logs, entity_type, entity_id, action, since, until, cursor, limit)
+
+async def run_snapshot_task(fn, *args):
+    # Backups pace themselves between steps, so they get their own thread instead of a database lane
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except SnapshotNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except SnapshotBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except SnapshotCorrupt as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+@app.get("/snapshots")
+async def list_snapshots():
+    return {"snapshots": await run_snapshot_task(db.snapshots.list)}
+
+@app.post("/snapshots", status_code=201)
+async def create_snapshot():
+    return await run_snapshot_task(db.snapshots.create)
+
+@app.get("/snapshots/{name}")
+async def get_snapshot(name: str, verify: bool = False):
+    return await run_snapshot_task(db.snapshots.verify if verify else db.snapshots.manifest, name)
+
+@app.get("/snapshots/{name}/export")
+async def export_snapshot(name: str, format: str = "ndjson", compress: Optional[str] = None):
+    if format not in SNAPSHOT_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported snapshot export format: {format}")
+    if compress is not None and (compress not in CODECS or compress not in EXPORT_COMPRESSION):
+        raise HTTPException(status_code=400, detail=f"Unsupported compression: {compress}")
     
-    return f"""
-        <div class="bg-white rounded-xl shadow-xl p-8">
-            <h2 class="text-3xl font-bold text-gray-800 mb-6">📋 Audit Log</h2>
-            
-            <div class="overflow-x-auto">
-                <table class="min-w-full bg-white rounded-lg overflow-hidden">
-                    <thead class="bg-gradient-to-r from-gray-100 to-gray-200">
-                        <tr>
-                            <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Timestamp</th>
-                            <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Entity Type</th>
-                            <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Entity ID</th>
-                            <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Action</th>
-                            <th class="px-6 py-3 text-left text-xs font-bold text-gray-700 uppercase">Changes</th>
-                        </tr>
-                    </thead>
-                    <tbody class="divide-y divide-gray-200">
-                        {logs_html}
-                    </tbody>
-                </table>
-            </div>
-            
-            <button hx-get="/" 
-                    hx-target="body"
-                    hx-swap="innerHTML"
-                    class="mt-6 bg-gray-500 hover:bg-gray-600 text-white font-semibold py-2 px-6 rounded-lg transition">
-                ← Back
-            </button>
-        </div>
-    """
+    manifest, path = await run_snapshot_task(db.snapshots.restore, name)
+    media_type, extension = SNAPSHOT_EXPORT_FORMATS[format]
+    filename = f"{manifest['name']}.{extension}"
+    if compress:
+        media_type, extension = EXPORT_COMPRESSION[compress]
+        filename = f"{filename}.{extension}"
+    
+    return StreamingResponse(
+        stream_snapshot_export(db.snapshots.iter_tables(path, SNAPSHOT_TABLES), format, manifest, compress=compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}",
+                 "X-Snapshot": manifest["name"], "X-Snapshot-SHA256": manifest["sha256"]}
+    )
+
+@app.get("/global/dashboard")
+async def global_dashboard():
+    shards = await fan_out(fetch_dashboard_data)
+    counts = dict.fromkeys((entity.value for entity in EntityType), 0)
+    open_cars = {}
+    for stats, _, quality in shards.values():
+        for entity, count in stats.items():
+            counts[entity] += count
+        for bucket in quality["open_cars"]:
+            merged = open_cars.setdefault(bucket["age"], {"age": bucket["age"], "dmt": 0, "ndmt": 0, "total": 0})
+            for key in ("dmt", "ndmt", "total"):
+                merged[key] += bucket[key]
+    recent = heapq.merge(*([dict(log, plant=plant) for log in logs] for plant, (_, logs, _) in shards.items()),
+                         key=audit_order, reverse=True)
+    return {
+        "counts": counts,
+        "open_cars": list(open_cars.values()),
+        "recent_logs": list(itertools.islice(recent, 10)),
+        "plants": {plant: {"counts": stats, "quality": quality} for plant, (stats, _, quality) in shards.items()},
+    }
+
+@app.get("/global/audit/logs")
+async def global_audit_logs(entity_type: Optional[str] = None, entity_id: Optional[str] = None,
+                            action: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                            cursor: Optional[str] = None, limit: Optional[int] = None):
+    return await query_global_audit_logs(entity_type, entity_id, action, since, until, cursor, limit)
+
+def database_stats(database):
+    return {
+        "pool": database.pool.stats(),
+        "executor": database.executor.stats(),
+        "counts": database.counts.stats(),
+        "entities": database.entities.stats(),
+        "search": database.search.stats(),
+        "autocomplete": database.autocomplete.stats(),
+        "versions": database.versions.stats(),
+        "responses": database.responses.stats(),
+        "changes": database.changes.stats(),
+        "audit": database.audit.stats(),
+        "archive": database.archive.stats(),
+        "snapshots": database.snapshots.stats(),
+        "schema": database.migrator.stats(),
+    }
+
+@app.get("/stats")
+async def stats():
+    if db.sharded:
+        return {"shards": {plant: database_stats(database) for plant, database in db.shards.items()}}
+    return database_stats(db.current())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    gauges = []
+    for plant, database in db.shards.items():
+        labels = (("plant", plant),) if plant else ()
+        for component in ("pool", "executor", "counts", "entities", "responses", "changes", "audit", "archive",
+                          "snapshots"):
+            gauges.extend(stats_gauges(f"qms_{component}", getattr(database, component).stats(), labels))
+        gauges.extend(stats_gauges("qms_schema", database.migrator.stats(), labels))
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Quality Management System")
+    parser.add_argument("--plant", action="append", help="Plant shard for maintenance commands (default: every plant)")
+    commands = parser.add_subparsers(dest="command")
+    serve_parser = commands.add_parser("serve", help="Run the web server (default)")
+    serve_parser.add_argument("--workers", type=int, default=Config.WORKERS, help="Worker processes")
+    serve_parser.add_argument("--reload", action="store_true", default=Config.RELOAD,
+                              help="Restart on source changes (development; runs a single worker)")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    rebuild_parser = commands.add_parser("rebuild-search", help="Rebuild the full-text search index")
+    rebuild_parser.add_argument("entities", nargs="*", metavar="entity", help="Entity tables to rebuild (default: all)")
+    commands.add_parser("reconcile-stats", help="Recount active rows and repair drifted dashboard counters and rollups")
+    archive_parser = commands.add_parser("archive-audit", help="Move old audit rows into compressed monthly segments")
+    archive_parser.add_argument("--older-than-days", type=int, default=Config.AUDIT_RETENTION_DAYS)
+    archive_parser.add_argument("--convert", action="store_true",
+                                help="VACUUM once so an existing database switches to incremental auto-vacuum")
+    snapshot_parser = commands.add_parser("snapshot", help="Write a compressed, checksummed online backup")
+    snapshot_parser.add_argument("--verify", nargs="*", metavar="name",
+                                 help="Check stored snapshots against their sha256 instead (default: all)")
+    args = parser.parse_args()
+    
+    if args.command in (None, "serve"):
+        import uvicorn
+        workers = getattr(args, "workers", Config.WORKERS)
+        reload = getattr(args, "reload", Config.RELOAD)
+        if reload and workers > 1:
+            parser.error("--reload runs a single worker; drop --workers or QMS_WORKERS")
+        uvicorn.run("main:app", host="0.0.0.0", port=getattr(args, "port", 8000), workers=workers, reload=reload)
+    else:
+        # Maintenance commands run against each plant's database in turn
+        for plant in args.plant or db.plants:
+            if plant not in db.shards:
+                parser.error(f"unknown plant: {plant}")
+            current_plant.set(plant)
+            if plant:
+                print(f"🏭 Plant {plant}")
+            if args.command == "rebuild-search":
+                for entity in args.entities or [e.value for e in EntityType]:
+                    rows = db.search.rebuild(EntityType(entity).value)
+                    print(f"🔎 Rebuilt {entity} search index ({rows} rows)")
+            elif args.command == "reconcile-stats":
+                drift = db.counters.reconcile()
+                print(f"🧮 Repaired counters: {drift}" if drift else "🧮 Counters are consistent")
+                drift = db.rollups.reconcile()
+                print(f"🧮 Rebuilt DMT rollups: {drift}" if drift else "🧮 DMT rollups are consistent")
+            elif args.command == "archive-audit":
+                if args.convert:
+                    with db.connection() as conn:
+                        conn.execute("VACUUM")
+                summary = db.archive.archive(args.older_than_days)
+                print(f"🗄️ Archived {summary['archived']} audit rows older than {summary['cutoff']} "
+                      f"({db.archive.stats()['freed_pages']} pages freed)")
+            elif args.command == "snapshot" and args.verify is not None:
+                for name in args.verify or [snapshot["name"] for snapshot in db.snapshots.list()]:
+                    try:
+                        db.snapshots.verify(name)
+                        print(f"✅ {name} matches its sha256")
+                    except (SnapshotNotFound, SnapshotCorrupt) as exc:
+                        print(f"❌ {exc}")
+            elif args.command == "snapshot":
+                manifest = db.snapshots.create()
+                print(f"💾 Snapshot {manifest['name']}: {manifest['pages']} pages, {manifest['bytes']} → "
+                      f"{manifest['compressed_bytes']} bytes in {manifest['elapsed_ms']} ms "
+                      f"(sha256 {manifest['sha256']})")
\ No newline at end of file
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+# main opens its database at import time, so point it at a scratch file before anything imports it
+DATA_DIR = tempfile.mkdtemp(prefix="qms-tests-")
+os.environ["QMS_DATABASE_PATH"] = os.path.join(DATA_DIR, "qms.db")
+os.environ.pop("QMS_PLANTS", None)
+os.environ.pop("QMS_PLANT", None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        yield client
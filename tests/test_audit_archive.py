@@ -0,0 +1,126 @@
+import os
+
+import pytest
+
+import main
+from main import query_audit_logs
+
+MONTHS = ("2020-01", "2020-02")
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "archive.db"))
+    database.archive.batch_size = 7
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def seed(database, per_month=20):
+    rows = []
+    for month in MONTHS:
+        for index in range(per_month):
+            # Pairs share a second, so pages have to break ties on id
+            rows.append(("employees", f"e{index % 5}", "UPDATE" if index % 3 else "CREATE", None,
+                         f"{month}-{1 + index // 2:02d} 08:00:00"))
+    with database.connection() as conn:
+        conn.executemany("INSERT INTO audit_log (entity_type, entity_id, action, changes, timestamp) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT INTO audit_log (entity_type, entity_id, action) VALUES ('employees', 'live', 'CREATE')")
+        conn.commit()
+        return [(row["timestamp"], row["id"]) for row in
+                conn.execute("SELECT timestamp, id FROM audit_log ORDER BY timestamp DESC, id DESC")]
+
+
+def walk(limit, **filters):
+    keys, cursor = [], None
+    while True:
+        page = query_audit_logs(cursor=cursor, limit=limit, **filters)
+        keys.extend((row["timestamp"], row["id"]) for row in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return keys
+
+
+def test_pages_merge_the_database_and_the_archive(database):
+    expected = seed(database)
+    assert database.archive.archive()["archived"] == len(expected) - 1
+    assert database.archive.months() == list(MONTHS)
+
+    assert walk(3) == expected
+    assert walk(50) == expected
+
+
+def test_segments_are_indexed_newest_first(database):
+    seed(database)
+    database.archive.archive()
+    members = database.archive.members("2020-01")
+    assert len(members) == 3
+    assert all(member["descending"] for member in members)
+    assert sum(len(list(main.read_audit_member(database.archive._segment_path("2020-01"), member, None)))
+               for member in members) == 20
+
+
+def test_a_page_opens_only_the_members_it_reaches(database, monkeypatch):
+    seed(database)
+    database.archive.archive()
+    opened = []
+    read = main.read_audit_member
+
+    def recording_read(path, member, bound):
+        opened.append(member["offset"])
+        return read(path, member, bound)
+
+    monkeypatch.setattr(main, "read_audit_member", recording_read)
+    rows = database.archive.query({}, None, 4)
+    assert [row["timestamp"][:7] for row in rows] == ["2020-02"] * 4
+    assert len(opened) == 1
+
+    opened.clear()
+    before = (rows[-1]["timestamp"], rows[-1]["id"])
+    assert len(database.archive.query({}, before, 1)) == 1
+    assert len(opened) == 1
+
+
+def test_filters_apply_to_archived_rows(database):
+    expected = seed(database)
+    database.archive.archive()
+
+    window = walk(4, since="2020-01-05", until="2020-02-03")
+    assert window == [key for key in expected if "2020-01-05" <= key[0] < "2020-02-04"]
+    created = query_audit_logs(action="create", limit=100)["items"]
+    assert {row["action"] for row in created} == {"CREATE"}
+    assert len(created) == 15
+
+
+def test_a_batch_archived_twice_is_returned_once(database):
+    expected = seed(database)
+    database.archive.archive()
+    member = database.archive.members("2020-02")[0]
+    duplicate = list(main.read_audit_member(database.archive._segment_path("2020-02"), member, None))
+    database.archive._append("2020-02", duplicate[::-1])
+
+    assert walk(4) == expected
+
+
+def test_legacy_and_torn_segments_still_read(database):
+    expected = seed(database)
+    database.archive.archive()
+    month = "2020-01"
+    path = database.archive._segment_path(month)
+    rows = sorted((row for member in database.archive.members(month)
+                   for row in main.read_audit_member(path, member, None)), key=main.audit_key)
+
+    # Older builds wrote members oldest first and kept no index; a crash can also leave half a member behind
+    os.remove(database.archive._index_path(month))
+    with open(path, "wb") as segment:
+        segment.write(main.gzip.compress("".join(main.json.dumps(row) + "\n" for row in rows).encode()))
+        segment.write(main.gzip.compress(b'{"id": 1}\n')[:12])
+    assert walk(5) == expected
+
+    database.archive._append(month, rows[:1])
+    members = database.archive.members(month)
+    assert [member["descending"] for member in members] == [False, True]
+    assert os.path.getsize(path) == members[-1]["offset"] + members[-1]["length"]
+    assert walk(5) == expected
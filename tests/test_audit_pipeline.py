@@ -0,0 +1,129 @@
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def open_database(tmp_path, monkeypatch):
+    opened = []
+
+    def open_database(mode):
+        monkeypatch.setattr(main.Config, "AUDIT_MODE", mode)
+        database = main.Database(str(tmp_path / f"{mode}.db"))
+        opened.append(database)
+        return database
+
+    yield open_database
+    for database in opened:
+        database.close()
+
+
+def make_flaky(database, failures):
+    # Only the pipeline sees the outage, so the test can still read audit_log through the real pool
+    state = {"left": failures}
+
+    @contextmanager
+    def connection():
+        if state["left"]:
+            state["left"] -= 1
+            raise main.PoolTimeout("pool exhausted")
+        with database.connection() as conn:
+            yield conn
+
+    database.audit.db = SimpleNamespace(connection=connection)
+    return state
+
+
+def events(database, *entity_ids):
+    return database.audit.stage(None, "employees", [(entity_id, "CREATE", {"name": f"e{entity_id}"})
+                                                    for entity_id in entity_ids])
+
+
+def audit_ids(database):
+    with database.connection() as conn:
+        return [int(row[0]) for row in conn.execute("SELECT entity_id FROM audit_log ORDER BY id")]
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_durable_future_resolves_after_the_rows_are_written(open_database):
+    database = open_database("durable")
+    future = database.audit.dispatch(*events(database, 1, 2))
+
+    assert future.result(timeout=5) == 2
+    assert audit_ids(database) == [1, 2]
+
+
+def test_durable_flush_retries_transient_failures(open_database):
+    database = open_database("durable")
+    make_flaky(database, 2)
+
+    assert database.audit.dispatch(*events(database, 1)).result(timeout=5) == 1
+    assert audit_ids(database) == [1]
+    assert database.audit.stats()["failures"] == 2
+
+
+def test_durable_flush_failure_reaches_the_writer_and_keeps_the_flusher(open_database, monkeypatch):
+    monkeypatch.setattr(main.Config, "AUDIT_FLUSH_ATTEMPTS", 2)
+    database = open_database("durable")
+    state = make_flaky(database, 10)
+
+    with pytest.raises(main.PoolTimeout):
+        database.audit.dispatch(*events(database, 1)).result(timeout=5)
+
+    state["left"] = 0
+    assert database.audit.dispatch(*events(database, 2)).result(timeout=5) == 1
+    assert audit_ids(database) == [2]
+
+
+def test_durable_flusher_survives_unexpected_errors(open_database):
+    database = open_database("durable")
+    original = database.audit._insert
+    calls = []
+
+    def insert(conn, rows, seq, spill=None):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return original(conn, rows, seq, spill)
+
+    database.audit._insert = insert
+    assert database.audit.dispatch(*events(database, 1)).result(timeout=5) == 1
+    assert calls == [1, 1]
+
+
+def test_async_dispatch_spills_before_the_flush(open_database):
+    database = open_database("async")
+    state = make_flaky(database, 10 ** 6)
+
+    assert database.audit.dispatch(*events(database, 1, 2)) is None
+    with open(database.audit.spill_path, encoding="utf-8") as spill:
+        assert [line.split(",")[0] for line in spill] == ["[1", "[2"]
+    assert audit_ids(database) == []
+
+    state["left"] = 0
+    wait_for(lambda: audit_ids(database) == [1, 2])
+
+
+def test_async_flush_failure_retries_and_keeps_the_flusher(open_database):
+    database = open_database("async")
+    make_flaky(database, 3)
+
+    database.audit.dispatch(*events(database, 1))
+    wait_for(lambda: audit_ids(database) == [1])
+    database.audit.dispatch(*events(database, 2))
+    wait_for(lambda: audit_ids(database) == [1, 2])
+
+    stats = database.audit.stats()
+    assert stats["failures"] == 3
+    wait_for(lambda: os.path.getsize(database.audit.spill_path) == 0)
@@ -0,0 +1,35 @@
+import main
+from main import EntityType, Repository, encode_cursor, query_audit_logs
+
+
+def test_audit_pages_walk_back_without_gaps():
+    repo = Repository(EntityType.AREAS)
+    created = repo.create_many([f"audit area {index}" for index in range(7)])
+    ids = {item["id"] for item in created}
+    seen, cursor = [], None
+    while True:
+        page = query_audit_logs(entity_type="areas", cursor=cursor, limit=3)
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    keys = [(row["timestamp"], row["id"]) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert ids <= {row["entity_id"] for row in seen}
+    assert all(row["entity_type"] == "areas" for row in seen)
+
+
+def test_audit_filters_by_action_and_entity(client):
+    item = Repository(EntityType.CALIBRATIONS).create_many(["audit calibration"])[0]
+    Repository(EntityType.CALIBRATIONS).update_many([(item["id"], "audit calibration renamed")])
+    response = client.get("/audit/logs", params={"entity_id": item["id"], "action": "update"})
+    rows = response.json()["items"]
+    assert [row["action"] for row in rows] == ["UPDATE"]
+    assert client.get("/audit/logs", params={"action": "rename"}).status_code == 400
+
+
+def test_audit_rejects_other_listing_cursors(client):
+    for cursor in (encode_cursor("g", "2024-01-01 00:00:00", None, 1), encode_cursor("d", "2024-01-01", "x"),
+                   encode_cursor("n", "2024-01-01 00:00:00", "x")):
+        assert client.get("/audit/logs", params={"cursor": cursor}).status_code == 400
+        assert client.get("/audit/rows", params={"cursor": cursor}).status_code == 400
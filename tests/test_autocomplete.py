@@ -0,0 +1,44 @@
+from main import EntityType, PrefixTable, Repository
+
+
+def test_whole_names_rank_before_inner_words():
+    table = PrefixTable([("1", "Torque Wrench"), ("2", "Wrench Set"), ("3", "Pipe wrench"), ("4", "Tape")])
+    assert [item["id"] for item in table.search("wre", 10)] == ["2", "3", "1"]
+    assert [item["id"] for item in table.search("T", 10)] == ["4", "1"]
+    assert table.search("wrench", 1) == [{"id": "2", "name": "Wrench Set"}]
+    assert table.search("drill", 10) == []
+
+
+def test_edits_keep_the_table_sorted():
+    table = PrefixTable([("1", "Alpha Gauge")])
+    table.add("2", "Beta Gauge")
+    table.add("1", "Gamma Caliper")
+    table.remove("2")
+    table.remove("missing")
+
+    assert len(table) == 1
+    assert table.search("gauge", 10) == []
+    assert table.search("cal", 10) == [{"id": "1", "name": "Gamma Caliper"}]
+
+
+def test_endpoint_follows_writes(client):
+    repo = Repository(EntityType.CALIBRATIONS)
+    first, second = repo.create_many(["Zephyr Micrometer", "Zephyr <Bore> Gauge"])
+
+    def names(**params):
+        response = client.get("/entity/calibrations/autocomplete", params={"q": "zeph", **params})
+        assert response.status_code == 200
+        return response
+
+    assert [item["id"] for item in names().json()["items"]] == [second["id"], first["id"]]
+    assert "Zephyr &lt;Bore&gt; Gauge" in names(format="options").text
+    assert len(names(limit=1).json()["items"]) == 1
+
+    repo.update_many([(first["id"], "Quartz Micrometer")])
+    repo.delete_many([second["id"]])
+    assert names().json()["items"] == []
+    assert [item["name"] for item in names(q="micro").json()["items"]] == ["Quartz Micrometer"]
+
+
+def test_endpoint_rejects_unknown_formats(client):
+    assert client.get("/entity/areas/autocomplete", params={"q": "a", "format": "xml"}).status_code == 400
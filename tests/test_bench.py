@@ -0,0 +1,48 @@
+import sqlite3
+
+import bench
+import main
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        tables = [entity.value for entity in main.EntityType]
+        return {table: conn.execute(f"SELECT * FROM {table} ORDER BY id").fetchall() for table in tables + ["audit_log"]}
+    finally:
+        conn.close()
+
+
+def test_same_seed_builds_identical_fixtures(tmp_path):
+    anchor = 1_700_000_000
+    first = bench.seed_database(str(tmp_path / "a.db"), 40, seed=7, anchor=anchor, batch_size=16)
+    second = bench.seed_database(str(tmp_path / "b.db"), 40, seed=7, anchor=anchor)
+    other = bench.seed_database(str(tmp_path / "c.db"), 40, seed=8, anchor=anchor)
+
+    assert dump(first) == dump(second) != dump(other)
+    assert bench.fixture_meta(first)["rows"] == "40"
+
+
+def test_seeded_fixtures_are_fully_migrated(tmp_path):
+    path = bench.seed_database(str(tmp_path / "fixture.db"), 30, seed=1, anchor=1_700_000_000)
+    database = main.Database(path)
+    try:
+        with database.connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == len(main.MIGRATIONS)
+            active = conn.execute("SELECT COUNT(*) FROM areas WHERE is_active = 1").fetchone()[0]
+        assert database.counters.count("areas") == active
+        assert database.counters.reconcile() == {}
+    finally:
+        database.close()
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    baseline = {"scenarios": {"list": {"throughput_rps": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 30},
+                              "search": {"throughput_rps": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 30}}}
+    current = {"scenarios": {"list": {"throughput_rps": 98, "p50_ms": 10, "p95_ms": 21, "p99_ms": 31},
+                             "search": {"throughput_rps": 70, "p50_ms": 10, "p95_ms": 20, "p99_ms": 30},
+                             "new": {"throughput_rps": 5, "p50_ms": 1, "p95_ms": 1, "p99_ms": 1}}}
+
+    result = bench.compare_results(current, baseline, 0.1)
+    assert result["regressions"] == ["search"]
+    assert not result["scenarios"]["list"]["regressed"] and "new" not in result["scenarios"]
@@ -0,0 +1,103 @@
+import asyncio
+
+import main
+from main import ChangeFeed, EntityType, Repository
+
+
+def run_feed(scenario, render, max_pending=50):
+    async def run():
+        feed = ChangeFeed(max_pending, 0.01)
+        feed.attach(asyncio.get_running_loop(), render)
+        try:
+            return await scenario(feed)
+        finally:
+            feed.detach()
+    
+    return asyncio.run(run())
+
+
+def test_bursts_coalesce_into_one_render_per_view():
+    calls = []
+    
+    async def render(table, changes, view):
+        calls.append((table, dict(changes), view))
+        return [((table, item_id), f"{view}:{item_id}:{action}") for item_id, action in changes.items()]
+    
+    async def scenario(feed):
+        live = [feed.subscribe("employees", "live") for _ in range(3)]
+        paged = feed.subscribe("employees", "page")
+        feed.publish("employees", [("a", "CREATE")])
+        feed.publish("employees", [("a", "UPDATE"), ("b", "CREATE")])
+        await asyncio.sleep(0.1)
+        return [subscriber.drain() for subscriber in live + [paged]], feed.stats()
+    
+    drained, stats = run_feed(scenario, render)
+    assert sorted(view for _, _, view in calls) == ["live", "page"]
+    assert all(changes == {"a": "UPDATE", "b": "CREATE"} for _, changes, _ in calls)
+    assert drained[0] == (["live:a:UPDATE", "live:b:CREATE"], False)
+    assert drained[3] == (["page:a:UPDATE", "page:b:CREATE"], False)
+    assert stats["coalesced"] == 1 and stats["flushes"] == 1
+
+
+def test_slow_subscriber_overflows_into_a_reset():
+    async def render(table, changes, view):
+        return [((table, item_id), item_id) for item_id in changes]
+    
+    async def scenario(feed):
+        subscriber = feed.subscribe("employees", "live")
+        feed.publish("employees", [(str(index), "CREATE") for index in range(5)])
+        await asyncio.sleep(0.1)
+        return subscriber.drain()
+    
+    assert run_feed(scenario, render, max_pending=3) == ([], True)
+
+
+def test_render_failure_resets_subscribers_and_keeps_the_feed_alive():
+    attempts = []
+    
+    async def render(table, changes, view):
+        attempts.append(view)
+        if len(attempts) == 1:
+            raise RuntimeError("database went away")
+        return [((table, item_id), item_id) for item_id in changes]
+    
+    async def scenario(feed):
+        subscriber = feed.subscribe("employees", "live")
+        feed.publish("employees", [("a", "UPDATE")])
+        await asyncio.sleep(0.1)
+        first = subscriber.drain()
+        feed.publish("employees", [("b", "UPDATE")])
+        await asyncio.sleep(0.1)
+        return first, subscriber.drain(), feed.stats()["failures"]
+    
+    first, second, failures = run_feed(scenario, render)
+    assert first == ([], True)
+    assert second == (["b"], False)
+    assert failures == 1
+
+
+def test_rendered_messages_respect_the_view():
+    row = Repository(EntityType.PARTNUMBERS).create_many(["feed part"])[0]
+    
+    async def render(view):
+        return await main.render_change_messages("partnumbers", {row["id"]: "CREATE"}, view)
+    
+    live = "".join(message for _, message in asyncio.run(render("live")))
+    page = "".join(message for _, message in asyncio.run(render("page")))
+    search = asyncio.run(render("refresh"))
+    assert "afterbegin:#items-rows" in live and "feed part" in live
+    assert "afterbegin:#items-rows" not in page and "feed part" not in page
+    assert search == [(("partnumbers", None), main.SSE_REFRESH)]
+
+
+def test_list_renders_subscribe_to_their_view():
+    items = [{"id": "abc", "name": "x", "created_at": "2024-01-01 00:00:00", "updated_at": "2024-01-01 00:00:00"}]
+    assert "view=live" in main.render_items_list(items, 1, "areas", None)
+    assert "view=page" in main.render_items_list(items, 30, "areas", None, prev_cursor="c")
+    assert "view=page" in main.render_items_list(items, 30, "areas", 2)
+    assert "view=refresh" in main.render_items_list(items, 1, "areas", None, search="x")
+    assert "view=live" in main.render_items_list([], 0, "areas", None)
+
+
+def test_events_endpoint_rejects_unknown_views(client):
+    assert client.get("/entity/areas/events", params={"view": "everything"}).status_code == 400
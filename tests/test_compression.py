@@ -0,0 +1,93 @@
+import gzip
+import zlib
+
+import pytest
+
+import main
+from main import EntityType, Repository, negotiate_encoding
+
+
+@pytest.fixture
+def codecs(monkeypatch):
+    # Pretend every codec is available so negotiation can be checked without the optional packages
+    negotiate_encoding.cache_clear()
+    monkeypatch.setattr(main, "CODECS", {"gzip": main.CODECS["gzip"], "br": None, "zstd": None})
+    yield
+    negotiate_encoding.cache_clear()
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("gzip, br, zstd", "zstd"),
+    ("zstd;q=0, br;q=0.5, gzip", "br"),
+    ("BR ; q=1.0", "br"),
+    ("*", "zstd"),
+    ("*;q=0, gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=1..0", None),
+])
+def test_negotiation_follows_server_preference(codecs, header, expected):
+    assert negotiate_encoding(header) == expected
+
+
+def test_unavailable_codecs_are_skipped(monkeypatch):
+    negotiate_encoding.cache_clear()
+    monkeypatch.setattr(main, "CODECS", {"gzip": main.CODECS["gzip"]})
+    try:
+        assert negotiate_encoding("zstd, br, gzip") == "gzip"
+        assert negotiate_encoding("zstd, br") is None
+    finally:
+        negotiate_encoding.cache_clear()
+
+
+def raw_get(client, url, encoding, **headers):
+    # httpx decodes gzip transparently; stream the raw bytes to see what went over the wire
+    with client.stream("GET", url, headers={"Accept-Encoding": encoding, **headers}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_precompressed_pages_are_served_encoded_and_cached(client):
+    identity, plain = raw_get(client, "/", "identity")
+    response, body = raw_get(client, "/", "gzip")
+    assert "content-encoding" not in identity.headers
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert gzip.decompress(body) == plain
+    assert "gzip" in main.ROOT_BODY._variants
+
+    _, cached = raw_get(client, "/", "gzip")
+    assert cached == body
+
+
+def test_small_bodies_and_not_modified_stay_identity(client):
+    response, body = raw_get(client, "/entity/employees/autocomplete?q=zzzz", "gzip")
+    assert len(body) < main.Config.COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in response.headers
+
+    etag = client.get("/").headers["etag"]
+    response, body = raw_get(client, "/", "gzip", **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert "content-encoding" not in response.headers and body == b""
+
+
+def test_streamed_exports_are_compressed_by_the_middleware(client):
+    Repository(EntityType.PARTNUMBERS).create_many([f"compressible part {index}" for index in range(200)])
+    identity, plain = raw_get(client, "/entity/partnumbers/export/csv", "identity")
+    response, body = raw_get(client, "/entity/partnumbers/export/csv", "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(body) < len(plain)
+    assert zlib.decompress(body, 31) == plain
+
+
+def test_export_compression_parameter(client):
+    response, body = raw_get(client, "/entity/partnumbers/export/ndjson?compress=gzip", "gzip")
+    # The payload is already a .gz file, so the middleware must not wrap it again
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-type"] == "application/gzip"
+    assert gzip.decompress(body).startswith(b'{"id"')
+    assert client.get("/entity/partnumbers/export/csv?compress=lz4").status_code == 400
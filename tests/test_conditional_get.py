@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+import main
+from main import EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, "VERSION_CHECK_INTERVAL", 0)
+    database = main.Database(str(tmp_path / "etags.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={"If-None-Match": etag})
+
+
+def test_unchanged_lists_revalidate_with_304(database, client):
+    Repository(EntityType.AREAS).create_many(["Paint line"])
+    first = client.get("/entity/areas/items")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+
+    response = revalidate(client, "/entity/areas/items", etag)
+    assert response.status_code == 304 and response.content == b""
+    assert revalidate(client, "/entity/areas/items", f'"other", {etag}').status_code == 304
+    assert database.responses.stats()["not_modified"] == 2
+
+
+def test_writes_change_the_etag(database, client):
+    repo = Repository(EntityType.AREAS)
+    item = repo.create_many(["Weld cell"])[0]
+    etag = client.get("/entity/areas/items").headers["etag"]
+    edit_etag = client.get(f"/entity/areas/edit/{item['id']}").headers["etag"]
+    other_etag = client.get("/entity/levels/items").headers["etag"]
+
+    repo.update_many([(item["id"], "Weld cell 2")])
+    response = revalidate(client, "/entity/areas/items", etag)
+    assert response.status_code == 200 and "Weld cell 2" in response.text
+    assert revalidate(client, f"/entity/areas/edit/{item['id']}", edit_etag).status_code == 200
+    assert revalidate(client, "/entity/levels/items", other_etag).status_code == 304
+
+
+def test_another_workers_write_changes_the_etag(database, client):
+    etag = client.get("/entity/levels/items").headers["etag"]
+    conn = sqlite3.connect(database.db_path)
+    with conn:
+        conn.execute("INSERT INTO levels (id, name) VALUES ('L9', 'Written elsewhere')")
+        conn.execute("UPDATE table_versions SET version = version + 1 WHERE entity_type = 'levels'")
+    conn.close()
+
+    response = revalidate(client, "/entity/levels/items", etag)
+    assert response.status_code == 200 and "Written elsewhere" in response.text
+
+
+def test_views_of_the_same_table_have_distinct_etags(database, client):
+    Repository(EntityType.AREAS).create_many(["Assembly", "Packing"])
+    etags = {client.get("/entity/areas/items", params=params).headers["etag"]
+             for params in ({}, {"search": "pack"}, {"page": 2})}
+    assert len(etags) == 3
+
+
+def test_static_pages_carry_content_etags(client):
+    etag = client.get("/").headers["etag"]
+    assert etag == main.ROOT_BODY.etag
+    assert revalidate(client, "/", etag).status_code == 304
+    assert revalidate(client, "/general-info", etag).status_code == 200
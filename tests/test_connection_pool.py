@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+import main
+from main import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.in_transaction = False
+        self.closed = False
+    
+    def rollback(self):
+        self.in_transaction = False
+    
+    def close(self):
+        self.closed = True
+
+
+def test_connections_are_reused_lifo():
+    pool = ConnectionPool(FakeConnection, size=2, timeout=0.1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    assert pool.acquire() is second
+    assert pool.stats()["open"] == 2 and pool.stats()["checkouts"] == 3
+
+
+def test_exhausted_pool_times_out_and_recovers():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+    threading.Timer(0.01, pool.release, (conn,)).start()
+    pool.timeout = 1.0
+    assert pool.acquire() is conn
+    assert pool.stats()["waits"] == 1
+
+
+def test_release_rolls_back_open_transactions():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.1)
+    conn = pool.acquire()
+    conn.in_transaction = True
+    pool.release(conn)
+    assert not conn.in_transaction and pool.acquire() is conn
+
+
+def test_failed_factory_does_not_leak_a_slot():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disk gone")
+        return FakeConnection()
+
+    pool = ConnectionPool(factory, size=1, timeout=0.05)
+    with pytest.raises(OSError):
+        pool.acquire()
+    assert isinstance(pool.acquire(), FakeConnection)
+
+
+def test_close_closes_idle_connections():
+    pool = ConnectionPool(FakeConnection, size=2, timeout=0.1)
+    conn = pool.acquire()
+    pool.release(conn)
+    pool.close()
+    assert conn.closed and pool.stats()["open"] == 0
+
+
+def test_database_connections_use_wal_and_tuned_pragmas(tmp_path):
+    database = main.Database(str(tmp_path / "pragmas.db"))
+    try:
+        with database.connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+            assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -main.Config.SQLITE_CACHE_SIZE_KB
+            first = conn
+        with database.connection() as conn:
+            assert conn is first
+    finally:
+        database.close()
@@ -0,0 +1,75 @@
+import base64
+import json
+
+import pytest
+
+import main
+from main import encode_cursor, decode_cursor
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+FOREIGN = {
+    "n": encode_cursor("n", "2024-01-01 00:00:00", "abc"),
+    "o": encode_cursor("o", 20),
+    "a": encode_cursor("a", "2024-01-01 00:00:00", 5),
+    "d": encode_cursor("d", "2024-01-01", "DMT-1"),
+    "g": encode_cursor("g", "2024-01-01 00:00:00", None, 5),
+}
+MALFORMED = [
+    "not-base64!!",
+    raw_cursor({"n": 1}),
+    raw_cursor([]),
+    raw_cursor(["n", "2024-01-01 00:00:00"]),
+    raw_cursor(["n", "2024-01-01 00:00:00", "abc", "extra"]),
+    raw_cursor(["n", ["nested"], "abc"]),
+    raw_cursor(["o", "twenty"]),
+    raw_cursor(["x", 1, 2]),
+]
+
+# (path, extra params, cursor kinds the endpoint issues)
+ENDPOINTS = [
+    ("/entity/employees/items", {}, "np"),
+    ("/entity/employees/items", {"search": "cursor"}, "o"),
+    ("/audit/logs", {}, "a"),
+    ("/audit/rows", {}, "a"),
+    ("/dmt/records", {}, "d"),
+    ("/global/audit/logs", {}, "g"),
+]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("n", "2024-01-01 00:00:00", "abc")
+    assert decode_cursor(cursor, "np", 3) == ["n", "2024-01-01 00:00:00", "abc"]
+    assert decode_cursor(encode_cursor("g", "t", None, 3), "g", 4) == ["g", "t", None, 3]
+
+
+@pytest.mark.parametrize("path, params, kinds", ENDPOINTS)
+def test_foreign_cursors_are_rejected(client, path, params, kinds):
+    for kind, cursor in FOREIGN.items():
+        response = client.get(path, params={**params, "cursor": cursor})
+        if kind in kinds:
+            assert response.status_code == 200, (kind, response.text)
+        else:
+            assert response.status_code == 400, (kind, response.text)
+
+
+@pytest.mark.parametrize("path, params, kinds", ENDPOINTS)
+def test_malformed_cursors_are_rejected(client, path, params, kinds):
+    for cursor in MALFORMED:
+        response = client.get(path, params={**params, "cursor": cursor})
+        assert response.status_code == 400, (cursor, response.text)
+
+
+def test_keyset_pages_follow_each_other(client):
+    names = [f"cursor page {index}" for index in range(main.Config.PAGE_SIZE + 5)]
+    assert client.post("/entity/levels/batch", json={"create": names}).status_code == 200
+    repo = main.Repository(main.EntityType.LEVELS)
+    first = repo.get_page()
+    second = repo.get_page(first["next_cursor"])
+    assert len(first["items"]) == main.Config.PAGE_SIZE
+    assert not {item["id"] for item in first["items"]} & {item["id"] for item in second["items"]}
+    back = repo.get_page(second["prev_cursor"])
+    assert [item["id"] for item in back["items"]] == [item["id"] for item in first["items"]]
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+import pytest
+
+import main
+from main import DBExecutor, ExecutorLane, ExecutorSaturated
+
+
+def test_reads_and_writes_run_on_their_own_lanes():
+    executor = DBExecutor()
+
+    async def run():
+        read = await executor.read(lambda: threading.current_thread().name)
+        write = await executor.write(lambda: threading.current_thread().name)
+        return read, write
+
+    try:
+        read, write = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert read.startswith("db-read") and write.startswith("db-write")
+    assert executor.stats()["read"]["completed"] == 1 and executor.stats()["write"]["completed"] == 1
+
+
+def test_writes_are_serialized():
+    executor = DBExecutor()
+    running, overlaps = [0], []
+    lock = threading.Lock()
+
+    def write():
+        with lock:
+            running[0] += 1
+            overlaps.append(running[0])
+        threading.Event().wait(0.01)
+        with lock:
+            running[0] -= 1
+
+    async def run():
+        await asyncio.gather(*(executor.write(write) for _ in range(5)))
+
+    try:
+        asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert max(overlaps) == 1
+
+
+def test_full_queue_is_rejected():
+    lane = ExecutorLane("read", 1, 1)
+    release = threading.Event()
+
+    async def run():
+        blocked = asyncio.ensure_future(lane.run(release.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(lane.run(lambda: "queued"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ExecutorSaturated):
+            await lane.run(lambda: "rejected")
+        release.set()
+        return await blocked, await queued
+
+    try:
+        assert asyncio.run(run()) == (True, "queued")
+    finally:
+        lane.shutdown()
+    assert lane.stats()["rejected"] == 1 and lane.stats()["queue_depth"] == 0
+
+
+def test_failures_propagate_to_the_caller():
+    lane = ExecutorLane("write", 1, 4)
+
+    def boom():
+        raise ValueError("nope")
+
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(lane.run(boom))
+    finally:
+        lane.shutdown()
+    assert lane.stats()["failed"] == 1
+
+
+def test_saturation_is_a_503(client, monkeypatch):
+    async def saturated(*args, **kwargs):
+        raise ExecutorSaturated("full")
+
+    monkeypatch.setattr(main.db.executor, "read", saturated)
+    response = client.get("/entity/areas/items")
+    assert response.status_code == 503 and "Database is busy" in response.text
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import main
+from main import DmtRepository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "dmt.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def record(day, part="P1", workcenter="W1", qty=1, car_type="dmt"):
+    return DmtRepository().create({"date": day, "part_number_id": part, "workcenter_id": workcenter, "qty": qty,
+                                   "car_type": car_type})
+
+
+def rollup(database, table="dmt_defect_rollup"):
+    with database.connection() as conn:
+        return [tuple(row) for row in conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2, 3")]
+
+
+def test_inserts_add_to_their_day_part_and_workcenter(database):
+    record("2024-05-01", qty=3)
+    record("2024-05-01", qty=2)
+    record("2024-05-02", part="P2", workcenter="W2", qty=5, car_type="ndmt")
+
+    assert rollup(database) == [("2024-05-01", "P1", "W1", 2, 5, 2), ("2024-05-02", "P2", "W2", 1, 5, 1)]
+    assert rollup(database, "dmt_open_car_rollup") == [("2024-05-01", "dmt", 2), ("2024-05-02", "ndmt", 1)]
+    by_part = database.rollups.defects(None, None, "part")
+    assert [(row["key"], row["records"], row["qty"]) for row in by_part] == [("P1", 2, 5), ("P2", 1, 5)]
+    assert [row["key"] for row in database.rollups.defects("2024-05-02", None, "day")] == ["2024-05-02"]
+
+
+def test_updates_move_contributions_and_prune_empty_rows(database):
+    first = record("2024-05-01", qty=3)
+    record("2024-05-01", qty=2)
+
+    DmtRepository().update(first["id"], {"part_number_id": "P9", "qty": 7})
+    assert rollup(database) == [("2024-05-01", "P1", "W1", 1, 2, 1), ("2024-05-01", "P9", "W1", 1, 7, 1)]
+
+    DmtRepository().update(first["id"], {"date": "2024-06-01"})
+    assert rollup(database) == [("2024-05-01", "P1", "W1", 1, 2, 1), ("2024-06-01", "P9", "W1", 1, 7, 1)]
+
+
+def test_closing_and_deleting_update_the_open_counts(database):
+    first = record("2024-05-01")
+    second = record("2024-05-01")
+
+    DmtRepository().close(first["id"], "2024-05-03")
+    assert rollup(database) == [("2024-05-01", "P1", "W1", 2, 2, 1)]
+    assert rollup(database, "dmt_open_car_rollup") == [("2024-05-01", "dmt", 1)]
+    ages = {bucket["age"]: bucket for bucket in database.rollups.open_cars_by_age("2024-05-05")}
+    assert ages["≤7d"]["dmt"] == 1 and ages["≤7d"]["total"] == 1
+
+    DmtRepository().delete(second["id"])
+    assert rollup(database) == [("2024-05-01", "P1", "W1", 1, 1, 0)]
+    assert rollup(database, "dmt_open_car_rollup") == []
+    DmtRepository().delete(first["id"])
+    assert rollup(database) == []
+
+
+def test_triggers_agree_with_a_full_recount(database):
+    rng = random.Random(7)
+    ids = []
+    for _ in range(60):
+        action = rng.random()
+        if action < 0.5 or not ids:
+            ids.append(record(f"2024-05-{rng.randint(1, 9):02d}", rng.choice("AB"), rng.choice("XY"),
+                              rng.randint(0, 4), rng.choice(("dmt", "ndmt")))["id"])
+        elif action < 0.7:
+            DmtRepository().close(rng.choice(ids))
+        elif action < 0.9:
+            DmtRepository().update(rng.choice(ids), {"qty": rng.randint(0, 9), "workcenter_id": rng.choice("XYZ")})
+        else:
+            DmtRepository().delete(rng.choice(ids))
+
+    assert database.rollups.reconcile() == {}
+
+
+def test_reconcile_repairs_drift(database):
+    record("2024-05-01", qty=3)
+    expected = rollup(database)
+    with database.connection() as conn:
+        conn.execute("UPDATE dmt_defect_rollup SET qty = 99")
+        conn.commit()
+
+    assert database.rollups.reconcile() == {"dmt_defect_rollup": 2}
+    assert rollup(database) == expected
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+import pytest
+
+import main
+from main import EntityCache, EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, "VERSION_CHECK_INTERVAL", 0)
+    database = main.Database(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = EntityCache(2, None)
+    cache.put_many("areas", {"a": {"id": "a"}, "b": {"id": "b"}}, 0)
+    cache.get_many("areas", ["a"])
+    cache.put_many("areas", {"c": {"id": "c"}}, 0)
+
+    found, missing = cache.get_many("areas", ["a", "b", "c"])
+    assert sorted(found) == ["a", "c"] and missing == ["b"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = EntityCache(10, 0.01)
+    cache.put_many("areas", {"a": {"id": "a"}}, 0)
+    time.sleep(0.02)
+    assert cache.get_many("areas", ["a"]) == ({}, ["a"])
+    assert cache.stats()["expirations"] == 1
+
+
+def test_rows_read_across_a_write_are_not_cached():
+    cache = EntityCache(10, None)
+    generation = cache.generation("areas")
+    cache.invalidate("areas", ["a"])
+    cache.put_many("areas", {"a": {"id": "a", "name": "stale"}}, generation)
+    assert cache.get_many("areas", ["a"]) == ({}, ["a"])
+
+
+def test_lookups_are_served_from_the_cache_until_a_write(database):
+    repo = Repository(EntityType.AREAS)
+    item = repo.create_many(["cached area"])[0]
+
+    assert repo.get_by_id(item["id"])["name"] == "cached area"
+    repo.get_by_id(item["id"])["name"] = "mutated by caller"
+    assert repo.get_by_id(item["id"])["name"] == "cached area"
+    assert database.entities.stats()["hits"] == 2
+
+    repo.update_many([(item["id"], "renamed area")])
+    assert repo.get_by_id(item["id"])["name"] == "renamed area"
+    repo.delete_many([item["id"]])
+    assert repo.get_by_id(item["id"]) is None
+
+
+def test_unknown_ids_are_cached_as_missing(database):
+    repo = Repository(EntityType.AREAS)
+    assert repo.get_many(["nope", "nada"]) == {}
+    assert repo.get_many(["nope"]) == {}
+    assert database.entities.stats()["negative_hits"] == 1
+
+
+def test_another_workers_write_invalidates_the_table(database):
+    repo = Repository(EntityType.AREAS)
+    item = repo.create_many(["shared area"])[0]
+    repo.get_by_id(item["id"])
+
+    conn = sqlite3.connect(database.db_path)
+    with conn:
+        conn.execute("UPDATE areas SET name = 'changed elsewhere' WHERE id = ?", (item["id"],))
+        conn.execute("UPDATE table_versions SET version = version + 1 WHERE entity_type = 'areas'")
+    conn.close()
+    assert repo.get_by_id(item["id"])["name"] == "changed elsewhere"
@@ -0,0 +1,76 @@
+import random
+import sqlite3
+
+import pytest
+
+import main
+from main import EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "counters.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def actual(database, table):
+    with database.connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE is_active = 1").fetchone()[0]
+
+
+def test_counters_follow_every_write_path(database, client):
+    repo = Repository(EntityType.EMPLOYEES)
+    rng = random.Random(3)
+    ids = [item["id"] for item in repo.create_many([f"worker {index}" for index in range(20)])]
+    for _ in range(30):
+        if rng.random() < 0.5:
+            ids.append(repo.create(f"hire {len(ids)}")["id"])
+        else:
+            victim = rng.choice(ids)
+            repo.delete(victim)
+            ids.remove(victim)
+    assert client.post("/entity/employees/import", files={"file": ("rows.csv", b"name\na\nb\n")}).status_code == 200
+    assert client.post("/entity/employees/batch", json={"create": ["c"], "delete": ids[:3]}).status_code == 200
+
+    assert database.counters.count("employees") == actual(database, "employees")
+    assert database.counters.reconcile() == {}
+
+
+def test_counts_start_from_existing_rows(tmp_path):
+    path = str(tmp_path / "existing.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE areas (id TEXT PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP, "
+                 "updated_at TIMESTAMP, is_active BOOLEAN DEFAULT 1)")
+    conn.executemany("INSERT INTO areas (id, name, is_active) VALUES (?, ?, ?)",
+                     [("A1", "one", 1), ("A2", "two", 1), ("A3", "three", 0)])
+    conn.commit()
+    conn.close()
+
+    database = main.Database(path)
+    try:
+        assert database.counters.count("areas") == 2
+        assert database.counters.count("levels") == 0
+    finally:
+        database.close()
+
+
+def test_reconcile_repairs_drift(database):
+    Repository(EntityType.LEVELS).create_many(["L1", "L2"])
+    with database.connection() as conn:
+        conn.execute("UPDATE entity_stats SET active_count = 40 WHERE entity_type = 'levels'")
+        conn.commit()
+
+    assert database.counters.reconcile() == {"levels": {"stored": 40, "actual": 2}}
+    assert database.counters.count("levels") == 2
+
+
+def test_dashboard_reads_the_counters(database, client):
+    Repository(EntityType.AREAS).create_many(["A", "B", "C"])
+    with database.connection() as conn:
+        conn.execute("UPDATE entity_stats SET active_count = 99 WHERE entity_type = 'areas'")
+        conn.commit()
+    # Served from entity_stats, not a COUNT(*) over the table
+    assert main.fetch_dashboard_data()[0]["areas"] == 99
+    assert client.get("/global/dashboard").json()["counts"]["areas"] == 99
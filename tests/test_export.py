@@ -0,0 +1,39 @@
+import csv
+import io
+import json
+
+import pytest
+
+import main
+from main import EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "export.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    monkeypatch.setattr(main.Config, "EXPORT_BATCH_SIZE", 7)
+    yield database
+    database.close()
+
+
+def test_export_streams_every_row_in_batches(database, client):
+    created = Repository(EntityType.LEVELS).create_many([f"level, \"{index}\"" for index in range(30)])
+    assert [len(rows) for rows in Repository(EntityType.LEVELS).iter_export()] == [7, 7, 7, 7, 2]
+
+    response = client.get("/entity/levels/export/csv")
+    assert response.headers["content-disposition"].startswith("attachment; filename=levels_")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted(row["name"] for row in rows) == sorted(item["name"] for item in created)
+    assert list(rows[0]) == list(main.EXPORT_COLUMNS)
+
+    as_json = client.get("/entity/levels/export/json").json()
+    ndjson = [json.loads(line) for line in client.get("/entity/levels/export/ndjson").text.splitlines()]
+    assert as_json == ndjson
+    assert [row["id"] for row in as_json] == [row["id"] for row in rows]
+
+
+def test_export_of_an_empty_table_is_valid(database, client):
+    assert client.get("/entity/areas/export/json").json() == []
+    assert client.get("/entity/areas/export/csv").text.strip() == ",".join(main.EXPORT_COLUMNS)
+    assert client.get("/entity/areas/export/xml").status_code == 400
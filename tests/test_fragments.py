@@ -0,0 +1,48 @@
+import pytest
+
+import main
+from main import Fragment
+
+
+def test_fields_are_escaped_unless_marked_safe():
+    fragment = Fragment("""
+        <p title="{title}">
+            {body:safe}
+        </p>
+    """)
+    assert fragment.render(title='"<x>"', body="<b>ok</b>") == '<p title="&quot;&lt;x&gt;&quot;"> <b>ok</b> </p>'
+
+
+def test_repeated_fields_and_braces():
+    assert Fragment("{a}-{a} {{literal}}").render(a=1) == "1-1 {literal}"
+
+
+@pytest.mark.parametrize("source", ["{a.b}", "{a[0]}", "{a:>10}", "{a!r}"])
+def test_unsupported_fields_are_rejected(source):
+    with pytest.raises(ValueError):
+        Fragment(source)
+
+
+def test_bind_pre_renders_fixed_fields():
+    bound = Fragment("<a href='/{entity}/{id}'>{entity}: {name:safe}</a>").bind(entity="a&b")
+    assert bound.render(id="<1>", name="<i>n</i>") == "<a href='/a&amp;b/&lt;1&gt;'>a&amp;b: <i>n</i></a>"
+    assert Fragment("{x}").bind(x="<").render() == "&lt;"
+
+
+def test_rows_escape_user_content():
+    item = {"id": "A1", "name": "<script>alert(1)</script>", "created_at": "2024-01-01", "updated_at": "2024-01-02"}
+    html = main.render_item_row(item, "areas")
+    assert "<script>" not in html and "&lt;script&gt;" in html
+    assert "Updated: 2024-01-02" in html and 'hx-delete="/entity/areas/delete/A1"' in html
+    assert "this area?" in html
+
+    item["updated_at"] = item["created_at"]
+    assert "Updated:" not in main.render_item_row(item, "areas")
+
+
+def test_list_renders_header_rows_and_empty_state():
+    items = [{"id": f"L{index}", "name": f"level {index}", "created_at": "t", "updated_at": "t"} for index in range(2)]
+    html = main.render_items_list(items, 7, "levels", 1)
+    assert "Showing 2" in html and "of 7 total" in html
+    assert html.index('id="item-L0"') < html.index('id="item-L1"')
+    assert 'id="items-empty"' in main.render_items_list([], 0, "levels", 1)
@@ -0,0 +1,53 @@
+import pytest
+
+import main
+from main import EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "import.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def upload(client, entity, content, filename="rows.csv", **params):
+    return client.post(f"/entity/{entity}/import", params=params,
+                       files={"file": (filename, content if isinstance(content, bytes) else content.encode())})
+
+
+def test_csv_import_reports_bad_rows_by_line(database, client):
+    content = "name,notes\n  Torque gauge  ,x\n,empty\nBore gauge,y\n" + "x" * 201 + ",long\n"
+    result = upload(client, "calibrations", content, batch_size=1).json()
+
+    assert result["imported"] == 2 and result["failed"] == 2
+    assert result["errors"] == [{"row": 3, "error": "name is required"},
+                                {"row": 5, "error": "name exceeds 200 characters"}]
+    names = {item["name"] for item in Repository(EntityType.CALIBRATIONS).get_page()["items"]}
+    assert names == {"Torque gauge", "Bore gauge"}
+    assert len(main.query_audit_logs(entity_type="calibrations")["items"]) == 2
+    assert database.counters.count("calibrations") == 2
+
+
+def test_ndjson_import(database, client):
+    content = '{"name": "North cell"}\n\nnot json\n["list"]\n{"name": 5}\n{"name": "South cell"}\n'
+    result = upload(client, "areas", content, filename="areas.ndjson").json()
+    assert result["imported"] == 2
+    assert [error["row"] for error in result["errors"]] == [3, 4, 5]
+
+
+def test_a_bad_file_imports_nothing(database, client):
+    assert upload(client, "areas", "title\nx\n").status_code == 400
+    # The bad bytes sit past the first read, after several batches were already inserted
+    assert upload(client, "areas", b"name\n" + b"ok row\n" * 3000 + b"\xff\n", batch_size=10).status_code == 400
+    assert upload(client, "areas", "name\nx\n", format="xlsx").status_code == 400
+    assert Repository(EntityType.AREAS).get_page()["items"] == []
+
+
+def test_export_round_trips_through_import(database, client):
+    Repository(EntityType.PARTNUMBERS).create_many([f"PN-{index}, rev \"B\"" for index in range(12)])
+    exported = client.get("/entity/partnumbers/export/csv").content
+    assert upload(client, "employees", exported).json()["imported"] == 12
+    assert ({item["name"] for item in Repository(EntityType.EMPLOYEES).get_page()["items"]}
+            == {f"PN-{index}, rev \"B\"" for index in range(12)})
@@ -0,0 +1,65 @@
+import re
+
+import pytest
+
+import main
+from main import Metrics, normalize_sql
+
+
+def sample(text, name, **labels):
+    wanted = "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}" if labels else ""
+    for line in text.splitlines():
+        if line.startswith(f"{name}{wanted} "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+def test_render_uses_the_exposition_format():
+    metrics = Metrics()
+    metrics.describe("jobs_total", "counter", "Jobs run")
+    metrics.inc("jobs_total", kind='say "hi"\\')
+    metrics.observe("job_seconds", 0.003, buckets=(0.001, 0.01), kind="x")
+    metrics.observe("job_seconds", 5, buckets=(0.001, 0.01), kind="x")
+    text = metrics.render([(("queue_depth", ()), 4.0)])
+
+    assert "# HELP jobs_total Jobs run\n# TYPE jobs_total counter" in text
+    assert 'jobs_total{kind="say \\"hi\\"\\\\"} 1' in text
+    assert "queue_depth 4" in text
+    assert 'job_seconds_bucket{kind="x",le="0.001"} 0' in text
+    assert 'job_seconds_bucket{kind="x",le="0.01"} 1' in text
+    assert 'job_seconds_bucket{kind="x",le="+Inf"} 2' in text
+    assert 'job_seconds_count{kind="x"} 2' in text
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT *\n  FROM areas WHERE id = 'A1' LIMIT 50", "SELECT * FROM areas WHERE id = ? LIMIT ?"),
+    ("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)", "INSERT INTO t (a, b) VALUES (?, ?)"),
+    ("SELECT * FROM t WHERE id IN (?, ?, ?)", "SELECT * FROM t WHERE id IN (?)"),
+    ("SELECT 'it''s' FROM t2", "SELECT ? FROM t2"),
+])
+def test_statements_are_normalized(sql, expected):
+    assert normalize_sql(sql) == expected
+
+
+def test_endpoint_reports_requests_sql_and_components(client):
+    client.get("/entity/areas/items")
+    client.get("/entity/areas/edit/some-id")
+    text = client.get("/metrics").text
+
+    assert sample(text, "qms_http_request_duration_seconds_count",
+                  method="GET", route="/entity/{entity}/items", status=200) >= 1
+    assert sample(text, "qms_http_request_duration_seconds_count",
+                  method="GET", route="/entity/{entity}/edit/{item_id}", status=200) >= 1
+    assert "some-id" not in text
+    assert re.search(r'qms_sql_statements_total\{statement="SELECT t\.\* FROM areas t WHERE', text)
+    assert sample(text, "qms_pool_size") is not None
+    assert sample(text, "qms_schema_version") == len(main.MIGRATIONS)
+    assert 'qms_render_seconds_count{helper="render_items_list"}' in text
+
+
+def test_slow_statements_are_counted(client, monkeypatch, capsys):
+    monkeypatch.setattr(main.Config, "SLOW_QUERY_MS", 0)
+    before = sample(client.get("/metrics").text, "qms_sql_slow_total") or 0
+    client.get("/entity/levels/items", params={"search": "slow"})
+    assert sample(client.get("/metrics").text, "qms_sql_slow_total") > before
+    assert "Slow query" in capsys.readouterr().out
@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+import main
+from main import EntityType, Repository
+
+# The schema init_db created before migrations were versioned
+BASELINE_ENTITY = '''
+    CREATE TABLE {table} (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1
+    )
+'''
+BASELINE_AUDIT = '''
+    CREATE TABLE audit_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity_type TEXT NOT NULL,
+        entity_id TEXT NOT NULL,
+        action TEXT NOT NULL,
+        changes TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    for entity in EntityType:
+        conn.execute(BASELINE_ENTITY.format(table=entity.value))
+        conn.execute(f"CREATE INDEX idx_{entity.value}_name ON {entity.value}(name)")
+        conn.execute(f"CREATE INDEX idx_{entity.value}_created ON {entity.value}(created_at)")
+    conn.execute(BASELINE_AUDIT)
+    conn.executemany("INSERT INTO employees (id, name, is_active) VALUES (?, ?, ?)",
+                     [("EMP-1", "Ada Welder", 1), ("EMP-2", "Grace Inspector", 1), ("EMP-3", "Gone Former", 0)])
+    conn.execute("INSERT INTO audit_log (entity_type, entity_id, action) VALUES ('employees', 'EMP-1', 'CREATE')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def open_database(monkeypatch):
+    opened = []
+
+    def open_database(path):
+        database = main.Database(path)
+        opened.append(database)
+        monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+        return database
+
+    yield open_database
+    for database in opened:
+        database.close()
+
+
+def test_baseline_database_is_upgraded_in_place(baseline, open_database):
+    database = open_database(baseline)
+    assert [step["version"] for step in database.migrator.applied] == [1, 2, 3]
+    with database.connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(main.MIGRATIONS)
+
+    repo = Repository(EntityType.EMPLOYEES)
+    assert {item["id"] for item in repo.get_page()["items"]} == {"EMP-1", "EMP-2"}
+    assert [item["id"] for item in repo.get_page(search="grace")["items"]] == ["EMP-2"]
+    assert database.counters.counts()["employees"] == 2
+    assert [row["entity_id"] for row in main.query_audit_logs()["items"]] == ["EMP-1"]
+
+
+def test_reopening_applies_nothing(baseline, open_database):
+    open_database(baseline).close()
+    database = open_database(baseline)
+    assert database.migrator.applied == []
+    assert database.migrator.stats()["version"] == len(main.MIGRATIONS)
+
+
+def test_newer_schema_is_refused(baseline, open_database):
+    conn = sqlite3.connect(baseline)
+    conn.execute(f"PRAGMA user_version = {len(main.MIGRATIONS) + 1}")
+    conn.close()
+    with pytest.raises(main.SchemaTooNew):
+        main.Database(baseline)
+
+
+def test_failed_migration_leaves_the_version_alone(baseline, open_database):
+    database = open_database(baseline)
+
+    def broken(database, conn):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("boom")
+
+    migrator = main.Migrator(database, main.MIGRATIONS + [broken])
+    with pytest.raises(RuntimeError):
+        migrator.migrate()
+    with database.connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(main.MIGRATIONS)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
@@ -0,0 +1,59 @@
+import pytest
+
+import main
+from main import EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(main.Config, "MUTATION_RESPONSE", "incremental")
+    database = main.Database(str(tmp_path / "mutations.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def test_create_prepends_one_row_and_updates_the_total(database, client):
+    Repository(EntityType.LEVELS).create_many(["Existing"])
+    response = client.post("/entity/levels/create", data={"name": "  Fresh level  "})
+
+    assert response.headers["hx-retarget"] == "#items-rows"
+    assert response.headers["hx-reswap"] == "afterbegin"
+    assert "Fresh level" in response.text and "Existing" not in response.text
+    assert '<span id="items-total" hx-swap-oob="true">of 2 total</span>' in response.text
+    assert 'id="items-empty"' in response.text
+
+
+def test_create_outside_the_search_only_toasts(database, client):
+    response = client.post("/entity/levels/create", data={"name": "Gamma", "search": "alpha"})
+    assert response.headers["hx-reswap"] == "none"
+    assert "Gamma" not in response.text and "created successfully" in response.text
+    assert 'id="items-total"' not in response.text
+
+
+def test_update_and_delete_swap_only_their_row(database, client):
+    item, other = Repository(EntityType.LEVELS).create_many(["Before", "Bystander"])
+
+    response = client.put(f"/entity/levels/update/{item['id']}", data={"name": "After"})
+    assert response.headers["hx-retarget"] == f"#item-{item['id']}"
+    assert response.headers["hx-reswap"] == "outerHTML"
+    assert "After" in response.text and "Bystander" not in response.text
+    assert 'id="edit-modal"' in response.text
+
+    response = client.delete(f"/entity/levels/delete/{item['id']}")
+    assert response.headers["hx-retarget"] == f"#item-{item['id']}"
+    assert "of 1 total" in response.text and "Bystander" not in response.text
+
+
+def test_missing_items_report_an_error(database, client):
+    assert "Item not found" in client.put("/entity/levels/update/nope", data={"name": "x"}).text
+    assert "Item not found" in client.delete("/entity/levels/delete/nope").text
+
+
+def test_full_mode_re_renders_the_list(database, client, monkeypatch):
+    monkeypatch.setattr(main.Config, "MUTATION_RESPONSE", "full")
+    Repository(EntityType.LEVELS).create_many(["Existing"])
+    response = client.post("/entity/levels/create", data={"name": "Fresh"})
+
+    assert "hx-retarget" not in response.headers
+    assert "Existing" in response.text and "Fresh" in response.text
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+
+import pytest
+
+import main
+from main import EntityType, Repository, query_audit_logs
+
+
+def test_update_audits_the_previous_name():
+    repo = Repository(EntityType.LEVELS)
+    item = repo.create_many(["level before"])[0]
+    repo.update_many([(item["id"], "level after")])
+
+    row = query_audit_logs(entity_id=item["id"], action="update")["items"][0]
+    assert json.loads(row["changes"]) == {"old": "level before", "new": "level after"}
+
+
+def test_update_reads_the_old_name_under_the_write_lock(monkeypatch):
+    repo = Repository(EntityType.LEVELS)
+    item = repo.create_many(["locked level"])[0]
+    update = Repository._update
+    blocked = []
+
+    def racing_update(self, c, changes):
+        # Another writer trying to slip in before the old name is read must find the database locked
+        other = sqlite3.connect(main.db.db_path, timeout=0)
+        try:
+            other.execute("UPDATE levels SET name = 'raced' WHERE id = ?", (item["id"],))
+            other.commit()
+        except sqlite3.OperationalError as exc:
+            blocked.append(str(exc))
+        finally:
+            other.close()
+        return update(self, c, changes)
+
+    monkeypatch.setattr(Repository, "_update", racing_update)
+    repo.update_many([(item["id"], "locked level renamed")])
+
+    assert blocked and "locked" in blocked[0]
+    row = query_audit_logs(entity_id=item["id"], action="update")["items"][0]
+    assert json.loads(row["changes"])["old"] == "locked level"
+
+
+def table_version(table):
+    with main.db.connection() as conn:
+        return conn.execute("SELECT version FROM table_versions WHERE entity_type = ?", (table,)).fetchone()[0]
+
+
+def test_create_many_keeps_the_callers_order(monkeypatch):
+    monkeypatch.setattr(main, "MAX_ROWS_PER_STATEMENT", 3)
+    names = [f"ordered level {index}" for index in range(8)]
+    assert [item["name"] for item in Repository(EntityType.LEVELS).create_many(names)] == names
+
+
+def test_batch_commits_once_with_one_version_bump():
+    repo = Repository(EntityType.AREAS)
+    keep, rename, drop = repo.create_many(["batch keep", "batch rename", "batch drop"])
+    before = table_version("areas")
+
+    result = repo.apply_batch(["batch new"], [(rename["id"], "batch renamed"), ("missing", "x")], [drop["id"], "gone"])
+    assert [item["name"] for item in result["created"]] == ["batch new"]
+    assert [item["name"] for item in result["updated"]] == ["batch renamed"]
+    assert result["deleted"] == [drop["id"]]
+    assert table_version("areas") == before + 1
+    assert repo.get_by_id(keep["id"])["name"] == "batch keep"
+
+
+def test_failed_batch_writes_nothing(monkeypatch):
+    repo = Repository(EntityType.AREAS)
+    item = repo.create_many(["rollback area"])[0]
+    before = table_version("areas")
+
+    def failing_delete(self, c, item_ids):
+        raise sqlite3.IntegrityError("boom")
+
+    monkeypatch.setattr(Repository, "_delete", failing_delete)
+    with pytest.raises(sqlite3.IntegrityError):
+        repo.apply_batch(["never created"], [(item["id"], "never renamed")], [item["id"]])
+    assert table_version("areas") == before
+    assert repo.get_by_id(item["id"])["name"] == "rollback area"
+    assert not query_audit_logs(entity_id=item["id"], action="update")["items"]
+
+
+def test_batch_endpoint_validates_and_reports_missing_ids(client, monkeypatch):
+    item = Repository(EntityType.EMPLOYEES).create_many(["batch employee"])[0]
+    response = client.post("/entity/employees/batch", json={
+        "create": ["ok", "  "], "update": [{"id": item["id"], "name": "x" * 201}]})
+    assert response.status_code == 400
+    assert [(error["operation"], error["index"]) for error in response.json()["detail"]] == [("create", 1), ("update", 0)]
+
+    result = client.post("/entity/employees/batch", json={
+        "update": [{"id": item["id"], "name": "batch employee 2"}, {"id": "nobody", "name": "x"}],
+        "delete": ["ghost"]}).json()
+    assert result["missing"] == {"update": ["nobody"], "delete": ["ghost"]}
+
+    monkeypatch.setattr(main.Config, "BATCH_MAX_OPERATIONS", 2)
+    assert client.post("/entity/employees/batch", json={"create": ["a", "b", "c"]}).status_code == 400
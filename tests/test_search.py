@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+import main
+from main import EntityType, Repository
+
+pytestmark = pytest.mark.skipif(not main.db.search.available, reason="SQLite lacks FTS5 with the trigram tokenizer")
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "search.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def names(search, **params):
+    return [item["name"] for item in Repository(EntityType.PARTNUMBERS).get_page(search=search, **params)["items"]]
+
+
+def test_substring_matches_rank_exact_then_prefix(database):
+    Repository(EntityType.PARTNUMBERS).create_many(["Retaining bolt", "Bolt", "Bolt washer", "Nut"])
+    assert database.search.usable("partnumbers", "bolt")
+
+    assert names("bolt") == ["Bolt", "Bolt washer", "Retaining bolt"]
+    assert names("aining") == ["Retaining bolt"]
+    assert names("missing") == []
+
+
+def test_index_follows_renames_and_deletes(database):
+    repo = Repository(EntityType.PARTNUMBERS)
+    washer, nut = repo.create_many(["Flat washer", "Hex nut"])
+    repo.update_many([(washer["id"], "Spring clip")])
+    repo.delete_many([nut["id"]])
+
+    assert names("washer") == []
+    assert names("clip") == ["Spring clip"]
+    assert names("hex") == []
+
+
+def test_short_and_quoted_terms_fall_back_or_escape(database):
+    Repository(EntityType.PARTNUMBERS).create_many(['12" pipe', "Pipe OR tube", "ab"])
+    assert not database.search.usable("partnumbers", "ab")
+    assert names("ab") == ["ab"]
+    assert names('2" p') == ['12" pipe']
+    assert names("OR tube") == ["Pipe OR tube"]
+
+
+def test_search_pages_carry_offsets(database, monkeypatch):
+    monkeypatch.setattr(main.Config, "PAGE_SIZE", 2)
+    Repository(EntityType.PARTNUMBERS).create_many([f"Gasket {index}" for index in range(5)])
+
+    seen, cursor = [], None
+    while True:
+        page = Repository(EntityType.PARTNUMBERS).get_page(cursor=cursor, search="gasket")
+        seen.extend(item["name"] for item in page["items"])
+        assert page["total"] == 5
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == [f"Gasket {index}" for index in range(5)]
+
+
+def test_existing_rows_wait_for_a_rebuild(tmp_path, monkeypatch):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE partnumbers (id TEXT PRIMARY KEY, name TEXT NOT NULL, created_at TIMESTAMP "
+                 "DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, is_active BOOLEAN DEFAULT 1)")
+    conn.execute("INSERT INTO partnumbers (id, name) VALUES ('P1', 'Legacy bracket')")
+    conn.commit()
+    conn.close()
+
+    database = main.Database(path)
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    try:
+        # Unindexed rows are still found through LIKE until the index is built
+        assert not database.search.usable("partnumbers", "bracket")
+        assert names("bracket") == ["Legacy bracket"]
+        assert database.search.rebuild("partnumbers") == 1
+        assert database.search.usable("partnumbers", "bracket")
+        assert names("bracket") == ["Legacy bracket"]
+    finally:
+        database.close()
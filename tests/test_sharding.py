@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from main import EntityType, Repository, current_plant, encode_cursor
+
+PLANTS = ("north", "south", "east")
+
+
+@pytest.fixture
+def shards(tmp_path, monkeypatch):
+    router = main.ShardRouter({plant: main.Database(str(tmp_path / f"qms-{plant}.db")) for plant in PLANTS})
+    monkeypatch.setattr(main, "db", router)
+    yield router
+    for database in router.shards.values():
+        database.close()
+
+
+def on_plant(plant, fn, *args):
+    token = current_plant.set(plant)
+    try:
+        return fn(*args)
+    finally:
+        current_plant.reset(token)
+
+
+def seed(counts):
+    for plant, count in counts.items():
+        on_plant(plant, Repository(EntityType.EMPLOYEES).create_many, [f"{plant} {index}" for index in range(count)])
+
+
+def test_repository_reads_only_its_plant(shards):
+    seed({"north": 3, "south": 2, "east": 0})
+    for plant, count in (("north", 3), ("south", 2), ("east", 0)):
+        items = on_plant(plant, Repository(EntityType.EMPLOYEES).get_page)["items"]
+        assert len(items) == count
+        assert all(item["name"].startswith(plant) for item in items)
+
+
+def test_router_requires_a_known_plant(shards):
+    with pytest.raises(main.PlantRequired):
+        shards.pool
+    with pytest.raises(main.UnknownPlant):
+        on_plant("west", lambda: shards.pool)
+    assert on_plant("south", lambda: shards.db_path).endswith("qms-south.db")
+
+
+def test_executor_threads_keep_the_callers_plant(shards):
+    seed({"north": 1, "south": 4, "east": 2})
+    
+    async def count(plant):
+        current_plant.set(plant)
+        return len((await main.AsyncRepository(EntityType.EMPLOYEES).get_page())["items"])
+    
+    async def run():
+        return await asyncio.gather(*(count(plant) for plant in PLANTS))
+    
+    assert asyncio.run(run()) == [1, 4, 2]
+
+
+def test_global_audit_pages_merge_every_plant_in_order(shards):
+    seed({"north": 4, "south": 3, "east": 5})
+    seen, cursor = [], None
+    while True:
+        page = asyncio.run(main.query_global_audit_logs(cursor=cursor, limit=2))
+        seen.extend((row["timestamp"], row["plant"], row["id"]) for row in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 12
+    assert len(set(seen)) == 12
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_global_dashboard_sums_plants(shards):
+    seed({"north": 2, "south": 3, "east": 1})
+    dashboard = asyncio.run(main.global_dashboard())
+    assert dashboard["counts"]["employees"] == 6
+    assert {plant: data["counts"]["employees"] for plant, data in dashboard["plants"].items()} == \
+        {"north": 2, "south": 3, "east": 1}
+
+
+def test_http_routing_by_header_prefix_and_cookie(shards):
+    seed({"north": 2, "south": 0, "east": 1})
+    client = TestClient(main.app)
+    assert client.get("/entity/employees/items").status_code == 400
+    assert client.get("/entity/employees/items", headers={"X-Plant": "west"}).status_code == 404
+    assert client.get("/entity/employees/items", headers={"X-Plant": "north"}).text.count("north ") == 2
+    
+    response = client.get("/plants/east/entity/employees/items")
+    assert response.status_code == 200 and "east 0" in response.text
+    assert "qms_plant=east" in response.headers["set-cookie"]
+    assert "X-Plant" in response.headers["vary"]
+    # The cookie set by the prefixed request keeps unprefixed follow-ups on that plant
+    assert "east 0" in client.get("/entity/employees/items").text
+
+
+def test_global_audit_rejects_per_plant_cursors(shards):
+    client = TestClient(main.app)
+    foreign = encode_cursor("a", "2024-01-01 00:00:00", 5)
+    assert client.get("/global/audit/logs", params={"cursor": foreign}).status_code == 400
+    own = encode_cursor("g", "2024-01-01 00:00:00", "north", 5)
+    assert client.get("/global/audit/logs", params={"cursor": own}).status_code == 200
+    assert client.get("/audit/logs", params={"cursor": own}, headers={"X-Plant": "north"}).status_code == 400
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import main
+from main import EntityType, Repository
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    database = main.Database(str(tmp_path / "snap.db"))
+    monkeypatch.setattr(main, "db", main.ShardRouter({None: database}))
+    yield database
+    database.close()
+
+
+def restored_counts(store, name):
+    manifest, path = store.restore(name)
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("employees", "audit_log")}
+    finally:
+        conn.close()
+        os.remove(path)
+
+
+def test_snapshot_restores_the_rows_it_recorded(database):
+    Repository(EntityType.EMPLOYEES).create_many([f"snap {index}" for index in range(25)])
+    manifest = database.snapshots.create()
+
+    assert manifest["schema_version"] == len(main.MIGRATIONS)
+    assert manifest["compressed_bytes"] < manifest["bytes"]
+    assert database.snapshots.verify(manifest["name"]) == manifest
+    assert database.snapshots.manifest("latest") == manifest
+    assert restored_counts(database.snapshots, manifest["name"]) == {"employees": 25, "audit_log": 25}
+
+
+def test_snapshot_is_consistent_while_writers_commit(database):
+    # Each create commits the row and its audit entry together, so a torn copy would show them disagreeing
+    Repository(EntityType.EMPLOYEES).create_many([f"seed {index}" for index in range(2000)])
+    database.snapshots.pages_per_step = 4
+    database.snapshots.step_pause = 0.001
+    stop = threading.Event()
+    written = []
+
+    def write():
+        while not stop.is_set():
+            written.extend(Repository(EntityType.EMPLOYEES).create_many([f"live {len(written)}"] * 5))
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        manifest = database.snapshots.create()
+    finally:
+        stop.set()
+        writer.join()
+
+    assert manifest["steps"] > 1
+    assert written
+    counts = restored_counts(database.snapshots, manifest["name"])
+    assert counts["employees"] == counts["audit_log"]
+    assert counts["employees"] % 5 == 0
+
+
+def test_damaged_or_missing_snapshots_are_reported(database):
+    manifest = database.snapshots.create()
+    path = database.snapshots._path(manifest["name"], "db.gz")
+    with open(path, "r+b") as snapshot:
+        snapshot.seek(-8, os.SEEK_END)
+        snapshot.write(b"\0" * 8)
+    with pytest.raises(main.SnapshotCorrupt):
+        database.snapshots.verify(manifest["name"])
+
+    os.remove(path)
+    with pytest.raises(main.SnapshotNotFound):
+        database.snapshots.verify(manifest["name"])
+    with pytest.raises(main.SnapshotNotFound):
+        database.snapshots.manifest("../snap")
+
+
+def test_rotation_keeps_the_newest(database):
+    database.snapshots.keep = 2
+    names = []
+    for _ in range(3):
+        names.append(database.snapshots.create()["name"])
+        time.sleep(0.002)
+    assert [snapshot["name"] for snapshot in database.snapshots.list()] == names[:0:-1]
+    assert not os.path.exists(database.snapshots._path(names[0], "db.gz"))
+
+
+def test_one_snapshot_at_a_time(database):
+    database.snapshots._running = True
+    with pytest.raises(main.SnapshotBusy):
+        database.snapshots.create()
+    database.snapshots._running = False
+
+
+def test_snapshot_endpoints(database, client):
+    Repository(EntityType.AREAS).create_many(["snapshot area"])
+    created = client.post("/snapshots")
+    assert created.status_code == 201
+    name = created.json()["name"]
+
+    assert client.get("/snapshots").json()["snapshots"][0]["name"] == name
+    assert client.get("/snapshots/latest", params={"verify": True}).json()["name"] == name
+    assert client.get("/snapshots/snapshot-20000101T000000000Z").status_code == 404
+
+    response = client.get(f"/snapshots/{name}/export")
+    assert response.headers["x-snapshot"] == name
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["name"] for row in rows if row["table"] == "areas"] == ["snapshot area"]
+    assert not any(entry.endswith(".restore") for entry in os.listdir(database.snapshots.directory))
+    assert client.get(f"/snapshots/{name}/export", params={"format": "xml"}).status_code == 400
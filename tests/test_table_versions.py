@@ -0,0 +1,78 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = main.Database(str(tmp_path / "versions.db"))
+    yield database
+    database.close()
+
+
+def bump_elsewhere(database, table):
+    # A plain connection stands in for another worker process committing to the same file
+    conn = sqlite3.connect(database.db_path)
+    with conn:
+        conn.execute("UPDATE table_versions SET version = version + 1 WHERE entity_type = ?", (table,))
+    conn.close()
+
+
+def test_sync_is_rate_limited(database, monkeypatch):
+    monkeypatch.setattr(main.Config, "VERSION_CHECK_INTERVAL", 60)
+    versions = database.versions
+    versions.sync()
+    before = versions.stats()["syncs"]
+
+    bump_elsewhere(database, "employees")
+    assert not versions.due()
+    versions.sync()
+    assert versions.stats()["syncs"] == before
+    assert versions.get("employees") == 0
+
+
+def test_foreign_commit_is_seen_after_the_interval(database, monkeypatch):
+    monkeypatch.setattr(main.Config, "VERSION_CHECK_INTERVAL", 0.02)
+    versions = database.versions
+    versions.sync()
+
+    bump_elsewhere(database, "employees")
+    time.sleep(0.03)
+    assert versions.due()
+    versions.sync()
+    assert versions.get("employees") == 1
+
+
+def test_local_commit_forces_the_next_check(database, monkeypatch):
+    monkeypatch.setattr(main.Config, "VERSION_CHECK_INTERVAL", 60)
+    versions = database.versions
+    versions.sync()
+
+    with database.connection() as conn:
+        version = versions.bump(conn, "areas")
+        conn.commit()
+    versions.record_local("areas", version)
+    assert versions.due()
+    versions.sync()
+    assert versions.get("areas") == version
+
+
+def test_request_path_syncs_on_the_read_lane(client, monkeypatch):
+    monkeypatch.setattr(main.Config, "VERSION_CHECK_INTERVAL", 0)
+    threads = []
+    sync = main.db.versions.sync
+
+    def recording_sync():
+        threads.append(threading.current_thread().name)
+        return sync()
+
+    monkeypatch.setattr(main.db.versions, "sync", recording_sync)
+    assert client.get("/entity/employees/items").status_code == 200
+    assert client.get("/entity/employees/autocomplete", params={"q": "a"}).status_code == 200
+
+    assert threads
+    assert all(name.startswith("db-read") for name in threads)